@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+import numpy as np
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def context_key(namespace: str, prompt_frame: str) -> str:
+    """LLM 백엔드/모델(namespace)과 질문을 채우기 전 프롬프트(템플릿 + 참고 문서 + few-shot 예시)로 만든 키
+
+    청크 본문, 예시, 템플릿, 모델 중 하나라도 바뀌면 키가 달라지므로 이전 답변은 자동으로 더 이상 매칭되지 않는다.
+    """
+    return hashlib.sha256(f"{namespace}\0{prompt_frame}".encode("utf-8")).hexdigest()
+
+
+_NON_WORD = re.compile(r"[^0-9a-z가-힣]")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_question(question: str) -> str:
+    """NFKC + 소문자화 후 공백/기호 제거 (띄어쓰기·물음표 차이는 같은 질문으로 봄)"""
+    return _NON_WORD.sub("", unicodedata.normalize("NFKC", question or "").lower())
+
+
+def question_overlap(a: str, b: str) -> float:
+    """정규화한 두 질문의 문자 bigram Jaccard 유사도 (숫자(연도, 개수 등)가 다르면 0)"""
+    a, b = normalize_question(a), normalize_question(b)
+    if a == b:
+        return 1.0
+    if _DIGITS.findall(a) != _DIGITS.findall(b):
+        return 0.0
+    grams_a = {a[i:i + 2] for i in range(len(a) - 1)} or {a}
+    grams_b = {b[i:i + 2] for i in range(len(b) - 1)} or {b}
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class SemanticAnswerCache:
+    """검색 문맥 + 질문 임베딩 기반 답변 캐시 (디스크 영속, TTL/LRU 제거)
+
+    같은 문맥(context_key: 모델 + 질문을 제외한 프롬프트)에서 코사인 유사도가 threshold 이상이고,
+    질문 문자열도 min_overlap 이상 겹치는(question_overlap) 질문이 있으면 그 답변을 재사용한다.
+    짧은 정형 질문은 묻는 항목만 달라도("가맹비" / "교육비") 임베딩 유사도가 threshold를 넘기 쉬워 문자열 검사를 함께 한다.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        threshold: float = 0.95,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 100_000,
+        min_overlap: float = 0.8,
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "answers.sqlite")
+        self.threshold = threshold
+        self.min_overlap = min_overlap
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " context_key TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " vec BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_context ON answers(context_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_access ON answers(last_access)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def lookup(self, key: str, question: str, vector) -> Optional[str]:
+        """같은 문맥에서 가장 비슷한 질문의 답변 (threshold 미만이거나 질문 문자열이 충분히 겹치지 않으면 None)"""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, vec, answer, created, question FROM answers WHERE context_key = ?", (key,)
+            ).fetchall()
+            expired = [row[0] for row in rows if now - row[3] > self.ttl_seconds]
+            rows = [row for row in rows if row[0] not in expired]
+            if expired:
+                self._conn.executemany("DELETE FROM answers WHERE id = ?", [(row_id,) for row_id in expired])
+                self._conn.commit()
+
+            if rows:
+                matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                scores = matrix @ query
+                for best in np.argsort(-scores):
+                    if scores[best] < self.threshold:
+                        break
+                    if question_overlap(question, rows[best][4]) < self.min_overlap:
+                        metrics.inc("answer_cache_rejected")
+                        continue
+                    self._conn.execute("UPDATE answers SET last_access = ? WHERE id = ?", (now, rows[best][0]))
+                    self._conn.commit()
+                    self.hits += 1
+                    metrics.inc("answer_cache_hits")
+                    return rows[best][2]
+            self.misses += 1
+            metrics.inc("answer_cache_misses")
+            return None
+
+    def put(self, key: str, question: str, vector, answer: str):
+        now = time.time()
+        blob = self._normalize(vector).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (context_key, question, vec, answer, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, blob, answer, now, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+            if count > self.max_entries:
+                # 가장 오래 사용되지 않은 항목부터 제거
+                self._conn.execute(
+                    "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM answers WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
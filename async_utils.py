@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """초당 요청 수(rate)를 넘지 않도록 호출 간격을 조절하는 asyncio용 리미터
+
+    rate가 0 이하이면 제한 없이 바로 통과한다.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.interval <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
@@ -0,0 +1,295 @@
+import argparse
+import json
+import logging
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from ingest_utils import StageTimer
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 질의 경로 단계 (측정 순서대로)
+QUERY_STAGES = ["embed", "main_search", "qa_search", "prompt", "llm", "total"]
+
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    arr = np.asarray(values, dtype=np.float64) * 1000
+    return {
+        "mean": round(float(arr.mean()), 3),
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p90": round(float(np.percentile(arr, 90)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "max": round(float(arr.max()), 3),
+    }
+
+
+def load_test_set(data_dir: Path, limit_files: int = 0, max_questions: int = 0):
+    """테스트 JSON 전체에서 청크와 (질문, 정답 청크 ID) 목록을 생성
+
+    create_collection.py가 질문마다 기록하는 contract_idx로 정답 청크를 찾는다.
+    """
+    from create_collection import chunk_id, load_contract_documents
+
+    files = sorted(p for p in data_dir.glob("*.json") if not p.name.startswith("extract_question_"))
+    if limit_files > 0:
+        files = files[:limit_files]
+
+    chunks, cases = {}, []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            contracts_data = json.load(f)
+        file_chunks, questions = load_contract_documents(path, contracts_data)
+        chunks.update(file_chunks)
+        if max_questions > 0:
+            questions = questions[:max_questions]
+        for q in questions:
+            cases.append({
+                "question": q["question"],
+                "source_doc": q["source_doc"],
+                "gold_id": chunk_id(contracts_data[q["contract_idx"]]),
+            })
+    return files, chunks, cases
+
+
+def ingest(chunks: dict, vector_db_path: Path, embeddings, timer: StageTimer):
+    """create_collection.py와 같은 경로(delta 재색인 + 라우터 + 어휘 색인)로 벤치마크 전용 컬렉션 구성"""
+    from langchain_chroma import Chroma
+
+    from brand_router import BrandRouter
+    from create_collection import (
+        COLLECTION_NAME, build_lexical_index, load_manifest, save_manifest, sync_collection, content_hash,
+    )
+
+    vector_db_path.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(vector_db_path)
+    changed = sum(1 for cid, doc in chunks.items() if manifest.get(cid) != content_hash(doc.page_content, doc.metadata))
+
+    vectorstore = Chroma(
+        persist_directory=str(vector_db_path),
+        embedding_function=embeddings,
+        collection_name=COLLECTION_NAME,
+    )
+    start = time.perf_counter()
+    save_manifest(vector_db_path, sync_collection(vectorstore, chunks, manifest))
+    timer.record("embed+upsert", time.perf_counter() - start, changed)
+
+    start = time.perf_counter()
+    BrandRouter.from_documents(chunks.values()).save(vector_db_path)
+    build_lexical_index(chunks).save(vector_db_path)
+    timer.record("router+lexical_index", time.perf_counter() - start, len(chunks))
+
+
+def run_queries(service, cases, k_values):
+    """질문마다 단계별 시간을 재고 정답 청크의 순위를 기록"""
+    max_k = max(k_values)
+    timings = {stage: [] for stage in QUERY_STAGES}
+    ranks = []
+
+    for i, case in enumerate(cases):
+        query = case["question"]
+        t0 = time.perf_counter()
+        query_vector = service.embed_query(query)
+        t1 = time.perf_counter()
+        if service.cascade is not None:
+            docs, decision = service.cascade_search(query, query_vector, k=max_k)
+        else:
+            docs, decision = service.search_main_store(query, embedding=query_vector, k=max_k), None
+        t2 = time.perf_counter()
+        use_examples = bool(docs) and service.wants_examples(decision)
+        qa_docs = service.search_qa_store(query, query_vector, docs[0].metadata.get("ATTRB_MNNO")) if use_examples else None
+        t3 = time.perf_counter()
+        prompt = service.build_prompt(query, docs, qa_docs, use_examples=use_examples) if docs else ""
+        t4 = time.perf_counter()
+        if prompt:
+            service.llm.generate(prompt)
+        t5 = time.perf_counter()
+
+        for stage, elapsed in zip(QUERY_STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t5 - t0)):
+            timings[stage].append(elapsed)
+
+        ids = [service.doc_key(doc) for doc in docs]
+        ranks.append(ids.index(case["gold_id"]) + 1 if case["gold_id"] in ids else None)
+
+        if (i + 1) % 100 == 0:
+            logger.info(f"🔎 {i + 1}/{len(cases)} 질문 처리")
+
+    retrieval = {f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / len(ranks), 4) for k in k_values}
+    retrieval[f"mrr@{max_k}"] = round(sum(1.0 / r for r in ranks if r) / len(ranks), 4)
+    return retrieval, {stage: percentiles(values) for stage, values in timings.items()}
+
+
+def compare(current: dict, baseline: dict, quality_tolerance: float, latency_tolerance: float):
+    """baseline 대비 품질(recall/MRR) 하락, 지연(p50/p90) 증가, 처리량 감소를 찾아 반환"""
+    regressions, lines = [], []
+
+    for metric, base in baseline.get("retrieval", {}).items():
+        value = current["retrieval"].get(metric)
+        if value is None:
+            continue
+        flag = value < base - quality_tolerance
+        lines.append(f"  {metric:<24} {base:>10.4f} → {value:>10.4f}{'  ❌' if flag else ''}")
+        if flag:
+            regressions.append(metric)
+
+    for stage, base_stats in baseline.get("latency_ms", {}).items():
+        for pct in ("p50", "p90"):
+            base, value = base_stats.get(pct), current["latency_ms"].get(stage, {}).get(pct)
+            if not base or value is None:
+                continue
+            flag = value > base * (1 + latency_tolerance)
+            lines.append(f"  {stage + ' ' + pct + ' (ms)':<24} {base:>10.2f} → {value:>10.2f}{'  ❌' if flag else ''}")
+            if flag:
+                regressions.append(f"{stage}.{pct}")
+
+    base_stages = (baseline.get("ingest") or {}).get("stages", {})
+    cur_stages = (current.get("ingest") or {}).get("stages", {})
+    for stage, base_stats in base_stages.items():
+        base, value = base_stats.get("docs_per_sec"), cur_stages.get(stage, {}).get("docs_per_sec")
+        if not base or not value:
+            continue
+        flag = value < base * (1 - latency_tolerance)
+        lines.append(f"  {stage + ' docs/sec':<24} {base:>10.1f} → {value:>10.1f}{'  ❌' if flag else ''}")
+        if flag:
+            regressions.append(f"ingest.{stage}")
+
+    return regressions, lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=str, default="./data/test", help="테스트 JSON 디렉토리")
+    parser.add_argument("--vector_db_path", type=str, default="./vector_db/benchmark", help="벤치마크 전용 벡터 DB 경로")
+    parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--k", type=str, default="1,3,5,10", help="recall@k 계산할 k 목록")
+    parser.add_argument("--limit_files", type=int, default=0, help="사용할 테스트 파일 수 (0이면 전체)")
+    parser.add_argument("--max_questions", type=int, default=0, help="파일당 질문 수 상한 (0이면 전체)")
+    parser.add_argument("--rebuild", action="store_true", help="벤치마크 벡터 DB를 지우고 다시 색인 (ingest 처리량 측정)")
+    parser.add_argument("--stub_latency", type=float, default=0.0, help="stub LLM 응답 지연(초)")
+    parser.add_argument("--output", type=str, default="./data/result/benchmark.json")
+    parser.add_argument("--baseline", type=str, default="./data/result/benchmark_baseline.json")
+    parser.add_argument("--save_baseline", action="store_true", help="이번 결과를 baseline으로 저장")
+    parser.add_argument("--quality_tolerance", type=float, default=0.01, help="허용 recall/MRR 하락폭 (절대값)")
+    parser.add_argument("--latency_tolerance", type=float, default=0.2, help="허용 지연 증가/처리량 감소 비율")
+    parser.add_argument("--cascade", action="store_true", help="적응형 검색(cascade) 사용")
+    parser.add_argument("--cascade_options", type=str, default="", help='cascade 임계값 JSON (예: \'{"confident_margin": 0.2}\')')
+    parser.add_argument("--fail_on_regression", action="store_true", help="회귀가 있으면 종료 코드 1")
+    args = parser.parse_args()
+
+    from config import get_settings
+    from embedding_cache import load_embeddings
+    from fewshot_franchise import GeminiFewShotFranchiseService
+
+    k_values = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    vector_db_path = Path(args.vector_db_path).resolve()
+    settings = get_settings()
+
+    timer = StageTimer()
+    start = time.perf_counter()
+    files, chunks, cases = load_test_set(Path(args.data_dir), args.limit_files, args.max_questions)
+    timer.record("parse", time.perf_counter() - start, len(chunks))
+    logger.info(f"📄 테스트 파일 {len(files)}개, 청크 {len(chunks)}개, 질문 {len(cases)}개")
+
+    # 인코더 처리량을 재기 위해 임베딩 디스크 캐시는 사용하지 않음
+    start = time.perf_counter()
+    embeddings = load_embeddings(settings.EMBEDDING_MODEL_PATH, settings.EMBEDDING_MODEL_NAME, device=args.device)
+    model_load_seconds = time.perf_counter() - start
+
+    if args.rebuild and vector_db_path.exists():
+        shutil.rmtree(vector_db_path)
+    ingest(chunks, vector_db_path, embeddings, timer)
+    logger.info("📦 ingest 처리량\n" + timer.report())
+
+    service = GeminiFewShotFranchiseService(
+        config={
+            "vector_db_path": str(vector_db_path),
+            "embeddings": embeddings,
+            "device": args.device,
+            "llm_backend": "stub",
+            "llm_stub_latency": args.stub_latency,
+            "query_cache_size": 0,
+            "cascade": (json.loads(args.cascade_options) if args.cascade_options else True) if args.cascade else None,
+            "lazy_load": True,
+            "background_warm_up": False,
+        }
+    )
+    service.warm_up()
+
+    logger.info(f"🚀 질의 벤치마크 시작 ({len(cases)}개 질문)")
+    from metrics import metrics
+    metrics.reset()
+    retrieval, latency = run_queries(service, cases, k_values)
+
+    result = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "data_dir": args.data_dir,
+            "files": len(files),
+            "questions": len(cases),
+            "device": args.device,
+            "embedding_model": settings.EMBEDDING_MODEL_NAME,
+            "llm_backend": "stub",
+            "stub_latency": args.stub_latency,
+            "cascade": service.cascade.options() if service.cascade is not None else None,
+        },
+        "ingest": {
+            "chunks": len(chunks),
+            "model_load_seconds": round(model_load_seconds, 3),
+            "stages": {
+                stage: {
+                    "docs": timer.counts.get(stage, 0),
+                    "seconds": round(elapsed, 3),
+                    "docs_per_sec": round(timer.rate(stage), 2),
+                }
+                for stage, elapsed in timer.elapsed.items()
+            },
+        },
+        "retrieval": retrieval,
+        "latency_ms": latency,
+        "cascade_skip_rates": service.cascade.stats() if service.cascade is not None else None,
+        "metrics": metrics.to_dict(),
+    }
+
+    output_path = Path(args.output).resolve()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print("\n📊 검색 품질")
+    for metric, value in retrieval.items():
+        print(f"  {metric:<12} {value:.4f}")
+    print("\n⏱️ 질의 단계별 지연 (ms)")
+    for stage, stats in latency.items():
+        print(f"  {stage:<12} p50 {stats['p50']:>9.2f}  p90 {stats['p90']:>9.2f}  p99 {stats['p99']:>9.2f}")
+    if service.cascade is not None:
+        print("\n⏭️ cascade 단계 생략률")
+        for stage, stats in result["cascade_skip_rates"].items():
+            print(f"  {stage:<12} {stats['skip_rate']:.2%} ({stats['skips']}/{stats['runs'] + stats['skips']})")
+    print(f"\n✅ 결과 저장 완료: {output_path}")
+
+    regressions = []
+    baseline_path = Path(args.baseline).resolve()
+    if baseline_path.exists() and not args.save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions, lines = compare(result, baseline, args.quality_tolerance, args.latency_tolerance)
+        print(f"\n🔁 baseline 비교 ({baseline.get('timestamp')})")
+        print("\n".join(lines))
+        print(f"\n{'❌ 회귀 ' + str(len(regressions)) + '건: ' + ', '.join(regressions) if regressions else '✅ 회귀 없음'}")
+
+    if args.save_baseline:
+        shutil.copyfile(output_path, baseline_path)
+        print(f"📌 baseline 저장: {baseline_path}")
+
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
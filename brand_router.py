@@ -0,0 +1,262 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import deque, namedtuple
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ROUTER_FILE_NAME = "brand_router.json"
+
+# 회사 형태 표기는 질문마다 다르게 쓰이므로 (주), 주식회사 등은 제거 후 비교
+_COMPANY_MARKERS = re.compile(r"\((주|유|사|재)\)|주식회사|유한회사|유한책임회사|사단법인|재단법인")
+_NON_WORD = re.compile(r"[^0-9a-z가-힣]")
+# 브랜드를 가리키지 않는 일반 질문 — check에서 어떤 패턴과도 매칭되지 않아야 함
+GENERIC_QUESTIONS = [
+    "2023년 12월 31일 기준으로 인천 지역에는 직영점이 몇 개 있나요?",
+    "진주 본점의 정확한 주소는 무엇인가요?",
+    "가맹사업법의 개정이 발생했을 때 계약 수정은 어떻게 하나요?",
+    "양수인이 원할 경우 어떤 절차를 통해 신규 가맹계약을 체결할 수 있나요?",
+    "가맹점을 운영하는 동안 가맹점운영권을 환매받을 수 있나요?",
+    "영업표지가 인쇄된 소모품을 제작하면 어떤 조치를 받을 수 있나요?",
+    "가맹본부의 임원 명단은 어디에서 확인할 수 있나요?",
+    "특정 동에서는 영업지역 제한이 어떻게 되나요?",
+]
+
+# 이름 뒤에 붙어도 같은 토큰으로 보는 조사 (0개 이상 연속)
+_PARTICLES = re.compile(r"(?:의|은|는|이|가|을|를|도|만|와|과|랑|이랑|하고|처럼|보다|까지|부터|으로|로|에게|에서|에)*")
+
+
+def normalize_name(text: str) -> str:
+    """상호/브랜드명 정규화: NFKC(㈜ → (주)), 소문자화, 회사 형태 표기/공백/기호 제거"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = _COMPANY_MARKERS.sub("", text)
+    return _NON_WORD.sub("", text)
+
+
+def tokenize_query(query: str):
+    """질문을 공백 단위로 정규화해 (이어 붙인 문자열, 토큰별 (시작, 끝) 위치) 반환"""
+    text, bounds = "", []
+    for token in (normalize_name(token) for token in (query or "").split()):
+        if token:
+            bounds.append((len(text), len(text) + len(token)))
+            text += token
+    return text, bounds
+
+
+class AhoCorasick:
+    """다중 패턴 문자열 매칭 오토마톤 (질문 길이에 선형 시간)"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        self.output[node].append(pattern)
+
+    def _build(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find(self, text: str):
+        """(끝 위치, 패턴) 목록 반환"""
+        node = 0
+        matches = []
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern in self.output[node]:
+                matches.append((i, pattern))
+        return matches
+
+
+class BrandRouter:
+    """BRAND_NM / JNGHDQRTRS_CONM_NM 메타데이터로 만든 질문 → 정보공개서(JNG_IFRMP_SN) 라우터"""
+
+    def __init__(self, patterns: dict, min_length: int = 2, short_length: int = 3):
+        # 정규화된 이름 → 해당 이름을 가진 JNG_IFRMP_SN 목록
+        self.patterns = {p: sorted(set(sns)) for p, sns in patterns.items() if len(p) >= min_length}
+        # 이 길이 이하의 이름은 일반 단어와 겹치기 쉬워 토큰 전체(+조사)와 일치할 때만 인정
+        self.short_length = short_length
+        self.automaton = AhoCorasick(self.patterns)
+
+    @classmethod
+    def from_metadatas(cls, metadatas: Iterable[dict]) -> "BrandRouter":
+        patterns = {}
+        for meta in metadatas:
+            sn = meta.get("JNG_IFRMP_SN")
+            for field in ("BRAND_NM", "JNGHDQRTRS_CONM_NM"):
+                name = normalize_name(str(meta.get(field, "")))
+                if name:
+                    patterns.setdefault(name, set()).add(sn)
+        return cls(patterns)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable, generic_min_brands: int = 3) -> "BrandRouter":
+        """청크 Document 목록으로 라우터 생성
+
+        짧은 이름이 다른 정보공개서 generic_min_brands곳 이상의 본문에 단어로 등장하면
+        ("개정", "명단" 등) 일반 단어로 보고 패턴에서 제외한다.
+        """
+        documents = list(documents)
+        router = cls.from_metadatas(doc.metadata for doc in documents)
+        seen_in = {}
+        for doc in documents:
+            sn = doc.metadata.get("JNG_IFRMP_SN")
+            for pattern in router.match(doc.page_content):
+                if len(pattern) <= router.short_length and sn not in router.patterns[pattern]:
+                    seen_in.setdefault(pattern, set()).add(sn)
+        generic = sorted(p for p, sns in seen_in.items() if len(sns) >= generic_min_brands)
+        if not generic:
+            return router
+        logger.info(f"일반 단어로 판단해 제외한 이름 {len(generic)}개: {generic[:20]}")
+        return cls({p: sns for p, sns in router.patterns.items() if p not in generic}, short_length=router.short_length)
+
+    def match(self, query: str) -> List[str]:
+        """질문에 등장하는 이름 패턴 (다른 매칭에 포함되는 짧은 매칭은 제외)
+
+        이름 안의 띄어쓰기는 무시하되 매칭은 공백 토큰의 처음에서 시작해야 한다 ("인천 지역" → "천지" 제외).
+        짧은 이름은 토큰 끝까지 이름이거나 뒤에 조사만 붙은 경우만 인정한다 ("소모품" → "소모" 제외).
+        """
+        text, bounds = tokenize_query(query)
+        token_end = {start: end for start, end in bounds}
+        spans = []
+        for end, pattern in self.automaton.find(text):
+            start = end - len(pattern) + 1
+            if start not in token_end:
+                continue
+            if len(pattern) <= self.short_length:
+                last = token_end[start]
+                if end + 1 > last or not _PARTICLES.fullmatch(text, end + 1, last):
+                    continue
+            spans.append((start, end, pattern))
+        matched = []
+        for start, end, pattern in spans:
+            covered = any(
+                s <= start and end <= e and (e - s) > (end - start)
+                for s, e, _ in spans
+            )
+            if not covered and pattern not in matched:
+                matched.append(pattern)
+        return matched
+
+    def route(self, query: str) -> List:
+        """질문이 가리키는 JNG_IFRMP_SN 목록 (매칭이 없으면 빈 목록)"""
+        sns = []
+        for pattern in self.match(query):
+            for sn in self.patterns[pattern]:
+                if sn not in sns:
+                    sns.append(sn)
+        return sns
+
+    def filter_for(self, query: str) -> Optional[dict]:
+        """Chroma where 필터로 변환 (매칭이 없으면 None → 전체 검색)"""
+        sns = self.route(query)
+        if not sns:
+            return None
+        if len(sns) == 1:
+            return {"JNG_IFRMP_SN": sns[0]}
+        return {"JNG_IFRMP_SN": {"$in": sns}}
+
+    def save(self, directory: str):
+        path = os.path.join(directory, ROUTER_FILE_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.patterns, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BrandRouter"]:
+        path = os.path.join(directory, ROUTER_FILE_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            router = cls(json.load(f))
+        logger.info(f"브랜드 라우터 로드: {len(router.patterns)}개 패턴")
+        return router
+
+
+_Chunk = namedtuple("_Chunk", ["page_content", "metadata"])
+
+
+def load_chunks(data_dir: str):
+    """정보공개서 JSON 디렉토리에서 (청크 목록, (질문, 정답 JNG_IFRMP_SN) 목록) 로드"""
+    chunks, questions = [], []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            contracts = json.load(f)
+        for contract in contracts if isinstance(contracts, list) else []:
+            info = contract.get("JNG_INFO")
+            if not info:
+                continue
+            ql = contract.get("QL", {})
+            chunks.append(_Chunk(ql.get("EXTRACTED_SUMMARY_TEXT", ""), {
+                "JNG_IFRMP_SN": info["JNG_IFRMP_SN"],
+                "BRAND_NM": info["BRAND_NM"],
+                "JNGHDQRTRS_CONM_NM": info["JNGHDQRTRS_CONM_NM"],
+            }))
+            questions.extend((qa["QUESTION"], info["JNG_IFRMP_SN"]) for qa in ql.get("QAs", []))
+    return chunks, questions
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="브랜드 라우터 점검 (라우팅 정확도 + 일반 질문 미라우팅 확인)")
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--data_dir", type=str, default="./data/train", help="정보공개서 JSON 디렉토리")
+    parser.add_argument("--show", type=int, default=10, help="출력할 오라우팅 예시 수")
+    args = parser.parse_args()
+
+    chunks, questions = load_chunks(args.data_dir)
+    router = BrandRouter.from_documents(chunks)
+    routed = correct = 0
+    wrong = []
+    for question, sn in questions:
+        sns = router.route(question)
+        if sns:
+            routed += 1
+            if sn in sns:
+                correct += 1
+            else:
+                wrong.append((question, sn, router.match(question)))
+    print(f"🧭 패턴 {len(router.patterns)}개, 질문 {len(questions)}개: 라우팅 {routed}, 정답 포함 {correct}, 오라우팅 {len(wrong)}")
+    for question, sn, matched in wrong[:args.show]:
+        print(f"  ✗ {question} (정답 {sn}, 매칭 {matched})")
+
+    leaked = [(question, router.match(question)) for question in GENERIC_QUESTIONS if router.route(question)]
+    for question, matched in leaked:
+        print(f"  ⚠ 일반 질문이 라우팅됨: {question} → {matched}")
+    if leaked:
+        raise SystemExit(1)
+    print(f"✅ 일반 질문 {len(GENERIC_QUESTIONS)}개는 라우팅되지 않음")
+
+
+if __name__ == "__main__":
+    main()
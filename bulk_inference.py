@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import List, Set
+
+logger = logging.getLogger(__name__)
+
+QUESTION_FILE_PATTERN = "extract_question_*.json"
+
+
+def load_questions(data_dir: str) -> List[dict]:
+    """디렉토리의 모든 extract_question_*.json을 읽어 질문마다 고유 id("파일명:순번")를 붙인 목록 반환"""
+    items = []
+    for path in sorted(Path(data_dir).glob(QUESTION_FILE_PATTERN)):
+        with open(path, "r", encoding="utf-8") as f:
+            for idx, q_item in enumerate(json.load(f)):
+                items.append({"id": f"{path.name}:{idx}", **q_item})
+    return items
+
+
+def source_of(item: dict) -> str:
+    """질문이 나온 정보공개서 JSON 파일명 (source_doc이 없으면 질문 파일명에서 복원)"""
+    return item.get("source_doc") or item["id"].split(":", 1)[0].removeprefix("extract_question_")
+
+
+def source_franchises(data_dir: str, source: str) -> Set[str]:
+    """정보공개서 JSON에 들어있는 JNG_IFRMP_SN 목록 (파일이 없거나 읽을 수 없으면 빈 집합)"""
+    try:
+        with open(Path(data_dir) / source, "r", encoding="utf-8") as f:
+            contracts = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return set()
+    return {str(c["JNG_INFO"]["JNG_IFRMP_SN"]) for c in contracts if isinstance(c, dict) and c.get("JNG_INFO")}
+
+
+def store_franchises(vector_db_path: str, sharded: bool) -> Set[str]:
+    """검색할 스토어에 색인된 JNG_IFRMP_SN 목록 (샤드 디렉토리, 아니면 현재 버전 manifest의 청크 ID 앞자리)"""
+    from sharded_store import load_shard_directory, shard_of
+
+    if sharded:
+        return set(load_shard_directory(Path(vector_db_path)))
+    import snapshots
+    from create_collection import load_manifest
+
+    _, active_path = snapshots.resolve(os.path.abspath(vector_db_path))
+    return {shard_of(cid) for cid in load_manifest(Path(active_path))}
+
+
+def filter_indexed(items: List[dict], data_dir: str, indexed: Set[str]) -> List[dict]:
+    """스토어에 정보공개서가 색인되지 않은 파일의 질문은 제외 (다른 가맹본부 문서로 답해 완료 처리되는 것을 막음)"""
+    kept, skipped = [], {}
+    franchises = {}
+    for item in items:
+        source = source_of(item)
+        if source not in franchises:
+            franchises[source] = source_franchises(data_dir, source)
+        sns = franchises[source]
+        if sns and sns <= indexed:
+            kept.append(item)
+        else:
+            skipped[source] = skipped.get(source, 0) + 1
+    for source, count in sorted(skipped.items()):
+        reason = "정보공개서 JSON을 찾을 수 없음" if not franchises[source] else f"스토어에 없음 {sorted(franchises[source] - indexed)}"
+        print(f"⚠ {source}: 질문 {count}개 건너뜀 ({reason})")
+    return kept
+
+
+class CheckpointWriter:
+    """결과를 JSONL로 한 줄씩 쓰고, 완료된 질문 id를 체크포인트 파일에 추가
+
+    결과 줄을 먼저 flush한 뒤 id를 기록하므로, 중간에 종료되어도 체크포인트에 있는 질문은 결과가 반드시 남아 있다.
+    재실행 시에는 체크포인트와 JSONL의 id를 합쳐 완료 목록으로 보고, 마지막의 잘린 줄은 버린다.
+    """
+
+    def __init__(self, output_path: str, checkpoint_path: str = None):
+        self.output_path = Path(output_path)
+        self.checkpoint_path = Path(checkpoint_path or f"{output_path}.checkpoint")
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self.done: Set[str] = self._load_done()
+        self._output = open(self.output_path, "a", encoding="utf-8")
+        self._checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+
+    def _load_done(self) -> Set[str]:
+        done = set()
+        if self.checkpoint_path.exists():
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                done.update(line.strip() for line in f if line.strip())
+        if self.output_path.exists():
+            valid_bytes = 0
+            with open(self.output_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # 쓰는 중 종료된 마지막 줄
+                    try:
+                        done.add(json.loads(line)["id"])
+                    except (json.JSONDecodeError, KeyError):
+                        break
+                    valid_bytes += len(line)
+            with open(self.output_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return done
+
+    def write(self, item: dict, result: dict):
+        record = {
+            "id": item["id"],
+            "source_doc": item.get("source_doc"),
+            "contract_idx": item.get("contract_idx"),
+            **result,
+        }
+        self._output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._output.flush()
+        os.fsync(self._output.fileno())
+        self._checkpoint.write(item["id"] + "\n")
+        self._checkpoint.flush()
+        self.done.add(item["id"])
+
+    def close(self):
+        self._output.close()
+        self._checkpoint.close()
+
+
+class Progress:
+    """완료 건수, 처리 속도, 남은 시간(ETA)을 일정 간격으로 출력"""
+
+    def __init__(self, total: int, interval: float = 5.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.start = time.monotonic()
+        self._last_report = 0.0
+
+    def update(self, ok: bool):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(self.report())
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+        return (
+            f"📈 {self.done}/{self.total} ({self.done / max(self.total, 1):.1%}) "
+            f"실패 {self.failed}, {rate:.2f} q/s, 경과 {elapsed:.0f}초, ETA {eta_text}"
+        )
+
+
+async def run_bulk(service, items: List[dict], writer: CheckpointWriter, progress: Progress,
+                   chunk_size: int = 64, concurrency: int = 8, rate_limit: float = 0.0):
+    """chunk_size개씩 일괄 검색하고 답변은 완료되는 대로 기록
+
+    다음 묶음의 검색은 스레드에서 수행해 진행 중인 LLM 호출과 겹치게 하고,
+    진행 중 작업이 chunk_size개를 넘으면 검색을 멈추고 기다려 메모리 사용량을 일정하게 유지한다.
+    """
+    from async_utils import AsyncRateLimiter
+
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = AsyncRateLimiter(rate_limit)
+
+    async def answer(item, retrieved):
+        result = await service.agenerate_answer(item["question"], retrieved, semaphore, limiter)
+        # 생성 실패 건은 체크포인트에 남기지 않아 다음 실행에서 다시 시도
+        ok = "error" not in result
+        if ok:
+            writer.write(item, result)
+        progress.update(ok)
+
+    running = set()
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        retrieved = await asyncio.to_thread(service.retrieve_batch, [item["question"] for item in chunk])
+        running.update(asyncio.create_task(answer(item, found)) for item, found in zip(chunk, retrieved))
+        while len(running) > chunk_size:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+    if running:
+        for task in (await asyncio.wait(running))[0]:
+            task.result()
+
+
+def export_json(output_path: str, items: List[dict], json_path: str):
+    """JSONL 결과를 질문 순서대로 정렬해 run_inference.py와 같은 형식의 JSON 배열로 저장"""
+    records = {}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            records[record["id"]] = {key: record[key] for key in ("original_text", "question", "answer")}
+    results = [records[item["id"]] for item in items if item["id"] in records]
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return len(results)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="테스트셋 전체 일괄 추론 (JSONL 스트리밍 + 체크포인트 재개)")
+    parser.add_argument("--data_dir", type=str, default="./data/test", help="extract_question_*.json이 있는 디렉토리")
+    parser.add_argument("--output", type=str, default="./data/result/bulk_results.jsonl")
+    parser.add_argument("--checkpoint", type=str, default="", help="완료 id 체크포인트 경로 (기본: <output>.checkpoint)")
+    parser.add_argument("--export_json", type=str, default="", help="끝나면 질문 순서대로 JSON 배열로도 저장할 경로")
+    parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--limit", type=int, default=0, help="처리할 질문 수 상한 (0이면 전체)")
+    parser.add_argument("--chunk_size", type=int, default=64, help="한 번에 검색할 질문 수")
+    parser.add_argument("--concurrency", type=int, default=8, help="Gemini 동시 호출 상한")
+    parser.add_argument("--rps", type=float, default=0.0, help="초당 Gemini 호출 상한 (0이면 제한 없음)")
+    parser.add_argument("--cascade", action="store_true", help="검색 점수로 어휘 검색/few-shot 조회를 생략하는 적응형 검색 사용")
+    parser.add_argument("--llm_backend", type=str, default="gemini", help="LLM 백엔드 (gemini / stub)")
+    parser.add_argument("--vector_db_path", type=str, default="", help="검색할 벡터 DB 경로 (기본: 설정의 VECTOR_DB_PATH)")
+    parser.add_argument("--sharded_store", action="store_true", help="sharded_store.py로 만든 샤드 스토어를 검색 (여러 정보공개서를 한 번에)")
+    parser.add_argument("--shard_search_workers", type=int, default=8, help="샤드 병렬 검색 스레드 수")
+    args = parser.parse_args()
+
+    items = load_questions(args.data_dir)
+    if args.limit > 0:
+        items = items[:args.limit]
+    writer = CheckpointWriter(args.output, args.checkpoint or None)
+    pending = [item for item in items if item["id"] not in writer.done]
+    print(f"📝 질문 {len(items)}개 중 완료 {len(items) - len(pending)}개, 남은 {len(pending)}개")
+
+    from config import Settings
+
+    settings = Settings(DEVICE=args.device)
+    vector_db_path = args.vector_db_path or settings.VECTOR_DB_PATH
+    if pending:
+        # 질문 파일의 정보공개서가 검색 대상 스토어에 있는지 확인 (없으면 기록하지 않고 다음 실행으로 미룸)
+        pending = filter_indexed(pending, args.data_dir, store_franchises(vector_db_path, args.sharded_store))
+        if not pending:
+            print("⚠ 스토어에 색인된 정보공개서의 질문이 없습니다. --vector_db_path / --sharded_store를 확인하세요.")
+
+    if pending:
+        from fewshot_franchise import GeminiFewShotFranchiseService
+
+        service = GeminiFewShotFranchiseService(
+            api_key=settings.GEMINI_API_KEY,
+            config={
+                "vector_db_path": vector_db_path,
+                "sharded_store": args.sharded_store,
+                "shard_search_workers": args.shard_search_workers,
+                "model_name": settings.MODEL_NAME,
+                "embedding_model_path": settings.EMBEDDING_MODEL_PATH,
+                "embedding_model_name": settings.EMBEDDING_MODEL_NAME,
+                "embedding_cache_dir": settings.EMBEDDING_CACHE_DIR,
+                "embedding_backend": settings.EMBEDDING_BACKEND,
+                "answer_cache_dir": settings.ANSWER_CACHE_DIR,
+                "answer_cache_threshold": settings.ANSWER_CACHE_THRESHOLD,
+                "answer_cache_min_overlap": settings.ANSWER_CACHE_MIN_OVERLAP,
+                "device": settings.DEVICE,
+                "vectorstore_search_k": 1,
+                "cascade": args.cascade,
+                "llm_backend": args.llm_backend,
+                "llm_max_concurrency": args.concurrency,
+            },
+        )
+        progress = Progress(len(pending))
+        try:
+            asyncio.run(run_bulk(
+                service, pending, writer, progress,
+                chunk_size=args.chunk_size, concurrency=args.concurrency, rate_limit=args.rps,
+            ))
+        except KeyboardInterrupt:
+            print("\n⏸️ 중단됨 — 같은 명령으로 다시 실행하면 이어서 진행합니다.")
+        finally:
+            writer.close()
+            print(progress.report())
+        if progress.failed:
+            print(f"⚠ 실패 {progress.failed}건은 체크포인트에 기록하지 않았습니다. 다시 실행하면 재시도합니다.")
+    else:
+        writer.close()
+
+    print(f"✅ 결과 JSONL: {Path(args.output).resolve()}")
+    if args.export_json:
+        count = export_json(args.output, items, args.export_json)
+        print(f"✅ JSON 저장 완료: {Path(args.export_json).resolve()} ({count}개)")
+
+
+if __name__ == "__main__":
+    main()
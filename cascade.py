@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import namedtuple
+from typing import Optional, Sequence
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# margin: 상위 1·2위 거리의 상대 격차, confident: 이후 단계 생략, ambiguous: k를 넓혀 재검색
+CascadeDecision = namedtuple("CascadeDecision", ["margin", "confident", "ambiguous"])
+
+
+class CascadePolicy:
+    """메인 스토어 검색 거리로 이후 단계를 생략하거나 넓히는 적응형 검색 정책
+
+    margin = (d2 - d1) / d2 (d1, d2: 상위 1·2위 L2 거리)
+    - margin >= confident_margin: 최상위 청크가 확실 → 어휘 검색 융합과 few-shot 예시 조회를 생략하고 k를 min_k로 줄임
+    - margin <  ambiguous_margin: 애매함 → k를 wide_k로 넓혀 다시 검색한 뒤 어휘 검색과 융합
+    - 그 외: 기존과 같이 k개 검색 + 어휘 검색 융합 + few-shot 조회
+    임계값은 benchmark.py --cascade로 recall이 유지되는지 확인하며 조정한다.
+    """
+
+    STAGES = ("lexical", "fewshot", "widen")
+
+    def __init__(self, confident_margin: float = 0.15, ambiguous_margin: float = 0.02, min_k: int = 1, wide_k: int = 20):
+        self.confident_margin = confident_margin
+        self.ambiguous_margin = ambiguous_margin
+        self.min_k = min_k
+        self.wide_k = wide_k
+        self._lock = threading.Lock()
+        self._runs = {stage: 0 for stage in self.STAGES}
+        self._skips = {stage: 0 for stage in self.STAGES}
+
+    @classmethod
+    def from_config(cls, config: dict) -> Optional["CascadePolicy"]:
+        """config["cascade"]가 True면 기본값, dict면 그 값으로 생성 (없으면 None = 모든 단계 실행)"""
+        options = config.get("cascade")
+        if not options:
+            return None
+        policy = cls(**options) if isinstance(options, dict) else cls()
+        logger.info(
+            f"적응형 검색 사용: confident_margin={policy.confident_margin}, ambiguous_margin={policy.ambiguous_margin}, "
+            f"min_k={policy.min_k}, wide_k={policy.wide_k}"
+        )
+        return policy
+
+    def options(self) -> dict:
+        return {
+            "confident_margin": self.confident_margin,
+            "ambiguous_margin": self.ambiguous_margin,
+            "min_k": self.min_k,
+            "wide_k": self.wide_k,
+        }
+
+    @staticmethod
+    def relative_margin(distances: Sequence[float]) -> float:
+        if len(distances) < 2:
+            return float("inf")  # 후보가 하나뿐이면 경쟁 문서가 없으므로 확실한 것으로 봄
+        d1, d2 = distances[0], distances[1]
+        return (d2 - d1) / max(abs(d2), 1e-12)
+
+    def decide(self, distances: Sequence[float]) -> CascadeDecision:
+        margin = self.relative_margin(distances)
+        return CascadeDecision(margin, margin >= self.confident_margin, margin < self.ambiguous_margin)
+
+    def record(self, stage: str, ran: bool):
+        """단계 실행/생략 횟수 기록 (metrics에는 cascade_stage_runs / cascade_stage_skips 카운터로 노출)"""
+        with self._lock:
+            (self._runs if ran else self._skips)[stage] += 1
+        metrics.inc("cascade_stage_runs" if ran else "cascade_stage_skips", stage=stage)
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for stage in self.STAGES:
+                total = self._runs[stage] + self._skips[stage]
+                result[stage] = {
+                    "runs": self._runs[stage],
+                    "skips": self._skips[stage],
+                    "skip_rate": round(self._skips[stage] / total, 4) if total else 0.0,
+                }
+            return result
@@ -1,19 +1,36 @@
 # config.py
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    GEMINI_API_KEY: str
+    GEMINI_API_KEY: str = ""  # Gemini 백엔드를 실제로 호출할 때 검증
     VECTOR_DB_PATH: str = "./vector_db/franchise"
     MODEL_NAME: str = "gemini-2.0-flash"
     EMBEDDING_MODEL_NAME: str = "nlpai-lab/KURE-v1"
     EMBEDDING_MODEL_PATH: str = "C:\\Users\\oreo\\.cache\\huggingface\\hub\\models--nlpai-lab--KURE-v1\\snapshots\\d14c8a9423946e268a0c9952fecf3a7aabd73bd9"
     JSON_PATH: str = "./data/test.json"
     DEVICE: str = "cpu"
+    EMBEDDING_CACHE_DIR: str = "./vector_db/embedding_cache"
+    EMBEDDING_CACHE_MAX_MB: int = 2048
+    EMBEDDING_BACKEND: str = "hf"  # 질의 임베딩 백엔드 (hf: fp32, int8: CPU 동적 양자화)
+    ANSWER_CACHE_DIR: str = ""  # 답변 캐시 경로 (기본은 사용 안 함, 예: ./vector_db/answer_cache)
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_MIN_OVERLAP: float = 0.8  # 캐시 재사용에 필요한 질문 문자 bigram Jaccard 하한
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = True  # 대소문자 구분 활성화
 
-# 전역 설정 객체 생성
-settings = Settings()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """전역 설정 객체 (처음 사용할 때 한 번만 생성)"""
+    return Settings()
+
+
+def __getattr__(name):
+    # `from config import settings` 처럼 실제로 접근할 때 생성 (import만으로는 .env를 읽지 않음)
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
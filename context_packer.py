@@ -0,0 +1,127 @@
+import json
+import logging
+import re
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 프롬프트에 남길 메타데이터 (나머지 ID/번호 필드는 답변에 도움이 되지 않아 제외)
+HEADER_FIELDS = ("BRAND_NM", "JNGHDQRTRS_CONM_NM", "KORN_UP_ATRB_NM", "KORN_ATTRB_NM")
+
+_SPACES = re.compile(r"\s+")
+
+# 이보다 짧은 줄("- 해당 없음" 등)은 문서마다 의미가 다를 수 있어 중복 제거 대상에서 제외
+MIN_DEDUP_LINE_LENGTH = 15
+
+
+class TokenCounter:
+    """토크나이저 기반 토큰 수 계산 (토크나이저가 없으면 문자 수 기반 추정)"""
+
+    def __init__(self, tokenizer=None, chars_per_token: float = 2.0):
+        self.tokenizer = tokenizer
+        self.chars_per_token = chars_per_token
+
+    @classmethod
+    def from_embeddings(cls, embeddings) -> "TokenCounter":
+        """임베딩 객체(HuggingFaceEmbeddings 또는 CachedEmbeddings)가 가진 SentenceTransformer 토크나이저 사용"""
+        inner = getattr(embeddings, "embeddings", embeddings)
+        client = getattr(inner, "_client", None)
+        tokenizer = getattr(client, "tokenizer", None)
+        if tokenizer is None:
+            logger.warning("토크나이저를 찾지 못해 문자 수 기반으로 토큰 수를 추정합니다.")
+        return cls(tokenizer)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return int(len(text) / self.chars_per_token) + 1
+
+
+def document_text(page_content: str) -> str:
+    """문서 본문 추출. embedding.py가 만든 JSON 형식([{"topic",...}])일 때만 파싱"""
+    if not page_content.startswith("[{"):
+        return page_content
+    try:
+        items = json.loads(page_content)
+    except json.JSONDecodeError:
+        return page_content
+    return "\n".join(
+        f"주제: {item.get('topic', '')}\n소주제: {item.get('sub_topic', '')}\n내용: {item.get('contents', '')}"
+        for item in items if isinstance(item, dict)
+    )
+
+
+class ContextPacker:
+    """검색 순위(관련도) 순서대로 토큰 예산 안에서 컨텍스트를 채우는 패커
+
+    - 이미 들어간 긴 줄과 같은 줄은 다시 넣지 않음 (겹치는 청크 중복 제거)
+    - 메타데이터는 브랜드/항목명만 헤더로 한 번 표기
+    - 예산을 넘는 문서는 건너뛰고 다음 문서로 계속 채움 (첫 문서가 예산보다 크면 줄 단위로 잘라 넣음)
+    """
+
+    def __init__(self, token_counter: TokenCounter, max_tokens: int = 4000):
+        self.token_counter = token_counter
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def _header(index: int, metadata: Optional[dict]) -> str:
+        values = []
+        for field in HEADER_FIELDS:
+            value = (metadata or {}).get(field)
+            if value and str(value) not in values:
+                values.append(str(value))
+        return f"[문서 {index}] " + " | ".join(values) if values else f"[문서 {index}]"
+
+    def pack(self, docs) -> str:
+        seen_lines = set()
+        sections: List[str] = []
+        used_tokens = 0
+        skipped = 0
+
+        for doc in docs:
+            lines = []
+            new_keys = set()
+            for line in document_text(doc.page_content).splitlines():
+                key = _SPACES.sub(" ", line).strip()
+                if not key:
+                    continue
+                if len(key) >= MIN_DEDUP_LINE_LENGTH:
+                    if key in seen_lines or key in new_keys:
+                        continue
+                    new_keys.add(key)
+                lines.append(line.rstrip())
+            if not lines:
+                continue
+
+            header = self._header(len(sections) + 1, doc.metadata)
+            section = header + "\n" + "\n".join(lines)
+            tokens = self.token_counter.count(section)
+
+            if used_tokens + tokens > self.max_tokens:
+                if sections:
+                    skipped += 1
+                    continue
+                section, tokens = self._truncate(header, lines)
+
+            sections.append(section)
+            seen_lines |= new_keys
+            used_tokens += tokens
+
+        if skipped:
+            logger.info(f"컨텍스트 토큰 예산({self.max_tokens}) 초과로 {skipped}개 문서 제외")
+        logger.info(f"컨텍스트 구성: {len(sections)}개 문서, {used_tokens} 토큰")
+        return "\n\n".join(sections)
+
+    def _truncate(self, header: str, lines: List[str]):
+        """예산에 맞을 때까지 앞에서부터 줄을 채움"""
+        kept = []
+        tokens = self.token_counter.count(header)
+        for line in lines:
+            line_tokens = self.token_counter.count(line) + 1
+            if tokens + line_tokens > self.max_tokens:
+                break
+            kept.append(line)
+            tokens += line_tokens
+        return header + "\n" + "\n".join(kept), tokens
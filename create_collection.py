@@ -1,11 +1,16 @@
 import os
 import json
 import time
+import hashlib
 from pathlib import Path
 from config import Settings
+from brand_router import ROUTER_FILE_NAME, BrandRouter
+from lexical_index import INDEX_FILE_NAME, LexicalIndex
+from embedding_cache import load_embeddings
+from metrics import metrics
+import snapshots
 import argparse
 from langchain.docstore.document import Document
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_chroma import Chroma
 import logging
 import shutil
@@ -14,123 +19,247 @@ import sys
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-logger.info("지식베이스 생성 중입니다...")
+COLLECTION_NAME = "contracts_collection"
+MANIFEST_FILE_NAME = "chunk_manifest.json"
 
-# --- JSON_PATH만 외부 인자로 받음 ---
-parser = argparse.ArgumentParser()
-parser.add_argument("--json_path", type=str, required=True, help="테스트 JSON 파일 경로")
-parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
-args = parser.parse_args()
 
+def chunk_id(contract: dict) -> str:
+    """정보공개서 일련번호 + 항목 번호 + 청크 번호로 청크의 고유 ID 생성
 
-# -----------------------
-# 절대경로로 변경
-# -----------------------
+    CHNK_NO/SMRT_CHNK_NO는 항목(ATTRB_MNNO)마다 1부터 다시 시작하므로 항목 번호까지 포함해야 고유하다.
+    """
+    return (
+        f"{contract['JNG_INFO']['JNG_IFRMP_SN']}_{contract['ATTRB_INFO']['ATTRB_MNNO']}"
+        f"_{contract['CHNK_NO']}_{contract['SMRT_CHNK_NO']}"
+    )
 
-json_path = Path(args.json_path).resolve()
-vector_db_path = Path("./vector_db/franchise").resolve()
-settings = Settings(JSON_PATH=str(json_path),VECTOR_DB_PATH=str(vector_db_path),DEVICE=args.device)
 
+def content_hash(text: str, metadata: dict) -> str:
+    """본문과 메타데이터를 합친 내용 해시 (변경 감지용)"""
+    payload = json.dumps([text, metadata], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-if not json_path.exists():
-    print(f"❌ JSON 파일이 존재하지 않습니다: {json_path}")
-    sys.exit(1)
-try:
-    with open(json_path, 'r', encoding='utf-8') as f:
-        contracts_data = json.load(f)
-except Exception as e:
-    print(f"❌ JSON 파싱 실패: {e}")
-    sys.exit(1)
 
-# HuggingFace 임베딩 모델 초기화
-try:
-    embeddings = HuggingFaceEmbeddings(
-        model_name=settings.EMBEDDING_MODEL_PATH,
-        model_kwargs={'device': 'cuda'}
-    )
-    print("로컬 임베딩 모델 로드 성공")
-except Exception:
-    print("로컬 임베딩 모델 로드 실패, 온라인 모델을 사용합니다")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=settings.EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': 'cuda'}
-    )
+def load_contract_documents(json_path: Path, contracts_data: list):
+    """정보공개서 JSON에서 (chunk_id, Document) 목록과 추출 질문 목록을 생성"""
+    chunks = {}
+    questions = []
+
+    for idx, contract in enumerate(contracts_data):
+        original_text = contract.get("QL", {}).get("EXTRACTED_SUMMARY_TEXT", "").strip()
+        if not original_text:
+            continue
+
+        metadata = {
+            "CHNK_NO": contract["CHNK_NO"],
+            "SMRT_CHNK_NO": contract["SMRT_CHNK_NO"],
+            "JNG_BIZ_CRTRA_YR": contract["JNG_INFO"]["JNG_BIZ_CRTRA_YR"],
+            "JNGHDQRTRS_CONM_NM": contract["JNG_INFO"]["JNGHDQRTRS_CONM_NM"],
+            "BRAND_NM": contract["JNG_INFO"]["BRAND_NM"],
+            "JNG_IFRMP_SN": contract["JNG_INFO"]["JNG_IFRMP_SN"],
+            "ATTRB_MNNO": contract["ATTRB_INFO"]["ATTRB_MNNO"],
+            "KORN_ATTRB_NM": contract["ATTRB_INFO"]["KORN_ATTRB_NM"],
+            "UP_ATTRB_MNNO": contract["ATTRB_INFO"]["UP_ATTRB_MNNO"],
+            "KORN_UP_ATRB_NM": contract["ATTRB_INFO"]["KORN_UP_ATRB_NM"],
+            "source": json_path.name
+        }
+
+        chunks[chunk_id(contract)] = Document(page_content=original_text, metadata=metadata)
+
+        for qa in contract.get("QL", {}).get("QAs", []):
+            questions.append({
+                "question": qa["QUESTION"],
+                "source_doc": json_path.name,
+                "contract_idx": idx
+            })
+
+    return chunks, questions
+
 
-print(f"임베딩 모델 {settings.EMBEDDING_MODEL_NAME} 로딩 완료")
-
-# 벡터 저장소 디렉토리 생성
-if os.path.exists(vector_db_path):
-    shutil.rmtree(vector_db_path)
-
-# 새로 생성
-os.makedirs(vector_db_path)
-
-questions = []
-documents = []
-ids = []
-succ_cnt = 0
-
-for idx, contract in enumerate(contracts_data):
-    original_text = contract.get("QL", {}).get("EXTRACTED_SUMMARY_TEXT", "").strip()
-    if not original_text:
-        continue
-
-    metadata = {
-        "CHNK_NO": contract["CHNK_NO"],
-        "SMRT_CHNK_NO": contract["SMRT_CHNK_NO"],
-        "JNG_BIZ_CRTRA_YR": contract["JNG_INFO"]["JNG_BIZ_CRTRA_YR"],
-        "JNGHDQRTRS_CONM_NM": contract["JNG_INFO"]["JNGHDQRTRS_CONM_NM"],
-        "BRAND_NM": contract["JNG_INFO"]["BRAND_NM"],
-        "JNG_IFRMP_SN": contract["JNG_INFO"]["JNG_IFRMP_SN"],
-        "ATTRB_MNNO": contract["ATTRB_INFO"]["ATTRB_MNNO"],
-        "KORN_ATTRB_NM": contract["ATTRB_INFO"]["KORN_ATTRB_NM"],
-        "UP_ATTRB_MNNO": contract["ATTRB_INFO"]["UP_ATTRB_MNNO"],
-        "KORN_UP_ATRB_NM": contract["ATTRB_INFO"]["KORN_UP_ATRB_NM"],
-        "source": json_path.name
-    }
-
-    doc_id = f"{json_path.name}_{idx}"
-    documents.append(Document(page_content=original_text, metadata=metadata))
-    ids.append(doc_id)
-    succ_cnt += 1
-
-    for qa in contract.get("QL", {}).get("QAs", []):
-        questions.append({
-            "question": qa["QUESTION"],
-            "source_doc": json_path.name,
-            "contract_idx": idx
-        })
-
-
-logger.info(f"📄 총 {succ_cnt}개의 문서 처리 완료")
-# 질문 저장 경로: JSON 원본과 같은 디렉토리
-question_save_path = json_path.parent / f"extract_question_{json_path.name}"
-
-# JSON 파일로 저장
-with open(question_save_path, "w", encoding="utf-8") as f:
-    json.dump(questions, f, ensure_ascii=False, indent=2)
-
-logger.info(f"📝 총 {len(questions)}개의 질문이 추출되어 저장되었습니다.")
-
-# -----------------------
-# 벡터 저장소 생성
-# -----------------------
-os.makedirs(settings.VECTOR_DB_PATH, exist_ok=True)
-
-try:
-    logger.info(f"✅ 벡터 스토어 생성 중... 저장 경로: {settings.VECTOR_DB_PATH}")
-    start_time = time.time()
-    Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        collection_name="contracts_collection",
-        persist_directory=settings.VECTOR_DB_PATH,
-        ids=ids
+def build_lexical_index(chunks: dict) -> LexicalIndex:
+    """청크 본문으로 문자 n-gram BM25 색인 생성 (JNG_IFRMP_SN을 그룹으로 기록)"""
+    return LexicalIndex.build(
+        list(chunks),
+        [doc.page_content for doc in chunks.values()],
+        [doc.metadata["JNG_IFRMP_SN"] for doc in chunks.values()],
     )
 
-    elapsed = time.time() - start_time
-    logger.info(f"✅ 지식베이스가 생성되었습니다. (⏱️ {elapsed:.2f}초)")
-    logger.info(f"📍 저장 위치: {settings.VECTOR_DB_PATH}")
-except Exception as e:
-    logger.error(f"❌ 벡터 스토어 생성 실패: {e}")
-    sys.exit(1)
\ No newline at end of file
+
+def load_manifest(vector_db_path: Path) -> dict:
+    manifest_path = Path(vector_db_path) / MANIFEST_FILE_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        logger.warning(f"⚠ manifest 파싱 실패, 전체 재색인합니다: {manifest_path}")
+        return {}
+
+
+def save_manifest(vector_db_path: Path, manifest: dict):
+    manifest_path = Path(vector_db_path) / MANIFEST_FILE_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def sync_collection(vectorstore: Chroma, chunks: dict, manifest: dict) -> dict:
+    """manifest와 비교해 신규/변경 청크만 임베딩하고, 사라진 청크는 삭제"""
+    hashes = {cid: content_hash(doc.page_content, doc.metadata) for cid, doc in chunks.items()}
+
+    # manifest는 있는데 컬렉션이 비어있으면(수동 삭제 등) 전체 재색인
+    if manifest and vectorstore._collection.count() == 0:
+        logger.warning("⚠ manifest와 컬렉션이 일치하지 않아 전체 재색인합니다.")
+        manifest = {}
+
+    changed = [cid for cid, h in hashes.items() if manifest.get(cid) != h]
+    if manifest:
+        removed = [cid for cid in manifest if cid not in hashes]
+    else:
+        # manifest 없이 만들어진 기존 컬렉션은 남은 청크를 모두 정리
+        existing_ids = vectorstore._collection.get(include=[])["ids"]
+        removed = [cid for cid in existing_ids if cid not in hashes]
+    unchanged = len(hashes) - len(changed)
+
+    if removed:
+        vectorstore.delete(ids=removed)
+    if changed:
+        vectorstore.add_documents(documents=[chunks[cid] for cid in changed], ids=changed)
+
+    logger.info(f"🔁 신규/변경 {len(changed)}개 임베딩, 삭제 {len(removed)}개, 변경 없음 {unchanged}개")
+    return hashes
+
+
+def main():
+    logger.info("지식베이스 생성 중입니다...")
+
+    # --- JSON_PATH만 외부 인자로 받음 ---
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--json_path", type=str, required=True, help="테스트 JSON 파일 경로")
+    parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--workers", type=int, default=1, help="CPU 임베딩 워커 프로세스 수 (device=cpu일 때만 사용)")
+    parser.add_argument("--keep_versions", type=int, default=2, help="남겨 둘 게시 버전 수 (현재 버전 포함)")
+    parser.add_argument("--in_place", action="store_true", help="버전 디렉토리 없이 현재 벡터 DB를 직접 갱신 (이전 방식)")
+    parser.add_argument("--metrics_out", type=str, default="", help="단계별 소요 시간 저장 경로 (.prom이면 Prometheus 텍스트, 그 외 JSON)")
+    args = parser.parse_args()
+
+    # -----------------------
+    # 절대경로로 변경
+    # -----------------------
+    json_path = Path(args.json_path).resolve()
+    vector_db_root = Path("./vector_db/franchise").resolve()
+    # 현재 게시된 버전 (버전 구조가 아니면 루트 자체)
+    _, active_path = snapshots.resolve(str(vector_db_root))
+    vector_db_path = Path(active_path)
+    settings = Settings(JSON_PATH=str(json_path),VECTOR_DB_PATH=str(vector_db_path),DEVICE=args.device)
+
+    if not json_path.exists():
+        print(f"❌ JSON 파일이 존재하지 않습니다: {json_path}")
+        sys.exit(1)
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            contracts_data = json.load(f)
+    except Exception as e:
+        print(f"❌ JSON 파싱 실패: {e}")
+        sys.exit(1)
+
+    chunks, questions = load_contract_documents(json_path, contracts_data)
+    logger.info(f"📄 총 {len(chunks)}개의 문서 처리 완료")
+
+    # 질문 저장 경로: JSON 원본과 같은 디렉토리
+    question_save_path = json_path.parent / f"extract_question_{json_path.name}"
+
+    # JSON 파일로 저장
+    with open(question_save_path, "w", encoding="utf-8") as f:
+        json.dump(questions, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"📝 총 {len(questions)}개의 질문이 추출되어 저장되었습니다.")
+
+    # 변경분이 없고 라우터/어휘 색인도 있으면 아무것도 쓰지 않고 종료
+    manifest = load_manifest(vector_db_path)
+    router = BrandRouter.from_documents(chunks.values())
+    unchanged = bool(manifest) and manifest == {cid: content_hash(doc.page_content, doc.metadata) for cid, doc in chunks.items()}
+    try:
+        if unchanged and (vector_db_path / ROUTER_FILE_NAME).exists() and (vector_db_path / INDEX_FILE_NAME).exists():
+            logger.info("✅ 변경된 청크가 없어 재색인을 건너뜁니다.")
+            logger.info(f"📍 저장 위치: {settings.VECTOR_DB_PATH}")
+            return
+        update_vector_db(args, settings, chunks, manifest, router, vector_db_root, vector_db_path, unchanged)
+    finally:
+        if args.metrics_out:
+            metrics.save(args.metrics_out, fmt="prometheus" if args.metrics_out.endswith(".prom") else "json")
+
+
+def update_vector_db(args, settings, chunks, manifest, router, vector_db_root, vector_db_path, unchanged):
+    """새 버전(또는 --in_place면 현재 디렉토리)에 delta 재색인 + 라우터/어휘 색인을 쓰고 게시
+
+    청크가 그대로면(라우터/어휘 색인만 없는 경우) 임베딩 모델을 로드하지 않고 색인 파일만 새 버전에 쓴다.
+    게시된 현재 버전은 다른 프로세스가 읽고 있으므로 직접 고치지 않는다.
+    """
+    embeddings = None
+    if not unchanged:
+        # HuggingFace 임베딩 모델 초기화 (디스크 캐시 사용)
+        embeddings = load_embeddings(
+            settings.EMBEDDING_MODEL_PATH,
+            settings.EMBEDDING_MODEL_NAME,
+            device=settings.DEVICE,
+            cache_dir=settings.EMBEDDING_CACHE_DIR,
+            cache_max_mb=settings.EMBEDDING_CACHE_MAX_MB,
+            workers=args.workers,
+        )
+        print(f"임베딩 모델 {settings.EMBEDDING_MODEL_NAME} 로딩 완료")
+
+    # -----------------------
+    # 벡터 저장소 갱신 (delta 재색인)
+    # 현재 버전을 새 버전 디렉토리로 복사해 갱신한 뒤 CURRENT 포인터를 바꿔 게시 (읽는 프로세스는 중단 없이 기존 버전 사용)
+    # -----------------------
+    version = None
+    if not args.in_place:
+        version, vector_db_path = snapshots.prepare_version(str(vector_db_root))
+        settings = Settings(JSON_PATH=settings.JSON_PATH,VECTOR_DB_PATH=str(vector_db_path),DEVICE=args.device)
+    os.makedirs(settings.VECTOR_DB_PATH, exist_ok=True)
+
+    try:
+        logger.info(f"✅ 벡터 스토어 갱신 중... 저장 경로: {settings.VECTOR_DB_PATH}")
+        start_time = time.time()
+        if embeddings is not None:
+            vectorstore = Chroma(
+                embedding_function=embeddings,
+                collection_name=COLLECTION_NAME,
+                persist_directory=settings.VECTOR_DB_PATH,
+            )
+            with metrics.span("ingest_stage", stage="sync_collection"):
+                manifest = sync_collection(vectorstore, chunks, manifest)
+            save_manifest(vector_db_path, manifest)
+            del vectorstore
+        else:
+            logger.info("✅ 변경된 청크가 없어 라우터/어휘 색인만 새로 만듭니다.")
+        # 브랜드/상호명 라우터 (질문 → JNG_IFRMP_SN) 저장
+        with metrics.span("ingest_stage", stage="brand_router"):
+            router.save(vector_db_path)
+        logger.info(f"🧭 브랜드 라우터 저장: {len(router.patterns)}개 패턴")
+        # 하이브리드 검색용 어휘(BM25) 색인 저장
+        with metrics.span("ingest_stage", stage="lexical_index"):
+            lexical_index = build_lexical_index(chunks)
+            lexical_index.save(vector_db_path)
+        logger.info(f"🔤 어휘 색인 저장: {len(lexical_index.terms)}개 용어")
+
+        if version is not None:
+            snapshots.publish(str(vector_db_root), version)
+            snapshots.gc_versions(str(vector_db_root), keep=args.keep_versions)
+
+        elapsed = time.time() - start_time
+        logger.info(f"✅ 지식베이스가 생성되었습니다. (⏱️ {elapsed:.2f}초)")
+        logger.info(f"📍 저장 위치: {settings.VECTOR_DB_PATH}")
+    except Exception as e:
+        logger.error(f"❌ 벡터 스토어 생성 실패: {e}")
+        if version is not None:
+            # 게시 전이면 현재 버전은 그대로이므로 만들던 버전만 삭제
+            if snapshots.current_version(str(vector_db_root)) != version:
+                shutil.rmtree(vector_db_path, ignore_errors=True)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import atexit
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "nlpai-lab/KURE-v1"
+
+
+class EmbeddingCache:
+    """(모델 ID, 텍스트 해시) 키로 벡터를 보관하는 디스크 캐시 (크기 상한 + LRU 제거)
+
+    벡터는 float32 원시 바이트(BLOB)로 저장하여 JSON 대비 용량과 파싱 비용을 줄인다.
+    전체 크기는 시작할 때 한 번만 합산하고 이후에는 증감으로 추적하며, 조회 시각(last_access) 갱신은
+    모아 두었다가 access_flush_size개 또는 access_flush_interval초마다 한 번에 기록한다.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 2 * 1024 ** 3,
+        access_flush_size: int = 1024,
+        access_flush_interval: float = 30.0,
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "embeddings.sqlite")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 샤드 빌드 워커처럼 여러 프로세스가 같은 파일에 쓸 수 있으므로 잠금을 넉넉히 기다림
+        self._conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " key TEXT PRIMARY KEY,"
+            " vec BLOB NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON vectors(last_access)")
+        self._conn.commit()
+        self.total_bytes = self._sum_bytes()
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        self._pending_access = {}
+        self._last_flush = time.time()
+        atexit.register(self.flush)  # 종료 시 남은 조회 시각 기록
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_id: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model_id}:{digest}"
+
+    def _sum_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM vectors").fetchone()[0]
+
+    def _sizes(self, keys: List[str]) -> dict:
+        sizes = {}
+        # SQLite 바인딩 변수 개수 제한을 피하기 위해 나누어 조회
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            sizes.update(self._conn.execute(
+                f"SELECT key, LENGTH(vec) FROM vectors WHERE key IN ({placeholders})", part
+            ).fetchall())
+        return sizes
+
+    def get_many(self, keys: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            # SQLite 바인딩 변수 개수 제한을 피하기 위해 나누어 조회
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM vectors WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+            now = time.time()
+            self._pending_access.update(dict.fromkeys(found, now))
+            if (
+                len(self._pending_access) >= self.access_flush_size
+                or now - self._last_flush >= self.access_flush_interval
+            ):
+                self._flush_access()
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def _flush_access(self):
+        """모아 둔 조회 시각을 한 번의 executemany로 기록 (commit은 호출한 쪽에서)"""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE vectors SET last_access = ? WHERE key = ?",
+                [(ts, key) for key, ts in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+        self._last_flush = time.time()
+
+    def flush(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def put_many(self, items: dict):
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, array("f", vec).tobytes(), now) for key, vec in items.items()]
+        with self._lock:
+            # 덮어쓰는 키는 기존 크기만큼 빼고 더함
+            replaced = sum(self._sizes([key for key, _, _ in rows]).values())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vec, last_access) VALUES (?, ?, ?)", rows
+            )
+            self.total_bytes += sum(len(blob) for _, blob, _ in rows) - replaced
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # 같은 파일을 쓰는 다른 프로세스의 기록까지 반영하도록 제거 전에만 다시 합산
+        self._flush_access()
+        self.total_bytes = self._sum_bytes()
+        if self.total_bytes <= self.max_bytes:
+            return
+        # 상한의 90%까지 가장 오래 사용되지 않은 항목부터 제거
+        target = int(self.max_bytes * 0.9)
+        victims = []
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vec) FROM vectors ORDER BY last_access ASC"
+        ):
+            if self.total_bytes <= target:
+                break
+            victims.append((key,))
+            self.total_bytes -= size
+        self._conn.executemany("DELETE FROM vectors WHERE key = ?", victims)
+        self.evictions += len(victims)
+        logger.info(f"임베딩 캐시 LRU 제거: {len(victims)}개 (현재 {self.total_bytes / 1024 ** 2:.1f}MB)")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self.total_bytes,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class QueryVectorCache:
+    """프로세스 내 질의 벡터 LRU 캐시 (같은 질문은 인코더를 다시 호출하지 않음)"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._vectors.get(query)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._vectors.move_to_end(query)
+            self.hits += 1
+            return vector
+
+    def put(self, query: str, vector: List[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._vectors[query] = vector
+            self._vectors.move_to_end(query)
+            while len(self._vectors) > self.max_size:
+                self._vectors.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._vectors),
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """임베딩 객체를 감싸 디스크 캐시를 먼저 조회하는 래퍼 (HuggingFaceEmbeddings와 동일한 인터페이스)"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_id: str):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_id = model_id
+
+    def _embed_with_cache(self, texts: List[str], namespace: str, embed_fn) -> List[List[float]]:
+        keys = [EmbeddingCache.make_key(f"{self.model_id}:{namespace}", text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_with_cache(texts, "doc", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_with_cache(
+            [text], "query", lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_with_cache(texts, "query", lambda texts: embed_queries(self.embeddings, texts))
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """여러 질의를 embed_query와 같은 방식(질의용 길이 제한, 질의 캐시 namespace)으로 임베딩
+
+    배치 질의 메서드(embed_queries)가 있으면 쓰고, 질의 전용 인코딩 옵션이 없는 HuggingFaceEmbeddings는
+    질의/문서 인코딩이 같으므로 embed_documents로 묶어 처리한다. 그 외에는 embed_query를 하나씩 호출한다.
+    """
+    if not texts:
+        return []
+    batch = getattr(embeddings, "embed_queries", None)
+    if batch is not None:
+        return batch(texts)
+    if getattr(embeddings, "query_encode_kwargs", None) == {}:
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+def _with_cache(embeddings: Embeddings, cache_dir: Optional[str], cache_max_mb: int, model_id: str) -> Embeddings:
+    """cache_dir가 있으면 디스크 캐시로 감싸고, 없으면 그대로 반환"""
+    if not cache_dir:
+        return embeddings
+    cache = EmbeddingCache(cache_dir, max_bytes=cache_max_mb * 1024 ** 2)
+    logger.info(f"임베딩 캐시 사용: {cache.path}")
+    return CachedEmbeddings(embeddings, cache, model_id=model_id)
+
+
+def load_embeddings(
+    model_path: str,
+    model_name: str = DEFAULT_MODEL_NAME,
+    device: str = "cpu",
+    cache_dir: Optional[str] = None,
+    cache_max_mb: int = 2048,
+    workers: int = 1,
+    backend: str = "hf",
+) -> Embeddings:
+    """로컬 모델 → 온라인 모델 순으로 HuggingFaceEmbeddings를 로드하고, cache_dir가 있으면 캐시로 감싼다
+
+    device가 cpu이고 workers > 1이면 워커 프로세스마다 모델 복제본을 두는 ParallelEncoder를 사용한다.
+    backend="int8"이면 동적 int8 양자화 모델(QuantizedEmbeddings)을 CPU에서 사용한다.
+    """
+    if backend == "int8":
+        from quantized_embedder import QuantizedEmbeddings
+        logger.info(f"int8 양자화 임베딩 모델 로드 중: {model_path}")
+        try:
+            embeddings = QuantizedEmbeddings(model_path)
+        except Exception as e:
+            logger.error(f"로컬 임베딩 모델 로드 실패, 온라인 모델을 사용합니다: {str(e)}")
+            embeddings = QuantizedEmbeddings(model_name)
+        # 양자화 벡터는 fp32 벡터와 다르므로 캐시 키를 분리
+        return _with_cache(embeddings, cache_dir, cache_max_mb, model_id=f"{model_name}:int8")
+    if backend != "hf":
+        raise ValueError(f"지원하지 않는 임베딩 백엔드: {backend}")
+
+    if workers > 1 and device == "cpu":
+        from parallel_encoder import ParallelEncoder
+        embeddings = ParallelEncoder(model_path, model_name, workers=workers)
+        return _with_cache(embeddings, cache_dir, cache_max_mb, model_id=model_name)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    logger.info(f"로컬 임베딩 모델 로드 중: {model_path}")
+    try:
+        embeddings = HuggingFaceEmbeddings(
+            model_name=model_path,  # 로컬 경로 사용
+            model_kwargs={'device': device}
+        )
+        logger.info("로컬 임베딩 모델 로드 성공")
+    except Exception as e:
+        logger.error(f"로컬 임베딩 모델 로드 실패, 온라인 모델을 사용합니다: {str(e)}")
+        # 실패 시 온라인 모델로 폴백
+        embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': device}
+        )
+
+    return _with_cache(embeddings, cache_dir, cache_max_mb, model_id=model_name)
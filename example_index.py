@@ -0,0 +1,330 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from qa_payload_store import PAYLOAD_DIR_NAME, QAPayloadStore
+from snapshots import gc_versions, prepare_version, publish, resolve
+
+logger = logging.getLogger(__name__)
+
+EXAMPLE_INDEX_DIR_NAME = "example_index"
+HEADER_FILE_NAME = "example_index.json"
+VECTORS_FILE_NAME = "questions.f16"
+CODES_FILE_NAME = "codes.u8"
+CODEBOOKS_FILE_NAME = "codebooks.npy"
+CENTROIDS_FILE_NAME = "centroids.npy"
+CELLS_FILE_NAME = "cells.i64"
+ROWS_FILE_NAME = "rows.i64"
+TOKENS_FILE_NAME = "tokens.i32"
+FORMAT_VERSION = 2
+
+
+def _subspaces(dim: int, m: int) -> int:
+    """dim을 나누어떨어지게 하는 m 이하의 가장 큰 서브공간 수"""
+    return next(c for c in range(min(m, max(dim, 1)), 0, -1) if dim % c == 0) if dim else 1
+
+
+def build_example_index(
+    payloads: QAPayloadStore,
+    embeddings,
+    token_counter,
+    out_dir: str,
+    batch_size: int = 256,
+    n_lists: int = 256,
+    m: int = 64,
+    sample_size: int = 16384,
+    iters: int = 10,
+) -> dict:
+    """사이드 스토어의 모든 예시 질문(QUESTION)을 임베딩해 질문 단위 예시 인덱스를 생성
+
+    - questions.f16: 정규화된 질문 벡터 (float16 memmap) — 후보 재정렬과 MMR에만 사용
+    - codes.u8 / codebooks.npy: 질문 벡터의 PQ 코드 (벡터당 m바이트) — 후보 탐색용 근사 내적
+    - centroids.npy: 조대(coarse) 클러스터 중심 n_lists개
+    - cells.i64: (그룹 번호, 클러스터, 시작 행, 끝 행) — 행은 (그룹(ATTRB_MNNO), 클러스터) 순으로 정렬되어 셀마다 연속
+    - rows.i64: 인덱스 행 → 사이드 스토어 예시 번호
+    - tokens.i32: 렌더링된 예시 문자열의 토큰 수 (토큰 예산 계산용)
+    out_dir/versions/<버전>/에 모두 쓴 뒤 CURRENT 포인터만 교체하므로, 읽는 프로세스는 항상 완성된 한 버전만 본다.
+    """
+    start = time.time()
+    version, version_dir = prepare_version(str(out_dir), copy=False)
+    try:
+        header = _write_example_index(payloads, embeddings, token_counter, version_dir, batch_size, n_lists, m, sample_size, iters)
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    publish(str(out_dir), version)
+    gc_versions(str(out_dir))
+    logger.info(
+        f"📦 예시 인덱스 저장: {version_dir} ({header['count']}개 질문, {len(header['groups'])}개 그룹, "
+        f"클러스터 {header['n_lists']}개, PQ {header['m']}B/벡터, {time.time() - start:.2f}초)"
+    )
+    return header
+
+
+def _write_example_index(payloads, embeddings, token_counter, directory: Path, batch_size, n_lists, m, sample_size, iters) -> dict:
+    from pq_index import encode, train_codebooks
+
+    count = payloads.example_count
+    group_names, group_ids = np.unique(payloads.example_groups().astype(str), return_inverse=True)
+
+    # 1) 예시 순서대로 임베딩해 임시 float32 memmap에 저장
+    raw = None
+    for offset in range(0, count, batch_size):
+        stop = min(offset + batch_size, count)
+        batch = np.asarray(embeddings.embed_documents([payloads.question(i) for i in range(offset, stop)]), dtype=np.float32)
+        batch /= np.maximum(np.linalg.norm(batch, axis=1, keepdims=True), 1e-12)
+        if raw is None:
+            raw = np.memmap(directory / "raw.f32", dtype=np.float32, mode="w+", shape=(count, batch.shape[1]))
+        raw[offset:stop] = batch
+        logger.info(f"  ... 예시 질문 {stop}/{count}개 임베딩")
+    dim = int(raw.shape[1]) if raw is not None else 0
+    m = _subspaces(dim, m)
+
+    # 2) 조대 클러스터와 PQ 코드북 학습 (표본), 전체 행의 클러스터 배정과 PQ 인코딩
+    if count:
+        n_lists = min(n_lists, count)
+        centroids = train_codebooks(raw, 1, n_centroids=n_lists, iters=iters, sample_size=sample_size)[0]
+        codebooks = train_codebooks(raw, m, iters=iters, sample_size=sample_size)
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        lists = np.concatenate([
+            np.argmin(centroid_norms[None, :] - 2.0 * (np.asarray(raw[b:b + 8192]) @ centroids.T), axis=1)
+            for b in range(0, count, 8192)
+        ])
+        codes = encode(raw, codebooks)
+    else:
+        n_lists = 0
+        centroids = np.zeros((0, dim), dtype=np.float32)
+        codebooks = np.zeros((m, 0, dim // m if dim else 0), dtype=np.float32)
+        lists = np.zeros(0, dtype=np.int64)
+        codes = np.zeros((0, m), dtype=np.uint8)
+
+    # 3) (그룹, 클러스터) 순으로 정렬해 저장 — 같은 셀의 행은 연속 구간
+    order = np.lexsort((lists, group_ids)) if count else np.zeros(0, dtype=np.int64)
+    if count:
+        vectors = np.memmap(directory / VECTORS_FILE_NAME, dtype=np.float16, mode="w+", shape=(count, dim))
+        for b in range(0, count, 8192):
+            vectors[b:b + 8192] = raw[order[b:b + 8192]]
+        vectors.flush()
+        del vectors
+    else:
+        (directory / VECTORS_FILE_NAME).touch()
+    del raw
+    (directory / "raw.f32").unlink(missing_ok=True)
+    codes[order].tofile(directory / CODES_FILE_NAME)
+    np.save(directory / CODEBOOKS_FILE_NAME, codebooks)
+    np.save(directory / CENTROIDS_FILE_NAME, centroids)
+    order.astype(np.int64).tofile(directory / ROWS_FILE_NAME)
+    np.asarray([token_counter.count(payloads.example(int(i))) for i in order], dtype=np.int32).tofile(directory / TOKENS_FILE_NAME)
+
+    sorted_groups, sorted_lists = group_ids[order], lists[order]
+    bounds = np.flatnonzero((np.diff(sorted_groups) != 0) | (np.diff(sorted_lists) != 0)) + 1 if count else np.zeros(0, dtype=np.int64)
+    starts = np.concatenate([[0], bounds]) if count else np.zeros(0, dtype=np.int64)
+    ends = np.concatenate([bounds, [count]]) if count else np.zeros(0, dtype=np.int64)
+    cells = np.stack([sorted_groups[starts], sorted_lists[starts], starts, ends], axis=1) if count else np.zeros((0, 4))
+    cells.astype(np.int64).tofile(directory / CELLS_FILE_NAME)
+
+    header = {
+        "format": FORMAT_VERSION,
+        "count": count,
+        "dim": dim,
+        "m": m,
+        "n_lists": n_lists,
+        "groups": [str(g) for g in group_names],
+        "payload_built_at": payloads.header.get("built_at"),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(directory / HEADER_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    return header
+
+
+class ExampleSelector:
+    """질문 단위 예시 인덱스에서 사용자 질문과 비슷하면서 서로 겹치지 않는 few-shot 예시를 토큰 예산 안에서 선택
+
+    1) 질문과 가까운 조대 클러스터 순으로 (그룹 안의) 셀을 골라 최대 max_scan행만 후보로 본다.
+    2) 후보는 PQ 코드로 근사 내적을 구하고, 상위 fetch_k개만 float16 원본으로 정확한 유사도를 다시 계산한다.
+    3) fetch_k개끼리의 유사도 행렬로 MMR(maximal marginal relevance) 점수를 벡터 연산으로 갱신한다.
+    예산을 넘는 예시는 건너뛰므로 짧고 관련 있는 예시가 우선 들어간다.
+    행렬은 모두 읽기 전용 memmap이라 프로세스 RSS에 통째로 올라가지 않고 워커끼리 페이지 캐시를 공유한다.
+    """
+
+    def __init__(self, directory: str, payloads: QAPayloadStore):
+        self.directory = Path(directory)
+        self.payloads = payloads
+        with open(self.directory / HEADER_FILE_NAME, "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        if self.header.get("payload_built_at") != payloads.header.get("built_at"):
+            logger.warning("⚠ 예시 인덱스가 현재 QA 예시 스토어보다 오래되었습니다. example_index.py build로 다시 생성하세요.")
+
+        count, dim, m = self.header["count"], self.header["dim"], self.header["m"]
+        if count:
+            self.vectors = np.memmap(self.directory / VECTORS_FILE_NAME, dtype=np.float16, mode="r", shape=(count, dim))
+            self.codes = np.memmap(self.directory / CODES_FILE_NAME, dtype=np.uint8, mode="r", shape=(count, m))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float16)
+            self.codes = np.zeros((0, m), dtype=np.uint8)
+        self.codebooks = np.load(self.directory / CODEBOOKS_FILE_NAME)
+        self.centroids = np.load(self.directory / CENTROIDS_FILE_NAME)
+        self.centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.rows = np.fromfile(self.directory / ROWS_FILE_NAME, dtype=np.int64)
+        self.tokens = np.fromfile(self.directory / TOKENS_FILE_NAME, dtype=np.int32)
+
+        # 셀은 (그룹, 클러스터) 순 — 그룹별 구간과 클러스터별 목록(그룹 무관 탐색용)
+        self.cells = np.fromfile(self.directory / CELLS_FILE_NAME, dtype=np.int64).reshape(-1, 4)
+        self.group_index = {group: i for i, group in enumerate(self.header["groups"])}
+        self.group_bounds = np.searchsorted(self.cells[:, 0], np.arange(len(self.group_index) + 1))
+        self.cells_by_list = self.cells[np.argsort(self.cells[:, 1], kind="stable")]
+        self.list_bounds = np.searchsorted(self.cells_by_list[:, 1], np.arange(self.header["n_lists"] + 1))
+
+    @classmethod
+    def load(cls, directory: str, payloads: Optional[QAPayloadStore]) -> Optional["ExampleSelector"]:
+        _, directory = resolve(directory)  # 버전 구조면 CURRENT가 가리키는 버전 (이전 구조는 directory 그대로)
+        if payloads is None or not (Path(directory) / HEADER_FILE_NAME).exists():
+            logger.warning(f"⚠ 예시 인덱스가 없습니다: {directory}")
+            return None
+        with open(Path(directory) / HEADER_FILE_NAME, "r", encoding="utf-8") as f:
+            if json.load(f).get("format") != FORMAT_VERSION:
+                logger.warning(f"⚠ 예시 인덱스 형식이 이전 버전입니다. example_index.py로 다시 생성하세요: {directory}")
+                return None
+        selector = cls(directory, payloads)
+        logger.info(f"예시 인덱스 로드: {directory} ({selector.header['count']}개 질문)")
+        return selector
+
+    def __len__(self):
+        return len(self.rows)
+
+    def candidate_cells(self, query: np.ndarray, group: Optional[str], max_scan: int, min_rows: int) -> np.ndarray:
+        """질문과 가까운 클러스터 순으로 셀을 골라 행 수 합이 max_scan이 되도록 반환 (마지막 셀은 잘라냄)
+
+        group이 있으면 그 그룹의 셀만 보고, 그룹이 없거나 min_rows보다 작으면 모든 그룹에서 클러스터 순으로 고른다.
+        """
+        # ||x - c||^2 순위 = ||c||^2 - 2 x·c 오름차순 (클러스터 배정과 같은 기준)
+        coarse = self.centroid_norms - 2.0 * (self.centroids @ query)
+        gid = self.group_index.get(str(group)) if group is not None else None
+        cells = self.cells[self.group_bounds[gid]:self.group_bounds[gid + 1]] if gid is not None else self.cells[:0]
+        if int((cells[:, 3] - cells[:, 2]).sum()) >= min_rows:
+            cells = cells[np.argsort(coarse[cells[:, 1]], kind="stable")]
+        else:
+            selected, scanned = [], 0
+            for lst in np.argsort(coarse):
+                selected.append(self.cells_by_list[self.list_bounds[lst]:self.list_bounds[lst + 1]])
+                scanned += int((selected[-1][:, 3] - selected[-1][:, 2]).sum())
+                if scanned >= max_scan:
+                    break
+            cells = np.concatenate(selected) if selected else self.cells[:0]
+
+        sizes = np.cumsum(cells[:, 3] - cells[:, 2])
+        if not len(sizes) or sizes[-1] <= max_scan:
+            return cells
+        last = int(np.searchsorted(sizes, max_scan))
+        cells = cells[:last + 1].copy()
+        cells[-1, 3] -= sizes[last] - max_scan
+        return cells
+
+    def approx_scores(self, query: np.ndarray, cells: np.ndarray):
+        """셀들의 (행 번호, PQ 근사 내적)"""
+        m, k, dsub = self.codebooks.shape
+        table = np.matmul(self.codebooks, query.reshape(m, dsub, 1)).reshape(-1)  # (m * k,)
+        lengths = cells[:, 3] - cells[:, 2]
+        rows = np.repeat(cells[:, 2] - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        codes = np.asarray(self.codes[rows], dtype=np.intp) + np.arange(0, m * k, k)
+        return rows, table.take(codes).sum(axis=1)
+
+    def select(
+        self,
+        query_vector,
+        max_examples: int = 3,
+        token_budget: int = 400,
+        lambda_mult: float = 0.7,
+        fetch_k: int = 32,
+        group: Optional[str] = None,
+        max_scan: int = 1024,
+    ) -> List[int]:
+        """선택된 인덱스 행 번호를 선택 순서대로 반환 (group이 있으면 그 그룹 안에서 먼저 고름)"""
+        if not len(self.rows) or max_examples <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        cells = self.candidate_cells(query, group, max_scan, max_examples)
+        rows, approx = self.approx_scores(query, cells)
+        if fetch_k < len(rows):
+            keep = np.argpartition(-approx, fetch_k)[:fetch_k]
+            rows = rows[keep]
+        candidates = np.sort(rows)
+
+        pool = np.asarray(self.vectors[candidates], dtype=np.float32)
+        relevance = pool @ query
+        similarity = pool @ pool.T
+        tokens = self.tokens[candidates]
+        redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+        available = tokens <= token_budget
+
+        selected = []
+        remaining = token_budget
+        while len(selected) < max_examples and available.any():
+            # 첫 예시는 관련도만, 이후에는 이미 고른 예시와 가장 비슷한 정도만큼 감점
+            penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+            scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * penalty, -np.inf)
+            best = int(np.argmax(scores))
+            selected.append(int(candidates[best]))
+            remaining -= int(tokens[best])
+            redundancy = np.maximum(redundancy, similarity[best])
+            available[best] = False
+            available &= tokens <= remaining
+        return selected
+
+    def examples(self, query_vector, **kwargs) -> List[str]:
+        """select 결과를 렌더링된 예시 문자열로 반환"""
+        return [self.payloads.example(int(self.rows[row])) for row in self.select(query_vector, **kwargs)]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="few-shot 예시 질문 인덱스 생성")
+    parser.add_argument("--vector_db_path", type=str, default="./vector_db/qa_knowledge_base")
+    parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--workers", type=int, default=1, help="CPU 임베딩 워커 프로세스 수 (device=cpu일 때만 사용)")
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--n_lists", type=int, default=256, help="조대 클러스터 수")
+    parser.add_argument("--m", type=int, default=64, help="PQ 서브공간 수 (벡터당 코드 바이트)")
+    args = parser.parse_args()
+
+    from config import get_settings
+    from context_packer import TokenCounter
+    from embedding_cache import load_embeddings
+
+    # 버전 구조면 현재 게시된 버전 안에 만든다 (새 버전을 만들 때는 qa_knowledge_base.py --example_index)
+    _, vector_db_path = resolve(os.path.abspath(args.vector_db_path))
+    payloads = QAPayloadStore.load(os.path.join(vector_db_path, PAYLOAD_DIR_NAME))
+    if payloads is None:
+        raise SystemExit("QA 예시 스토어가 없습니다. qa_knowledge_base.py를 먼저 실행하세요.")
+    settings = get_settings()
+    embeddings = load_embeddings(
+        settings.EMBEDDING_MODEL_PATH,
+        settings.EMBEDDING_MODEL_NAME,
+        device=args.device,
+        cache_dir=settings.EMBEDDING_CACHE_DIR,
+        cache_max_mb=settings.EMBEDDING_CACHE_MAX_MB,
+        workers=args.workers,
+    )
+    build_example_index(
+        payloads,
+        embeddings,
+        TokenCounter.from_embeddings(embeddings),
+        os.path.join(vector_db_path, EXAMPLE_INDEX_DIR_NAME),
+        batch_size=args.batch_size,
+        n_lists=args.n_lists,
+        m=args.m,
+    )
+
+
+if __name__ == "__main__":
+    main()
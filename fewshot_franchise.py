@@ -1,26 +1,131 @@
+from __future__ import annotations
+
 import os
+import asyncio
+import contextlib
 import logging
-from typing import Optional, List
+import time
+from typing import TYPE_CHECKING, Optional, List
 
 import json
+from collections import namedtuple
+
 import yaml
-from langchain_chroma import Chroma
-from langchain.docstore.document import Document
 
-from franchise import GeminiFranchiseService, logger
+from async_utils import AsyncRateLimiter
+from franchise import _UNLOADED, GeminiFranchiseService, logger
+from metrics import metrics
+from snapshots import resolve
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+    from langchain.docstore.document import Document
+
+# retrieve_batch 결과: 참고 문서 본문, 완성된 프롬프트, 답변 캐시 키
+RetrievedPrompt = namedtuple("RetrievedPrompt", ["context", "prompt", "cache_key"])
 
 
 class GeminiFewShotFranchiseService(GeminiFranchiseService):
     def __init__(self, api_key: str = None, config: dict = None):
+        # 부모 생성자에서 warm_up이 호출될 수 있으므로 지연 로딩 슬롯을 먼저 준비
+        self._qa_vectorstore = _UNLOADED
+        self._qa_index = _UNLOADED
+        self._qa_payloads = _UNLOADED
+        self._example_selector = _UNLOADED
+        # QA 지식베이스도 버전 구조(CURRENT 포인터)면 현재 버전 디렉토리를 읽음
+        self.qa_db_root = os.path.abspath(config.get("qa_vector_db_path", "./vector_db/qa_knowledge_base"))
+        self.qa_db_version, self.qa_db_path = resolve(self.qa_db_root)
         super().__init__(api_key, config)
-        self.qa_vectorstore = self._load_qa_vectorstore()
+        self._qa_version_lease = self.track_versions(self.qa_db_root, self.qa_db_version, self.reload_qa_store)
         self.prompt_template = self._load_prompt_templates("./data/prompt_template.yaml")
 
-    def _load_qa_vectorstore(self):
+        # 검색 문맥 + 질문 임베딩 기반 답변 캐시 (answer_cache_dir가 있을 때만 사용)
+        # stub 백엔드의 답변은 실제 모델 답변과 섞이지 않도록 캐시하지 않음
+        self.answer_cache = None
+        if config.get("answer_cache_dir") and self.llm.name == "stub":
+            logger.info("stub LLM 백엔드에서는 답변 캐시를 사용하지 않습니다.")
+        elif config.get("answer_cache_dir"):
+            from answer_cache import SemanticAnswerCache
+            self.answer_cache = SemanticAnswerCache(
+                config["answer_cache_dir"],
+                threshold=config.get("answer_cache_threshold", 0.95),
+                ttl_seconds=config.get("answer_cache_ttl", 7 * 24 * 3600),
+                max_entries=config.get("answer_cache_max_entries", 100_000),
+                min_overlap=config.get("answer_cache_min_overlap", 0.8),
+            )
+
+    @property
+    def qa_vectorstore(self):
+        return self._lazy("_qa_vectorstore", self._load_qa_vectorstore)
+
+    @property
+    def qa_index(self):
+        return self._lazy("_qa_index", self._load_qa_index)
+
+    @property
+    def qa_payloads(self):
+        return self._lazy("_qa_payloads", self._load_qa_payloads)
+
+    @property
+    def example_selector(self):
+        return self._lazy("_example_selector", self._load_example_selector)
+
+    def warm_up_targets(self):
+        return super().warm_up_targets() + ["qa_vectorstore", "qa_index", "qa_payloads", "example_selector"]
+
+    def static_index_options(self):
+        return super().static_index_options() + ["qa_pq_index_dir", "qa_payload_dir", "example_index_dir"]
+
+    def reload_qa_store(self) -> bool:
+        """게시된 새 QA 지식베이스 버전의 벡터스토어/파티션 인덱스/예시 스토어/예시 인덱스를 로드해 교체 (버전이 같으면 False)
+
+        이미 로드된 리소스만 새로 로드하고, 아직 로드하지 않은 리소스는 처음 사용할 때 새 경로에서 로드된다.
+        """
+        version, path = resolve(self.qa_db_root)
+        if version == self.qa_db_version:
+            return False
+        start = time.perf_counter()
+        with metrics.span("vector_db_reload", store="qa"):
+            vectorstore = self._load_qa_vectorstore(path) if self._qa_vectorstore is not _UNLOADED else _UNLOADED
+            qa_index = self._load_qa_index(vectorstore) if self._qa_index is not _UNLOADED else _UNLOADED
+            payloads = self._load_qa_payloads(path) if self._qa_payloads is not _UNLOADED else _UNLOADED
+            selector = self._load_example_selector(path, payloads) if self._example_selector is not _UNLOADED else _UNLOADED
+        self._qa_version_lease.hold(version)
+        with self._load_lock:
+            previous_store, self._qa_vectorstore = self._qa_vectorstore, vectorstore
+            self._qa_index = qa_index
+            self._qa_payloads = payloads
+            self._example_selector = selector
+            previous, self.qa_db_version, self.qa_db_path = self.qa_db_version, version, path
+        self.retire(self._qa_version_lease, previous, previous_store)
+        metrics.inc("vector_db_reloads", store="qa")
+        logger.info(f"🔄 QA 지식베이스 버전 전환: {previous} → {version} ({time.perf_counter() - start:.2f}초)")
+        return True
+
+    def close(self):
+        super().close()
+        self._qa_version_lease.release()
+
+    def _load_qa_vectorstore(self, path: str = None):
         try:
             logger.info("[QA] 벡터스토어 로딩")
+            if self.config.get("qa_pq_index_dir"):
+                # PQ 압축 인덱스 (pq_index.py build)
+                from pq_index import PQIndex
+                index = PQIndex.load(self.config["qa_pq_index_dir"], rerank=self.config.get("qa_pq_rerank"))
+                if index is not None:
+                    return index if len(index) > 0 else None
+            if self.config.get("flat_index_dir"):
+                from flat_index import FlatIndex
+                index = FlatIndex.load(
+                    os.path.join(self.config["flat_index_dir"], "contracts_qa_collection"),
+                    upcast_max_mb=self.config.get("flat_index_upcast_mb", 0),
+                )
+                if index is not None:
+                    return index if len(index) > 0 else None
+            from langchain_chroma import Chroma
             vs = Chroma(
-                persist_directory="./vector_db/qa_knowledge_base",
+                persist_directory=path or self.qa_db_path,
                 embedding_function=self.embeddings,
                 collection_name="contracts_qa_collection"
             )
@@ -31,15 +136,76 @@ class GeminiFewShotFranchiseService(GeminiFranchiseService):
             logger.error(f"[QA] 벡터스토어 로딩 실패: {str(e)}")
             return None
 
+    def _load_qa_index(self, vectorstore=_UNLOADED):
+        vectorstore = self.qa_vectorstore if vectorstore is _UNLOADED else vectorstore
+        if not (self.config.get("qa_partition_index", False) and vectorstore):
+            return None
+        # ATTRB_MNNO별 파티션 인덱스를 메모리에 올려 필터 검색을 행렬 곱으로 대체
+        from qa_partition_index import PartitionedQAIndex
+        return PartitionedQAIndex.from_chroma(
+            vectorstore, n_probe=self.config.get("qa_partition_n_probe", 8)
+        )
+
+    def _load_qa_payloads(self, path: str = None):
+        # 문서 id → 렌더링된 few-shot 예시 문자열 (qa_knowledge_base.py가 함께 생성)
+        from qa_payload_store import PAYLOAD_DIR_NAME, QAPayloadStore
+        directory = self.config.get("qa_payload_dir") or os.path.join(path or self.qa_db_path, PAYLOAD_DIR_NAME)
+        return QAPayloadStore.load(directory)
+
+    def _load_example_selector(self, path: str = None, payloads=_UNLOADED):
+        # 질문 단위 예시 인덱스 (example_index.py build) — 켜면 QA 문서 검색 대신 질문 유사도 + MMR로 예시 선택
+        if not self.config.get("fewshot_example_index", False):
+            return None
+        from example_index import EXAMPLE_INDEX_DIR_NAME, ExampleSelector
+        directory = self.config.get("example_index_dir") or os.path.join(path or self.qa_db_path, EXAMPLE_INDEX_DIR_NAME)
+        return ExampleSelector.load(directory, self.qa_payloads if payloads is _UNLOADED else payloads)
+
+    def select_examples(self, query: str, group=None) -> List[str]:
+        """사용자 질문과 비슷하고 서로 겹치지 않는 예시를 토큰 예산(fewshot_token_budget) 안에서 선택"""
+        query_vector = self.embed_query(query)  # 검색 단계에서 캐시된 벡터 재사용
+        with metrics.span("fewshot_select"):
+            return self.example_selector.examples(
+                query_vector,
+                max_examples=self.config.get("fewshot_max_examples", 3),
+                token_budget=self.config.get("fewshot_token_budget", 400),
+                lambda_mult=self.config.get("fewshot_mmr_lambda", 0.7),
+                group=group,
+                max_scan=self.config.get("fewshot_max_scan", 1024),
+            )
+
+    def qa_examples(self, doc: Document, limit: int) -> List[str]:
+        """QA 문서의 few-shot 예시 문자열 (사이드 스토어 우선, 이전 형식의 메타데이터 QAs JSON은 폴백)"""
+        doc_id = getattr(doc, "id", None)
+        if self.qa_payloads is not None and doc_id in self.qa_payloads:
+            return self.qa_payloads.examples(doc_id, limit=limit)
+        if "QAs" not in doc.metadata:
+            return []
+        from qa_payload_store import render_examples
+        try:
+            return render_examples(json.loads(doc.metadata["QAs"]))[:limit]
+        except json.JSONDecodeError:
+            return []
+
     def _load_prompt_templates(self, yaml_path: str) -> dict:
         with open(yaml_path, "r", encoding="utf-8") as f:
             return yaml.safe_load(f)
 
-    def retrieve_context(self, vectorstore: Chroma, query: str, filter: Optional[dict] = None) -> List[Document]:
-        search_kwargs = {"query": query, "k": self.vectorstore_search_k}
+    def retrieve_context(
+        self,
+        vectorstore: Chroma,
+        query: str,
+        filter: Optional[dict] = None,
+        embedding: Optional[List[float]] = None,
+    ) -> List[Document]:
+        """질의 벡터(embedding)를 받으면 재사용하고, 없으면 캐시를 거쳐 한 번만 계산"""
+        if embedding is None:
+            embedding = self.embed_query(query)
+        search_kwargs = {"embedding": embedding, "k": self.vectorstore_search_k}
         if filter:
             search_kwargs["filter"] = filter
-        return vectorstore.similarity_search(**search_kwargs)
+        store = "qa" if vectorstore is self._qa_vectorstore else "main"
+        with metrics.span("vector_search", store=store, routed="true" if filter else "false"):
+            return vectorstore.similarity_search_by_vector(**search_kwargs)
 
     def build_prompt_from_template(
         self,
@@ -47,24 +213,33 @@ class GeminiFewShotFranchiseService(GeminiFranchiseService):
         user_query: str,
         context: str,
         docs: Optional[List[Document]] = None,
-        max_examples: int = 3
+        max_examples: int = 3,
+        examples: Optional[List[str]] = None,
     ) -> str:
+        frame = self.build_prompt_frame(template_str, context, docs, max_examples, examples)
+        return self.fill_question(frame, user_query)
+
+    @staticmethod
+    def fill_question(frame: str, user_query: str) -> str:
+        return frame.replace("%question%", user_query.strip())
+
+    def build_prompt_frame(
+        self,
+        template_str: str,
+        context: str,
+        docs: Optional[List[Document]] = None,
+        max_examples: int = 3,
+        examples: Optional[List[str]] = None,
+    ) -> str:
+        """질문(%question%)만 비워 둔 프롬프트 (답변 캐시 키는 이 문자열로 만든다)"""
         examples_text = ""
 
-        if docs:
+        if examples is not None:
+            examples_text = "\n\n".join(examples) if examples else "(예시 없음)"
+        elif docs:
             qa_examples = []
             for doc in docs:
-                try:
-                    qas = json.loads(doc.metadata.get("QAs", "[]"))
-                    for qa in qas:
-                        q = qa.get("QUESTION", "").strip()
-                        a = qa.get("ANSWER", "").strip()
-                        if q and a:
-                            qa_examples.append(f"Q: {q}\nA: {a}")
-                        if len(qa_examples) >= max_examples:
-                            break
-                except json.JSONDecodeError:
-                    continue
+                qa_examples.extend(self.qa_examples(doc, max_examples - len(qa_examples)))
                 if len(qa_examples) >= max_examples:
                     break
 
@@ -74,47 +249,287 @@ class GeminiFewShotFranchiseService(GeminiFranchiseService):
             template_str
             .replace("%examples%", examples_text)
             .replace("%context%", context.strip())
-            .replace("%question%", user_query.strip())
         )
 
     def answer_question_with_prompt(self, prompt: str) -> str:
-        response = self.model.generate_content(prompt)
+        return self.llm.generate(prompt)
 
-        return response.text
+    def build_prompt(
+        self,
+        query: str,
+        context_docs: List[Document],
+        qa_docs: Optional[List[Document]] = None,
+        use_examples: bool = True,
+    ) -> str:
+        """검색된 문서로 few-shot(또는 기본) 프롬프트 구성 (use_examples=False면 cascade가 예시를 생략한 경우로 기본 프롬프트)"""
+        return self.build_prompt_with_key(query, context_docs, qa_docs, use_examples)[0]
+
+    def build_prompt_with_key(
+        self,
+        query: str,
+        context_docs: List[Document],
+        qa_docs: Optional[List[Document]] = None,
+        use_examples: bool = True,
+    ):
+        """(프롬프트, 답변 캐시 키) — 키는 실제로 쓰인 템플릿/예시로 만든다 (캐시를 안 쓰면 None)"""
+        with metrics.span("prompt_build"):
+            frame = self._build_prompt_frame(query, context_docs, qa_docs, use_examples)
+        return self.fill_question(frame, query), self.answer_cache_key(frame)
+
+    def _build_prompt_frame(
+        self,
+        query: str,
+        context_docs: List[Document],
+        qa_docs: Optional[List[Document]] = None,
+        use_examples: bool = True,
+    ) -> str:
+        context = context_docs[0].page_content
+        if not use_examples:
+            return self.build_prompt_frame(self.prompt_template["basic_template"], context)
+        if self.example_selector is not None:
+            template = self.prompt_template["fewshot_template"]
+            examples = self.select_examples(query, group=context_docs[0].metadata.get("ATTRB_MNNO"))
+            return self.build_prompt_frame(template, context, examples=examples)
+        if self.qa_vectorstore:
+            template = self.prompt_template["fewshot_template"]
+            return self.build_prompt_frame(template, context, docs=qa_docs)
+        template = self.prompt_template["basic_template"]
+        return self.build_prompt_frame(template, context)
+
+    def answer_cache_key(self, prompt_frame: str) -> Optional[str]:
+        """LLM 백엔드/모델과 질문을 제외한 프롬프트로 캐시 키 생성 (기본/few-shot 프롬프트, 예시 구성이 다르면 다른 키)"""
+        if self.answer_cache is None:
+            return None
+        from answer_cache import context_key
+        model_name = getattr(self.llm.backend, "model_name", "")
+        return context_key(f"{self.llm.name}:{model_name}", prompt_frame)
+
+    def wants_examples(self, decision) -> bool:
+        """cascade 결정상 few-shot 예시 조회가 필요한지 (최상위 청크가 확실하면 생략)"""
+        if decision is None:
+            return True
+        self.cascade.record("fewshot", not decision.confident)
+        return not decision.confident
+
+    def search_qa_store(self, query: str, query_vector, attrb_mnno) -> Optional[List[Document]]:
+        """최상위 문서와 같은 항목(ATTRB_MNNO)의 few-shot QA 문서 검색 (없으면 전체 QA에서 재검색)"""
+        if self.example_selector is not None:
+            return None  # 예시는 프롬프트 구성 시 질문 단위 인덱스에서 선택
+        if self.qa_index is not None:
+            with metrics.span("vector_search", store="qa_partition", routed="true"):
+                return self.qa_index.search(query_vector, self.vectorstore_search_k, partition=attrb_mnno)
+        if not self.qa_vectorstore:
+            return None
+        qa_docs = self.retrieve_context(
+            self.qa_vectorstore, query, filter={"ATTRB_MNNO": attrb_mnno}, embedding=query_vector
+        )
+        if not qa_docs:
+            logger.warning("⚠ 필터 조건에 맞는 QA 문서가 없어 전체 QA 벡터스토어에서 재검색합니다.")
+            qa_docs = self.retrieve_context(self.qa_vectorstore, query, embedding=query_vector)
+        return qa_docs
 
     def inference(self, query: str) -> str:
-        context_docs = self.retrieve_context(self.chroma_vectorstore, query)
+        # 질의 벡터는 한 번만 계산해 모든 스토어 검색에 재사용
+        query_vector = self.embed_query(query)
+        if self.cascade is not None:
+            context_docs, decision = self.cascade_search(query, query_vector)
+        else:
+            context_docs, decision = self.search_main_store(query, embedding=query_vector), None
         if not context_docs:
             return "❌ 관련 문서를 찾지 못했습니다."
 
-        top_doc = context_docs[0]
-        context = top_doc.page_content
-        attrb_mnno = top_doc.metadata.get("ATTRB_MNNO")
+        context = context_docs[0].page_content
+        use_examples = self.wants_examples(decision)
+        qa_docs = self.search_qa_store(query, query_vector, context_docs[0].metadata.get("ATTRB_MNNO")) if use_examples else None
 
-        if self.qa_vectorstore:
-            qa_docs = self.retrieve_context(self.qa_vectorstore, query, filter={"ATTRB_MNNO": attrb_mnno})
-            if not qa_docs:
-                logger.warning("⚠ 필터 조건에 맞는 QA 문서가 없어 전체 QA 벡터스토어에서 재검색합니다.")
-                qa_docs = self.retrieve_context(self.qa_vectorstore, query)
+        prompt, cache_key = self.build_prompt_with_key(query, context_docs, qa_docs, use_examples=use_examples)
 
-            template = self.prompt_template["fewshot_template"]
-            prompt = self.build_prompt_from_template(template, query, context, docs=qa_docs)
-        else:
-            template = self.prompt_template["basic_template"]
-            prompt = self.build_prompt_from_template(template, query, context)
+        # 프롬프트 전체 출력은 대량 처리 시 I/O 비용이 커서 DEBUG 레벨에서만 기록
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"======프롬프트======\n{prompt}")
 
-        print(f"======프롬프트======")
-        print(f"{prompt}")
-
-        ##응답 생성
-        response = self.model.generate_content(prompt)
+        ##응답 생성 (같은 문맥의 비슷한 질문이 캐시에 있으면 재사용)
+        answer = self.answer_cache.lookup(cache_key, query, query_vector) if cache_key else None
+        cached = answer is not None
+        if answer is None:
+            answer = self.llm.generate(prompt)
+            if cache_key:
+                self.answer_cache.put(cache_key, query, query_vector, answer)
 
         output =  {
             "original_text": context,
             "question": query,
-            "answer": response.text
+            "answer": answer
         }
+        if cached:
+            output["cached"] = True  # 캐시된 답변임을 표시 (일괄 결과에서 구분)
 
         return output
 
-        # return self.answer_question_with_prompt(prompt)
\ No newline at end of file
+        # return self.answer_question_with_prompt(prompt)
+
+    # ---------------------
+    # 배치 추론
+    # ---------------------
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """질문 전체를 인코더 한 번 호출로 임베딩 (embed_query와 같은 질의용 인코딩)
+
+        질의 벡터 캐시에 있는 질문은 제외하고 나머지만 인코딩한다.
+        """
+        from embedding_cache import embed_queries
+
+        vectors = [self.query_vector_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        metrics.inc("query_vector_cache_hits", len(queries) - len(missing))
+        metrics.inc("query_vector_cache_misses", len(missing))
+        if missing:
+            with metrics.span("query_embedding", mode="batch"):
+                computed = dict(zip(missing, embed_queries(self.embeddings, missing)))
+            for query, vector in computed.items():
+                self.query_vector_cache.put(query, vector)
+            vectors = [v if v is not None else computed[q] for q, v in zip(queries, vectors)]
+        return vectors
+
+    def search_by_vectors(
+        self,
+        vectorstore: Chroma,
+        vectors: List[List[float]],
+        filter: Optional[dict] = None,
+    ) -> List[List[Document]]:
+        """여러 질의 벡터를 Chroma 컬렉션에 한 번에 질의"""
+        if not vectors:
+            return []
+        return [docs for docs, _ in self.search_by_vectors_scored(vectorstore, vectors, filter)]
+
+    def search_by_vectors_scored(self, vectorstore: Chroma, vectors: List[List[float]], filter: Optional[dict] = None, k: int = None):
+        """search_by_vectors와 같지만 질의별 (문서 목록, 거리 목록)을 반환"""
+        if not vectors:
+            return []
+        store = "qa" if vectorstore is self._qa_vectorstore else "main"
+        with metrics.span("vector_search", store=store, routed="true" if filter else "false", mode="batch"):
+            return self.query_by_vectors(vectorstore, vectors, k or self.vectorstore_search_k, where=filter)
+
+    def search_main_store_batch(self, queries: List[str], vectors: List[List[float]]) -> List[List[Document]]:
+        """브랜드 라우팅 결과가 같은 질문끼리 묶어 일괄 검색하고, 빈 결과는 전체 검색으로 폴백"""
+        return self.cascade_search_batch(queries, vectors)[0]
+
+    def cascade_search_batch(self, queries: List[str], vectors: List[List[float]]):
+        """search_main_store_batch에 cascade 정책을 적용해 (질문별 문서 목록, 질문별 CascadeDecision 또는 None) 반환"""
+        # cascade는 상위 1·2위 격차가 필요하므로 최소 2개씩 검색
+        k = max(self.vectorstore_search_k, 2) if self.cascade is not None else self.vectorstore_search_k
+        groups = {}
+        for i, query in enumerate(queries):
+            route = self.route_filter(query)
+            groups.setdefault(json.dumps(route, sort_keys=True), (route, []))[1].append(i)
+
+        results = [([], []) for _ in queries]
+        for route, indices in groups.values():
+            found = self.search_by_vectors_scored(self.chroma_vectorstore, [vectors[i] for i in indices], filter=route, k=k)
+            for i, scored in zip(indices, found):
+                results[i] = scored
+
+        routes = [self.route_filter(query) for query in queries]
+        fallback = [i for i, (docs, _) in enumerate(results) if not docs]
+        if fallback:
+            found = self.search_by_vectors_scored(self.chroma_vectorstore, [vectors[i] for i in fallback], k=k)
+            for i, scored in zip(fallback, found):
+                results[i] = scored
+                routes[i] = None
+
+        if self.cascade is None:
+            return [
+                self.fuse_lexical(query, docs, route, self.vectorstore_search_k)
+                for query, (docs, _), route in zip(queries, results, routes)
+            ], [None] * len(queries)
+        refined = [
+            self.cascade_refine(query, vector, docs, distances, route)
+            for query, vector, (docs, distances), route in zip(queries, vectors, results, routes)
+        ]
+        return [docs for docs, _ in refined], [decision for _, decision in refined]
+
+    def retrieve_batch(self, queries: List[str]) -> List[Optional[RetrievedPrompt]]:
+        """질문 목록의 (참고 문서, 프롬프트, 캐시 키)를 일괄 검색으로 구성 (문서를 찾지 못하면 None)"""
+        vectors = self.embed_queries(queries)
+        context_results, decisions = self.cascade_search_batch(queries, vectors)
+        qa_results = [None] * len(queries)
+        use_examples = [bool(docs) and self.wants_examples(decision) for docs, decision in zip(context_results, decisions)]
+
+        if self.example_selector is not None:
+            pass  # 예시는 프롬프트 구성 시 질문 단위 인덱스에서 선택
+        elif self.qa_index is not None:
+            for i, docs in enumerate(context_results):
+                if use_examples[i]:
+                    qa_results[i] = self.qa_index.search(
+                        vectors[i], self.vectorstore_search_k, partition=docs[0].metadata.get("ATTRB_MNNO")
+                    )
+        elif self.qa_vectorstore:
+            # ATTRB_MNNO 필터가 같은 질문끼리 묶어 한 번에 검색
+            groups = {}
+            for i, docs in enumerate(context_results):
+                if use_examples[i]:
+                    groups.setdefault(docs[0].metadata.get("ATTRB_MNNO"), []).append(i)
+            for attrb_mnno, indices in groups.items():
+                found = self.search_by_vectors(
+                    self.qa_vectorstore, [vectors[i] for i in indices], filter={"ATTRB_MNNO": attrb_mnno}
+                )
+                for i, qa_docs in zip(indices, found):
+                    qa_results[i] = qa_docs
+
+            fallback = [i for i in range(len(queries)) if use_examples[i] and not qa_results[i]]
+            if fallback:
+                logger.warning(f"⚠ 필터 조건에 맞는 QA 문서가 없는 {len(fallback)}개 질문을 전체 QA 벡터스토어에서 재검색합니다.")
+                for i, qa_docs in zip(fallback, self.search_by_vectors(self.qa_vectorstore, [vectors[i] for i in fallback])):
+                    qa_results[i] = qa_docs
+
+        return [
+            RetrievedPrompt(
+                docs[0].page_content,
+                *self.build_prompt_with_key(query, docs, qa_docs, use_examples=examples),
+            ) if docs else None
+            for query, docs, qa_docs, examples in zip(queries, context_results, qa_results, use_examples)
+        ]
+
+    async def agenerate_answer(
+        self,
+        query: str,
+        item: Optional[RetrievedPrompt],
+        semaphore: Optional[asyncio.Semaphore] = None,
+        limiter: Optional[AsyncRateLimiter] = None,
+    ) -> dict:
+        """retrieve_batch 결과 한 건에 대해 비동기로 답변 생성 (semaphore/limiter로 호출량 제어)"""
+        if item is None:
+            return {"original_text": "", "question": query, "answer": "❌ 관련 문서를 찾지 못했습니다."}
+        context, prompt, cache_key = item
+
+        query_vector = None
+        if cache_key:
+            query_vector = self.embed_query(query)  # embed_queries에서 캐시된 벡터 재사용
+            cached = self.answer_cache.lookup(cache_key, query, query_vector)
+            if cached is not None:
+                return {"original_text": context, "question": query, "answer": cached, "cached": True}
+
+        result = {"original_text": context, "question": query}
+        async with semaphore or contextlib.nullcontext():
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                result["answer"] = await self.llm.agenerate(prompt)
+                if cache_key:
+                    self.answer_cache.put(cache_key, query, query_vector, result["answer"])
+            except Exception as e:
+                logger.error(f"답변 생성 실패: {query} ({str(e)})")
+                result["answer"] = f"죄송합니다, 답변 생성 중 오류가 발생했습니다: {str(e)}"
+                result["error"] = str(e)  # 일괄 추론에서 실패 건을 완료로 기록하지 않도록 표시
+        return result
+
+    async def ainference_batch(self, queries: List[str], concurrency: int = 8, rate_limit: float = 0.0) -> List[dict]:
+        """검색은 일괄로, Gemini 호출은 동시성 상한/속도 제한 하에 비동기로 수행 (입력 순서 유지)"""
+        retrieved = self.retrieve_batch(queries)
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = AsyncRateLimiter(rate_limit)
+        return await asyncio.gather(*(
+            self.agenerate_answer(q, item, semaphore, limiter) for q, item in zip(queries, retrieved)
+        ))
+
+    def inference_batch(self, queries: List[str], concurrency: int = 8, rate_limit: float = 0.0) -> List[dict]:
+        return asyncio.run(self.ainference_batch(queries, concurrency=concurrency, rate_limit=rate_limit))
@@ -0,0 +1,324 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+import snapshots
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HEADER_FILE_NAME = "flat_index.json"
+VECTORS_FILE_NAME = "vectors.f16"
+NORMS_FILE_NAME = "sq_norms.f32"
+TABLE_FILE_NAME = "table.json"
+
+# 내보낼 컬렉션: (Chroma 경로, 컬렉션 이름)
+EXPORT_TARGETS = {
+    "contracts_collection": "./vector_db/franchise",
+    "contracts_qa_collection": "./vector_db/qa_knowledge_base",
+}
+
+
+def export_flat_index(vectorstore, out_dir: str, page_size: int = 5000) -> dict:
+    """Chroma 컬렉션의 임베딩을 float16 memmap 행렬 + id/문서/메타데이터 테이블로 내보냄
+
+    임시 디렉토리에 모두 쓴 뒤 교체하므로 읽는 중인 프로세스가 반쯤 쓰인 파일을 보지 않는다.
+    """
+    start = time.time()
+    collection = vectorstore._collection
+    total = collection.count()
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    ids, documents, metadatas = [], [], []
+    matrix, norms = None, None
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+        )
+        vectors = np.asarray(page["embeddings"], dtype=np.float32)
+        if matrix is None:
+            matrix = np.memmap(tmp_dir / VECTORS_FILE_NAME, dtype=np.float16, mode="w+", shape=(total, vectors.shape[1]))
+            norms = np.memmap(tmp_dir / NORMS_FILE_NAME, dtype=np.float32, mode="w+", shape=(total,))
+        rows = slice(len(ids), len(ids) + len(vectors))
+        matrix[rows] = vectors
+        # 순위 계산은 float16으로 저장된 값 기준이어야 하므로 변환 후의 노름을 기록
+        stored = matrix[rows].astype(np.float32)
+        norms[rows] = np.einsum("ij,ij->i", stored, stored)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+
+    dim = int(matrix.shape[1]) if matrix is not None else 0
+    if matrix is not None:
+        matrix.flush()
+        norms.flush()
+        del matrix, norms
+
+    with open(tmp_dir / TABLE_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+    header = {
+        "collection": collection.name,
+        "count": len(ids),
+        "dim": dim,
+        "dtype": "float16",
+        "metric": "l2",
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(tmp_dir / HEADER_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    logger.info(f"📦 flat 인덱스 내보내기 완료: {out_dir} ({len(ids)}개, {dim}차원, {time.time() - start:.2f}초)")
+    return header
+
+
+def top_k_rows(distances: np.ndarray, k: int, rows: Optional[np.ndarray] = None):
+    """거리 배열에서 argpartition으로 top-k를 골라 (행 번호, 거리)를 거리순으로 반환"""
+    if k < len(distances):
+        top = np.argpartition(distances, k)[:k]
+    else:
+        top = np.arange(len(distances))
+    top = top[np.argsort(distances[top])]
+    return (rows[top] if rows is not None else top), distances[top]
+
+
+def load_table(directory: Path) -> dict:
+    with open(Path(directory) / TABLE_FILE_NAME, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FlatIndex:
+    """float16 memmap 행렬에 대한 정확한(exact) top-k 검색
+
+    행렬은 읽기 전용 memmap으로 열어 여러 워커 프로세스가 같은 페이지 캐시를 복사 없이 공유한다.
+    거리는 Chroma 기본값과 같은 L2이며, 작은 블록 단위로 float32로 올려 행렬 곱 후 argpartition으로 top-k를 고른다.
+    float16 → float32 변환이 질의 시간의 대부분이므로 여러 질의를 한 번에 검색할수록 유리하다.
+    upcast_max_mb 이하 크기면 프로세스 메모리에 float32 사본을 두어 변환을 생략한다 (페이지 공유는 포기).
+    similarity_search_by_vector / get / _collection.query 를 Chroma와 같은 형태로 제공해 서비스에서 그대로 쓸 수 있다.
+    """
+
+    def __init__(self, directory: str, block_rows: int = 512, upcast_max_mb: float = 0):
+        self.directory = Path(directory)
+        with open(self.directory / HEADER_FILE_NAME, "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        self._set_table(load_table(self.directory))
+
+        count, dim = self.header["count"], self.header["dim"]
+        if count:
+            self.vectors = np.memmap(self.directory / VECTORS_FILE_NAME, dtype=np.float16, mode="r", shape=(count, dim))
+            self.sq_norms = np.memmap(self.directory / NORMS_FILE_NAME, dtype=np.float32, mode="r", shape=(count,))
+        else:
+            self.vectors = np.zeros((0, dim), dtype=np.float16)
+            self.sq_norms = np.zeros((0,), dtype=np.float32)
+        self.block_rows = block_rows
+
+        self.upcast = None
+        if count and count * dim * 4 <= upcast_max_mb * 1024 ** 2:
+            self.upcast = np.asarray(self.vectors, dtype=np.float32)
+
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> Optional["FlatIndex"]:
+        if not (Path(directory) / HEADER_FILE_NAME).exists():
+            logger.warning(f"⚠ flat 인덱스가 없습니다: {directory}")
+            return None
+        index = cls(directory, **kwargs)
+        logger.info(f"flat 인덱스 로드: {directory} ({index.header['count']}개)")
+        return index
+
+    def _set_table(self, table: dict):
+        self.ids: List[str] = table["ids"]
+        self.documents: List[str] = table["documents"]
+        self.metadatas: List[dict] = table["metadatas"]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._field_cache = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------------
+    # 필터
+    # ---------------------
+    def _field(self, name: str) -> np.ndarray:
+        values = self._field_cache.get(name)
+        if values is None:
+            values = np.array([str(meta.get(name, "")) if meta else "" for meta in self.metadatas], dtype=object)
+            self._field_cache[name] = values
+        return values
+
+    def filter_rows(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Chroma where 필터({"필드": 값} 또는 {"필드": {"$in": [...]}})를 행 번호 배열로 변환 (None이면 전체)"""
+        if not filter:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        for name, condition in filter.items():
+            field = self._field(name)
+            if isinstance(condition, dict):
+                if set(condition) != {"$in"}:
+                    raise ValueError(f"지원하지 않는 필터입니다: {condition}")
+                mask &= np.isin(field, [str(v) for v in condition["$in"]])
+            else:
+                mask &= field == str(condition)
+        return np.flatnonzero(mask)
+
+    # ---------------------
+    # 검색
+    # ---------------------
+    def search(self, queries, k: int = 5, rows: Optional[np.ndarray] = None):
+        """질의 벡터(들)의 top-k (행 번호, L2 거리) 목록"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if rows is not None:
+            matrix = self.upcast[rows] if self.upcast is not None else self.vectors[rows].astype(np.float32)
+            distances = self.sq_norms[rows][:, None] - 2.0 * (matrix @ queries.T)
+        elif self.upcast is not None:
+            distances = self.sq_norms[:, None] - 2.0 * (self.upcast @ queries.T)
+        else:
+            distances = np.empty((len(self.ids), len(queries)), dtype=np.float32)
+            # 캐시에 들어가는 크기의 버퍼를 재사용하며 블록별로 변환
+            buffer = np.empty((self.block_rows, self.vectors.shape[1]), dtype=np.float32)
+            for start in range(0, len(self.ids), self.block_rows):
+                end = min(start + self.block_rows, len(self.ids))
+                block = buffer[:end - start]
+                np.copyto(block, self.vectors[start:end])
+                distances[start:end] = self.sq_norms[start:end, None] - 2.0 * (block @ queries.T)
+        # ||q||^2를 더해 Chroma와 같은 제곱 L2 거리로 맞춤
+        distances += np.einsum("ij,ij->i", queries, queries)[None, :]
+
+        return [top_k_rows(distances[:, qi], k, rows) for qi in range(len(queries))]
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[dict] = None, include=None) -> dict:
+        """Chroma collection.query와 같은 형태의 결과"""
+        include = list(include or ["documents", "metadatas"])
+        rows = self.filter_rows(where)
+        result = {"ids": [], **{field: [] for field in include}}
+        if rows is not None and len(rows) == 0:
+            for field in result:
+                result[field] = [[] for _ in query_embeddings]
+            return result
+        for found, distances in self.search(query_embeddings, n_results, rows):
+            result["ids"].append([self.ids[r] for r in found])
+            if "documents" in include:
+                result["documents"].append([self.documents[r] for r in found])
+            if "metadatas" in include:
+                result["metadatas"].append([self.metadatas[r] for r in found])
+            if "distances" in include:
+                result["distances"].append([float(d) for d in distances])
+        return result
+
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: Optional[dict] = None, **kwargs):
+        from langchain.docstore.document import Document
+
+        result = self.query([embedding], n_results=k, where=filter)
+        return [
+            Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+            for doc_id, text, meta in zip(result["ids"][0], result["documents"][0], result["metadatas"][0])
+        ]
+
+    def get(self, ids: Optional[List[str]] = None, include=None, limit: Optional[int] = None, offset: int = 0) -> dict:
+        include = list(include or ["documents", "metadatas"])
+        if ids is None:
+            rows = list(range(offset, len(self.ids) if limit is None else min(offset + limit, len(self.ids))))
+        else:
+            rows = [self.row_of[doc_id] for doc_id in ids if doc_id in self.row_of]
+        result = {"ids": [self.ids[r] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [self.documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[r] for r in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self.vectors[rows].astype(np.float32) if rows else np.zeros((0, self.header["dim"]))
+        return result
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    @property
+    def _collection(self):
+        # 배치 검색 경로(vectorstore._collection.query)와 호환
+        return self
+
+    def add_documents(self, documents, **kwargs):
+        raise NotImplementedError("flat 인덱스는 읽기 전용입니다. 컬렉션 갱신 후 flat_index.py export로 다시 내보내세요.")
+
+
+def benchmark(chroma_store, flat_index: FlatIndex, n_queries: int = 200, k: int = 5, seed: int = 0) -> dict:
+    """저장된 벡터에 잡음을 더한 질의로 Chroma(HNSW) 경로와 flat 경로의 지연/결과 일치율 비교 (모델 로드 불필요)"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(flat_index), size=min(n_queries, len(flat_index)), replace=False)
+    base = flat_index.vectors[np.sort(rows)].astype(np.float32)
+    queries = base + rng.normal(scale=float(np.abs(base).mean()) * 0.3, size=base.shape).astype(np.float32)
+
+    def timed(fn):
+        latencies, results = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(fn(query))
+            latencies.append(time.perf_counter() - start)
+        arr = np.asarray(latencies) * 1000
+        return results, {"p50": round(float(np.percentile(arr, 50)), 3), "p90": round(float(np.percentile(arr, 90)), 3),
+                         "mean": round(float(arr.mean()), 3)}
+
+    chroma_results, chroma_latency = timed(
+        lambda q: chroma_store._collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+    )
+    flat_results, flat_latency = timed(lambda q: [flat_index.ids[r] for r in flat_index.search(q, k)[0][0]])
+
+    # 배치 질의(마이크로배칭 서버/일괄 추론 경로): 변환 비용이 질의 수만큼 분산됨
+    start = time.perf_counter()
+    flat_index.search(queries, k)
+    batch_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    overlap = np.mean([len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(chroma_results, flat_results)])
+    return {
+        "queries": len(queries),
+        "k": k,
+        "chroma_ms": chroma_latency,
+        "flat_ms": flat_latency,
+        "flat_batch_ms_per_query": round(batch_ms, 3),
+        "flat_upcast": flat_index.upcast is not None,
+        "topk_overlap": round(float(overlap), 4),
+        "flat_bytes": int(flat_index.vectors.nbytes + flat_index.sq_norms.nbytes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["export", "bench"], help="export: Chroma → flat 내보내기, bench: 지연 비교")
+    parser.add_argument("--out_dir", type=str, default="./vector_db/flat", help="flat 인덱스 저장 경로")
+    parser.add_argument("--collections", type=str, default=",".join(EXPORT_TARGETS), help="대상 컬렉션 (쉼표 구분)")
+    parser.add_argument("--queries", type=int, default=200, help="bench 질의 수")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--upcast_max_mb", type=float, default=0, help="이 크기 이하면 float32 사본으로 검색")
+    args = parser.parse_args()
+
+    from langchain_chroma import Chroma
+
+    for name in [c for c in args.collections.split(",") if c]:
+        # 임베딩은 Chroma에 저장된 벡터를 그대로 쓰므로 임베딩 모델을 로드하지 않음
+        # 버전 구조(create_collection.py)면 현재 게시된 버전에서 내보냄
+        _, path = snapshots.resolve(os.path.abspath(EXPORT_TARGETS[name]))
+        store = Chroma(persist_directory=path, collection_name=name)
+        target = os.path.join(args.out_dir, name)
+        if args.command == "export":
+            export_flat_index(store, target)
+        else:
+            index = FlatIndex.load(target, upcast_max_mb=args.upcast_max_mb)
+            if index is None:
+                continue
+            report = benchmark(store, index, args.queries, args.k)
+            print(f"\n⏱️ {name}")
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
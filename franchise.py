@@ -1,17 +1,44 @@
 # 로깅 설정
 import logging
 import os
+import threading
+import time
 
-import json
-import logging
-import os
-import google.generativeai as genai
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from brand_router import BrandRouter
+from cascade import CascadePolicy
+from llm_backends import LLMClient, get_shared_client
+from metrics import metrics
+from snapshots import VersionLease, VersionWatcher, resolve
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 아직 로드하지 않은 리소스 표시 (None은 "로드했지만 없음"을 뜻함)
+_UNLOADED = object()
+
+
+def release_store(store):
+    """교체된 스토어의 파일 핸들/메모리 해제 (Chroma는 경로별로 캐시되는 클라이언트 시스템까지 정리)"""
+    if store is None or store is _UNLOADED:
+        return
+    close = getattr(store, "close", None)
+    if callable(close):
+        close()
+        return
+    client = getattr(store, "_client", None)
+    system = getattr(client, "_system", None)
+    if system is None:
+        return
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+    except ImportError:
+        from chromadb.api.client import SharedSystemClient
+    # chromadb는 경로별 System을 클래스 변수에 캐시하므로 여기서 빼야 메모리가 해제됨 (버전에 따라 속성 이름이 다름)
+    for name in ("_identifer_to_system", "_identifier_to_system"):
+        getattr(SharedSystemClient, name, {}).pop(getattr(client, "_identifier", None), None)
+    system.stop()
+
+
 class GeminiFranchiseService:
     """Chroma 기반 RAG와 Gemini를 활용한 추천 서비스"""
     def __init__(self, api_key: str = None, config: dict = None):
@@ -24,44 +51,221 @@ class GeminiFranchiseService:
             "만약 질문이 제공된 context와 관련이 없거나, 답변할 정보가 없다면 '문서에 없는 내용입니다. 다시 질문해주세요.'라고 답변하세요. "
             "모든 답변은 친절하고 정확하게 작성하되, 추측은 절대 하지 마세요."
         )
-        self.vectorstore_search_k = 5
-        self.context_max_length = 8000
+        self.vectorstore_search_k = config.get("vectorstore_search_k", 5)
+        # 검색 점수 기반 단계 생략/확장 (config["cascade"]가 없으면 모든 단계 실행)
+        self.cascade = CascadePolicy.from_config(config)
+        self.context_max_tokens = config.get("context_max_tokens", 4000)
         
-        genai.configure(api_key=api_key)
-        self.vector_db_path = config.get("vector_db_path","")
+        # 버전 구조(CURRENT 포인터)면 현재 버전 디렉토리를, 아니면 경로 그대로 사용
+        self.vector_db_root = os.path.abspath(config.get("vector_db_path",""))
+        self.db_version, self.vector_db_path = resolve(self.vector_db_root)
         self.collection_name = config.get("collection_name","contracts_collection")
-        self.model = genai.GenerativeModel(config.get("model_name", "gemini-pro"))
-        embedding_model_path = config.get("embedding_model_path","")
 
-        device = config.get("device","cpu")
+        # LLM 클라이언트 (gemini / stub, 또는 config["llm"]으로 백엔드/클라이언트 직접 주입)
+        # 같은 설정의 서비스끼리는 클라이언트를 공유해 동시 호출 상한이 프로세스 전체에 적용됨
+        client_options = {
+            "max_concurrency": config.get("llm_max_concurrency", 8),
+            "max_retries": config.get("llm_max_retries", 4),
+            "timeout": config.get("llm_timeout", 60.0),
+        }
+        llm = config.get("llm")
+        if llm is None:
+            llm = get_shared_client(
+                config.get("llm_backend", "gemini"),
+                client_options=client_options,
+                api_key=api_key,
+                model_name=config.get("model_name", "gemini-pro"),
+                latency=config.get("llm_stub_latency", 0.0),
+            )
+        elif not isinstance(llm, LLMClient):
+            llm = LLMClient(llm, **client_options)
+        self.llm = llm
+        self.config = config
 
-        
-        # 임베딩 모델 초기화 (로컬 모델 사용)
-        logger.info(f"로컬 임베딩 모델 로드 중: {embedding_model_path}")
-        try:
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=embedding_model_path,  # 로컬 경로 사용
-                model_kwargs={
-                    'device': device,
-                }
+        # flat/PQ export는 버전 디렉토리와 무관한 정적 파일이라 hot reload로 바뀌지 않음
+        static = [name for name in self.static_index_options() if config.get(name)]
+        if config.get("hot_reload", False) and static:
+            raise ValueError(
+                f"hot_reload는 정적 인덱스 설정({', '.join(static)})과 함께 사용할 수 없습니다. "
+                "인덱스를 다시 export한 뒤 재시작하세요."
             )
-            logger.info("로컬 임베딩 모델 로드 성공")
-        except Exception as e:
-            logger.error(f"로컬 임베딩 모델 로드 실패, 온라인 모델을 사용합니다: {str(e)}")
-            # 실패 시 온라인 모델로 폴백
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="nlpai-lab/KURE-v1",
-                model_kwargs={'device': device}
+
+        # 질의 벡터 LRU 캐시 (반복 질문은 인코더 생략)
+        from embedding_cache import QueryVectorCache
+        self.query_vector_cache = QueryVectorCache(config.get("query_cache_size", 1024))
+
+        # 임베딩 모델 / 벡터스토어 / 어휘 색인은 처음 사용할 때 로드 (lazy_load=False면 생성자에서 바로 로드)
+        self._embeddings = _UNLOADED
+        self._chroma_vectorstore = _UNLOADED
+        self._lexical_index = _UNLOADED
+        self._context_packer = _UNLOADED
+        self._load_lock = threading.RLock()
+        self._warm_up_thread = None
+
+        # 브랜드/상호명 라우터 (create_collection.py가 만든 경우에만 사용)
+        self.brand_router = None
+        if config.get("use_brand_router", True):
+            self.brand_router = BrandRouter.load(os.path.abspath(self.vector_db_path))
+
+        self.rrf_k = config.get("rrf_k", 60)
+
+        if not config.get("lazy_load", False):
+            self.warm_up()
+        elif config.get("background_warm_up", True):
+            self.warm_up(background=True)
+
+        # 읽고 있는 버전은 lease로 표시해 다른 프로세스의 GC가 지우지 않게 하고,
+        # hot_reload면 새 버전이 게시될 때 백그라운드에서 다시 로드 (진행 중인 질의는 기존 스토어로 끝까지 처리)
+        self._version_watchers = []
+        self._version_lease = self.track_versions(self.vector_db_root, self.db_version, self.reload_vector_db)
+
+    def static_index_options(self):
+        """hot_reload와 함께 쓸 수 없는 정적 인덱스 config 키"""
+        return ["flat_index_dir"]
+
+    def track_versions(self, root: str, version, on_change) -> VersionLease:
+        """버전 구조면 lease를 잡고 heartbeat 스레드를 띄우며, hot_reload면 CURRENT가 바뀔 때 on_change 호출"""
+        lease = VersionLease(root)
+        lease.hold(version)
+        hot_reload = self.config.get("hot_reload", False)
+        if hot_reload or version is not None:
+            self._version_watchers.append(VersionWatcher(
+                root, version, on_change if hot_reload else None,
+                interval=self.config.get("hot_reload_interval", 10.0), lease=lease,
+            ).start())
+        return lease
+
+    def retire(self, lease: VersionLease, version, *stores):
+        """교체된 스토어를 진행 중인 질의가 끝날 시간(hot_reload_grace초)이 지난 뒤 해제하고 lease에서 이전 버전을 뺌"""
+        def release():
+            for store in stores:
+                try:
+                    release_store(store)
+                except Exception as e:
+                    logger.warning(f"이전 스토어 해제 실패: {str(e)}")
+            lease.drop(version)
+
+        timer = threading.Timer(self.config.get("hot_reload_grace", 30.0), release)
+        timer.daemon = True
+        timer.start()
+
+    def close(self):
+        """버전 감시 스레드를 멈추고 lease 반납"""
+        for watcher in self._version_watchers:
+            watcher.stop()
+        self._version_lease.release()
+
+    # ---------------------
+    # 지연 로딩
+    # ---------------------
+    def _lazy(self, attr: str, loader):
+        value = getattr(self, attr)
+        if value is _UNLOADED:
+            with self._load_lock:
+                value = getattr(self, attr)
+                if value is _UNLOADED:
+                    value = loader()
+                    setattr(self, attr, value)
+        return value
+
+    @property
+    def embeddings(self):
+        return self._lazy("_embeddings", self._load_embeddings)
+
+    @property
+    def chroma_vectorstore(self):
+        return self._lazy("_chroma_vectorstore", self.load_chroma_vectorstore)
+
+    @property
+    def context_packer(self):
+        return self._lazy("_context_packer", self._load_context_packer)
+
+    def _load_context_packer(self):
+        from context_packer import ContextPacker, TokenCounter
+        return ContextPacker(TokenCounter.from_embeddings(self.embeddings), self.context_max_tokens)
+
+    @property
+    def lexical_index(self):
+        return self._lazy("_lexical_index", self._load_lexical_index)
+
+    def _load_embeddings(self):
+        # 이미 로드한 임베딩 객체를 config["embeddings"]로 주입하면 그대로 사용 (모델 중복 로드 방지)
+        if self.config.get("embeddings") is not None:
+            return self.config["embeddings"]
+
+        from embedding_cache import load_embeddings
+
+        # 임베딩 모델 초기화 (로컬 모델 사용, cache_dir 지정 시 디스크 캐시)
+        return load_embeddings(
+            self.config.get("embedding_model_path", ""),
+            self.config.get("embedding_model_name", "nlpai-lab/KURE-v1"),
+            device=self.config.get("device", "cpu"),
+            cache_dir=self.config.get("embedding_cache_dir"),
+            backend=self.config.get("embedding_backend", "hf"),
+        )
+
+    def _load_lexical_index(self, path: str = None):
+        # 어휘(BM25) 색인이 있으면 dense 검색과 RRF로 결합하는 하이브리드 검색 사용
+        if not self.config.get("hybrid_search", True):
+            return None
+        from lexical_index import LexicalIndex
+        return LexicalIndex.load(os.path.abspath(path or self.vector_db_path))
+
+    def warm_up_targets(self):
+        """warm_up 시 미리 로드할 리소스 이름 (로드 순서대로)"""
+        return ["embeddings", "chroma_vectorstore", "lexical_index"]
+
+    def warm_up(self, background: bool = False, profiler=None):
+        """모델/스토어를 미리 로드. background=True면 별도 스레드에서 로드하고 바로 반환"""
+        if background:
+            self._warm_up_thread = threading.Thread(
+                target=self.warm_up, kwargs={"profiler": profiler}, name="service-warm-up", daemon=True
             )
-        
-        # Chroma 벡터 스토어 초기화
-        self.chroma_vectorstore = self.load_chroma_vectorstore()
-    
-    def load_chroma_vectorstore(self):
+            self._warm_up_thread.start()
+            return self._warm_up_thread
+
+        start = time.perf_counter()
+        for name in self.warm_up_targets():
+            if profiler is not None:
+                with profiler.phase(f"load {name}"):
+                    getattr(self, name)
+            else:
+                getattr(self, name)
+        if profiler is not None:
+            with profiler.phase("load llm client"):
+                self.llm.warm_up()
+        logger.info(f"서비스 리소스 로드 완료 ({time.perf_counter() - start:.2f}초)")
+
+    def reload_vector_db(self) -> bool:
+        """게시된 새 버전의 벡터스토어/라우터/어휘 색인을 로드한 뒤 한 번에 교체 (버전이 같으면 False)
+
+        새 리소스를 모두 준비한 다음에 참조만 바꾸므로, 진행 중인 질의는 이미 잡은 기존 객체로 끝까지 처리된다.
+        이전 스토어는 hot_reload_grace초 뒤에 해제하며, 그동안은 lease로 이전 버전도 GC되지 않게 잡아 둔다.
+        """
+        version, path = resolve(self.vector_db_root)
+        if version == self.db_version:
+            return False
+        start = time.perf_counter()
+        with metrics.span("vector_db_reload"):
+            vectorstore = self.load_chroma_vectorstore(path)
+            lexical_index = self._load_lexical_index(path) if self._lexical_index is not _UNLOADED else _UNLOADED
+            brand_router = BrandRouter.load(path) if self.config.get("use_brand_router", True) else None
+        self._version_lease.hold(version)
+        with self._load_lock:
+            previous_store, self._chroma_vectorstore = self._chroma_vectorstore, vectorstore
+            self._lexical_index = lexical_index
+            self.brand_router = brand_router
+            previous, self.db_version, self.vector_db_path = self.db_version, version, path
+        self.retire(self._version_lease, previous, previous_store)
+        metrics.inc("vector_db_reloads")
+        logger.info(f"🔄 벡터 DB 버전 전환: {previous} → {version} ({time.perf_counter() - start:.2f}초)")
+        return True
+
+    def load_chroma_vectorstore(self, path: str = None):
         """LangChain Chroma 벡터스토어 로드"""
         try:
             # 절대 경로로 변환
-            absolute_path = os.path.abspath(self.vector_db_path)
+            absolute_path = os.path.abspath(path or self.vector_db_path)
             
             # 경로 존재 여부 확인
             if not os.path.exists(absolute_path):
@@ -69,8 +273,26 @@ class GeminiFranchiseService:
                 raise FileNotFoundError(f"벡터 스토어 경로가 존재하지 않습니다: {absolute_path}")
             
             logger.info(f"벡터 스토어 로드 시도: {absolute_path}")
+
+            # flat_index.py로 내보낸 memmap 인덱스가 있으면 Chroma 대신 정확한 top-k 검색
+            if self.config.get("flat_index_dir"):
+                from flat_index import FlatIndex
+                index = FlatIndex.load(
+                    os.path.join(self.config["flat_index_dir"], self.collection_name),
+                    upcast_max_mb=self.config.get("flat_index_upcast_mb", 0),
+                )
+                if index is not None:
+                    return index
+
+            # sharded_store.py로 만든 샤드 스토어면 샤드별 컬렉션을 병렬로 검색
+            if self.config.get("sharded_store", False):
+                from sharded_store import ShardedStore
+                return ShardedStore(
+                    absolute_path, self.embeddings, max_workers=self.config.get("shard_search_workers", 8)
+                )
             
             # Chroma 벡터스토어 로드
+            from langchain_chroma import Chroma
             vectorstore = Chroma(
                 persist_directory=absolute_path,
                 embedding_function=self.embeddings,
@@ -91,66 +313,159 @@ class GeminiFranchiseService:
             logger.error(f"LangChain Chroma 벡터스토어 로드 실패: {str(e)}", exc_info=True)
             raise
         
+    def embed_query(self, query: str):
+        """질의 벡터를 계산 (LRU 캐시에 있으면 재사용)"""
+        vector = self.query_vector_cache.get(query)
+        if vector is None:
+            metrics.inc("query_vector_cache_misses")
+            with metrics.span("query_embedding"):
+                vector = self.embeddings.embed_query(query)
+            self.query_vector_cache.put(query, vector)
+        else:
+            metrics.inc("query_vector_cache_hits")
+        return vector
+
+    def route_filter(self, query: str):
+        """질문에 브랜드/상호명이 있으면 해당 정보공개서로 좁히는 Chroma 필터 반환"""
+        if self.brand_router is None:
+            return None
+        return self.brand_router.filter_for(query)
+
+    def search_main_store(self, query: str, embedding=None, k: int = None):
+        """브랜드 라우팅으로 범위를 좁혀 검색하고, 결과가 없으면 전체 검색으로 폴백"""
+        if embedding is None:
+            embedding = self.embed_query(query)
+        if self.cascade is not None:
+            return self.cascade_search(query, embedding, k)[0]
+        k = k or self.vectorstore_search_k
+
+        route = self.route_filter(query)
+        if route:
+            with metrics.span("vector_search", store="main", routed="true"):
+                docs = self.chroma_vectorstore.similarity_search_by_vector(embedding=embedding, k=k, filter=route)
+            if docs:
+                return self.fuse_lexical(query, docs, route, k)
+            metrics.inc("route_fallbacks")
+            logger.warning(f"⚠ 라우팅된 브랜드({route}) 문서가 없어 전체 검색합니다.")
+        with metrics.span("vector_search", store="main", routed="false"):
+            docs = self.chroma_vectorstore.similarity_search_by_vector(embedding=embedding, k=k)
+        return self.fuse_lexical(query, docs, None, k)
+
+    def query_by_vectors(self, vectorstore, vectors, k: int, where=None):
+        """여러 질의 벡터를 _collection.query 한 번으로 검색해 질의별 (문서 목록, 거리 목록) 반환"""
+        if not vectors:
+            return []
+        results = vectorstore._collection.query(
+            query_embeddings=vectors,
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        from langchain.docstore.document import Document
+        return [
+            (
+                [
+                    Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+                    for doc_id, text, meta in zip(ids, texts, metas)
+                ],
+                list(distances),
+            )
+            for ids, texts, metas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def cascade_search(self, query: str, embedding=None, k: int = None):
+        """적응형 검색: 상위 1·2위 거리 격차로 어휘 검색 융합을 생략하거나 k를 넓힌다
+
+        (문서 목록, CascadeDecision)을 반환하며, 호출자는 decision.confident로 few-shot 조회 생략 여부를 정한다.
+        k를 지정하지 않으면 확실한 질의는 min_k개만 반환한다 (동적 k).
+        """
+        if embedding is None:
+            embedding = self.embed_query(query)
+        route = self.route_filter(query)
+        # 격차를 계산하려면 최소 2개 후보가 필요
+        first_k = max(k or self.vectorstore_search_k, 2)
+        with metrics.span("vector_search", store="main", routed="true" if route else "false"):
+            docs, distances = self.query_by_vectors(self.chroma_vectorstore, [embedding], first_k, where=route)[0]
+        if route and not docs:
+            metrics.inc("route_fallbacks")
+            logger.warning(f"⚠ 라우팅된 브랜드({route}) 문서가 없어 전체 검색합니다.")
+            route = None
+            with metrics.span("vector_search", store="main", routed="false"):
+                docs, distances = self.query_by_vectors(self.chroma_vectorstore, [embedding], first_k)[0]
+        return self.cascade_refine(query, embedding, docs, distances, route, k)
+
+    def cascade_refine(self, query: str, embedding, docs, distances, route, k: int = None):
+        """1차 검색 결과(docs, distances)에 cascade 정책을 적용 (단건/일괄 검색 공용)"""
+        decision = self.cascade.decide(distances)
+        requested_k, k = k, k or self.vectorstore_search_k
+
+        widen = decision.ambiguous and self.cascade.wide_k > len(docs)
+        self.cascade.record("widen", widen)
+        if widen:
+            with metrics.span("vector_search", store="main", routed="true" if route else "false", mode="widen"):
+                docs, distances = self.query_by_vectors(self.chroma_vectorstore, [embedding], self.cascade.wide_k, where=route)[0]
+            k = len(docs)
+
+        self.cascade.record("lexical", not decision.confident)
+        if decision.confident:
+            return docs[:requested_k or self.cascade.min_k], decision
+        return self.fuse_lexical(query, docs, route, k), decision
+
+    @staticmethod
+    def doc_key(doc) -> str:
+        """검색 결과 문서의 ID (없으면 create_collection.py의 청크 ID 규칙으로 복원)"""
+        if getattr(doc, "id", None):
+            return doc.id
+        meta = doc.metadata
+        return f"{meta.get('JNG_IFRMP_SN')}_{meta.get('ATTRB_MNNO')}_{meta.get('CHNK_NO')}_{meta.get('SMRT_CHNK_NO')}"
+
+    def fuse_lexical(self, query: str, dense_docs, route, k: int):
+        """dense 결과와 BM25 결과를 RRF로 합쳐 상위 k개 반환 (어휘 색인이 없으면 dense 결과 그대로)"""
+        if self.lexical_index is None:
+            return dense_docs
+
+        groups = None
+        if route:
+            sn = route["JNG_IFRMP_SN"]
+            groups = sn["$in"] if isinstance(sn, dict) else [sn]
+        with metrics.span("lexical_search"):
+            lexical_ids = self.lexical_index.search(query, k, groups=groups)
+        if not lexical_ids:
+            return dense_docs
+
+        docs_by_id = {self.doc_key(doc): doc for doc in dense_docs}
+        fused_ids = reciprocal_rank_fusion([list(docs_by_id), lexical_ids], k=self.rrf_k)[:k]
+
+        # 어휘 검색에서만 나온 문서는 Chroma에서 ID로 조회
+        missing = [doc_id for doc_id in fused_ids if doc_id not in docs_by_id]
+        if missing:
+            from langchain.docstore.document import Document
+            found = self.chroma_vectorstore.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, text, meta in zip(found["ids"], found["documents"], found["metadatas"]):
+                docs_by_id[doc_id] = Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+        return [docs_by_id[doc_id] for doc_id in fused_ids if doc_id in docs_by_id]
+
     def retrieve_context(self, query: str) -> str:
         """Chroma로 문서 검색 및 컨텍스트 생성"""
         try:
-            # 기본적인 similarity search 사용
-            search_results = self.chroma_vectorstore.similarity_search(
-                query=query,
-                k=self.vectorstore_search_k
-            )
-            
-            # 검색된 문서로 컨텍스트 구성
-            context = ""
-            total_length = 0
+            # 질의 벡터를 한 번 계산해 벡터 기반 검색 사용 (브랜드 라우팅 적용)
+            search_results = self.search_main_store(query)
             
-            for i, doc in enumerate(search_results, 1):
-                # JSON 문자열을 파싱
-                try:
-                    content_json = json.loads(doc.page_content)
-                    # JSON 구조에 맞게 컨텐츠 추출
-                    if isinstance(content_json, list) and len(content_json) > 0:
-                        doc_text = ""
-                        for item in content_json:
-                            topic = item.get("topic", "")
-                            sub_topic = item.get("sub_topic", "")
-                            contents = item.get("contents", "")
-                            doc_text += f"주제: {topic}\n소주제: {sub_topic}\n내용: {contents}\n\n"
-                    else:
-                        doc_text = str(content_json)
-                except json.JSONDecodeError:
-                    # JSON 파싱 실패 시 원본 텍스트 사용
-                    doc_text = doc.page_content
-                
-                doc_length = len(doc_text)
-                if total_length + doc_length > self.context_max_length:
-                    continue
-                
-                # 메타데이터가 있으면 출처 정보 추가
-                metadata_str = ""
-                if hasattr(doc, 'metadata') and doc.metadata:
-                    metadata_str = " | " + " | ".join([f"{k}: {v}" for k, v in doc.metadata.items() if k != "text"])
-                
-                context += f"[문서 {i}]{metadata_str}\n{doc_text}\n\n"
-                total_length += doc_length
+            # 검색 순위대로 토큰 예산 안에서 컨텍스트 구성
+            with metrics.span("prompt_build"):
+                context = self.context_packer.pack(search_results)
 
-            logger.info(f"Chroma 검색 완료: {len(search_results)}개 문서, 컨텍스트 길이: {total_length}")
+            logger.info(f"Chroma 검색 완료: {len(search_results)}개 문서, 컨텍스트 길이: {len(context)}")
             return context
         except Exception as e:
             logger.error(f"Chroma 검색 실패: {str(e)}")
             return ""
 
-    def answer_question(self, query: str) -> str:
-        """사용자 질문에 RAG를 통해 답변"""
-        try:
-            # 컨텍스트 검색
-            context = self.retrieve_context(query)
-            
-            if not context:
-                return "검색 결과가 없습니다. 다른 질문을 해주세요."
-            
-            # Gemini 프롬프트 구성
-            prompt = f"""
+    def build_answer_prompt(self, query: str, context: str) -> str:
+        """Gemini 프롬프트 구성"""
+        return f"""
             {self.initial_system_message}
 
             컨텍스트:
@@ -160,15 +475,34 @@ class GeminiFranchiseService:
 
             답변:
             """
+
+    def answer_question(self, query: str) -> str:
+        """사용자 질문에 RAG를 통해 답변"""
+        try:
+            # 컨텍스트 검색
+            context = self.retrieve_context(query)
             
-            # Gemini 모델로 답변 생성
-            response = self.model.generate_content(prompt)
+            if not context:
+                return "검색 결과가 없습니다. 다른 질문을 해주세요."
             
-            return response.text
+            # LLM 백엔드로 답변 생성
+            return self.llm.generate(self.build_answer_prompt(query, context))
             
         except Exception as e:
             logger.error(f"질문 답변 실패: {str(e)}")
             return f"죄송합니다, 답변 생성 중 오류가 발생했습니다: {str(e)}"
+
+    def stream_answer(self, query: str):
+        """answer_question의 스트리밍 버전. 답변 조각을 생성되는 대로 yield (첫 토큰까지의 대기 시간 단축)"""
+        try:
+            context = self.retrieve_context(query)
+            if not context:
+                yield "검색 결과가 없습니다. 다른 질문을 해주세요."
+                return
+            yield from self.llm.stream(self.build_answer_prompt(query, context))
+        except Exception as e:
+            logger.error(f"질문 답변 실패: {str(e)}")
+            yield f"죄송합니다, 답변 생성 중 오류가 발생했습니다: {str(e)}"
     
     def add_documents(self, documents):
         """벡터스토어에 새 문서 추가"""
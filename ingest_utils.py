@@ -0,0 +1,54 @@
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+
+def batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """이터러블을 batch_size 크기의 리스트로 나누어 순차적으로 반환"""
+    if batch_size < 1:
+        raise ValueError("batch_size는 1 이상이어야 합니다.")
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class StageTimer:
+    """단계(stage)별 누적 처리 시간과 처리 건수를 기록해 docs/sec를 계산"""
+
+    def __init__(self):
+        self.elapsed = {}
+        self.counts = {}
+
+    def record(self, stage: str, elapsed: float, count: int = 0):
+        self.elapsed[stage] = self.elapsed.get(stage, 0.0) + elapsed
+        self.counts[stage] = self.counts.get(stage, 0) + count
+
+    def measure(self, stage: str, iterable: Iterable[T]) -> Iterator[T]:
+        """제너레이터를 감싸 항목 하나를 만들어내는 데 걸린 시간을 stage에 누적"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.record(stage, time.perf_counter() - start)
+                return
+            self.record(stage, time.perf_counter() - start, 1)
+            yield item
+
+    def rate(self, stage: str) -> float:
+        elapsed = self.elapsed.get(stage, 0.0)
+        return self.counts.get(stage, 0) / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        lines = []
+        for stage, elapsed in self.elapsed.items():
+            lines.append(
+                f"  - {stage}: {self.counts.get(stage, 0)}건, {elapsed:.2f}초, {self.rate(stage):.1f} docs/sec"
+            )
+        return "\n".join(lines)
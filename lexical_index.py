@@ -0,0 +1,157 @@
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = "lexical_index.json"
+POSTINGS_FILE_NAME = "lexical_postings.bin"
+
+_TOKEN = re.compile(r"[0-9a-z가-힣]+")
+
+
+def char_ngrams(text: str, ngram_range=(2, 3)) -> List[str]:
+    """토큰(한글/영문/숫자 연속열)별 문자 n-gram. n보다 짧은 토큰은 토큰 자체를 사용"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    grams = []
+    for token in _TOKEN.findall(text):
+        if len(token) < ngram_range[0]:
+            grams.append(token)
+            continue
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            grams.extend(token[i:i + n] for i in range(len(token) - n + 1))
+    return grams
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[str]:
+    """여러 순위 목록을 RRF(1 / (k + rank))로 합친 ID 순위"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class LexicalIndex:
+    """문자 n-gram BM25 역색인
+
+    용어 사전(JSON)과 포스팅(바이너리)을 분리해 저장한다. 포스팅 파일은 용어별로
+    문서 번호(uint32) 배열과 빈도(uint16) 배열이 연속으로 놓이며, 로드 시 memmap으로 연다.
+    """
+
+    def __init__(self, doc_ids, doc_groups, doc_lens, terms, postings_docs, postings_tfs, k1=1.2, b=0.75):
+        self.doc_ids = list(doc_ids)
+        self.doc_groups = list(doc_groups)
+        self.doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        self.avgdl = float(self.doc_lens.mean()) if len(self.doc_lens) else 0.0
+        self.terms = terms  # term -> (offset, df)
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.k1 = k1
+        self.b = b
+        self._id_to_row = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+        # 문서 길이 정규화 항은 질의와 무관하므로 미리 계산
+        self._norm = k1 * (1 - b + b * self.doc_lens / self.avgdl) if self.avgdl else self.doc_lens
+
+    @classmethod
+    def build(cls, doc_ids: List[str], texts: List[str], doc_groups: Optional[List] = None, **kwargs) -> "LexicalIndex":
+        postings: Dict[str, List] = {}
+        doc_lens = []
+        for row, text in enumerate(texts):
+            counts = Counter(char_ngrams(text))
+            doc_lens.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, min(tf, 65535)))
+
+        terms = {}
+        docs_parts, tfs_parts = [], []
+        offset = 0
+        for term in sorted(postings):
+            plist = postings[term]
+            terms[term] = (offset, len(plist))
+            docs_parts.append(np.fromiter((r for r, _ in plist), dtype=np.uint32, count=len(plist)))
+            tfs_parts.append(np.fromiter((tf for _, tf in plist), dtype=np.uint16, count=len(plist)))
+            offset += len(plist)
+
+        postings_docs = np.concatenate(docs_parts) if docs_parts else np.zeros(0, dtype=np.uint32)
+        postings_tfs = np.concatenate(tfs_parts) if tfs_parts else np.zeros(0, dtype=np.uint16)
+        groups = doc_groups if doc_groups is not None else [None] * len(doc_ids)
+        return cls(doc_ids, groups, doc_lens, terms, postings_docs, postings_tfs, **kwargs)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        postings_path = os.path.join(directory, POSTINGS_FILE_NAME)
+        with open(postings_path + ".tmp", "wb") as f:
+            f.write(np.ascontiguousarray(self.postings_docs, dtype=np.uint32).tobytes())
+            f.write(np.ascontiguousarray(self.postings_tfs, dtype=np.uint16).tobytes())
+        meta = {
+            "doc_ids": self.doc_ids,
+            "doc_groups": self.doc_groups,
+            "doc_lens": [int(x) for x in self.doc_lens],
+            "n_postings": int(len(self.postings_docs)),
+            "k1": self.k1,
+            "b": self.b,
+            "terms": self.terms,
+        }
+        index_path = os.path.join(directory, INDEX_FILE_NAME)
+        with open(index_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(postings_path + ".tmp", postings_path)
+        os.replace(index_path + ".tmp", index_path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["LexicalIndex"]:
+        index_path = os.path.join(directory, INDEX_FILE_NAME)
+        postings_path = os.path.join(directory, POSTINGS_FILE_NAME)
+        if not (os.path.exists(index_path) and os.path.exists(postings_path)):
+            return None
+        with open(index_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        n = meta["n_postings"]
+        if n:
+            postings_docs = np.memmap(postings_path, dtype=np.uint32, mode="r", shape=(n,))
+            postings_tfs = np.memmap(postings_path, dtype=np.uint16, mode="r", offset=n * 4, shape=(n,))
+        else:
+            postings_docs = np.zeros(0, dtype=np.uint32)
+            postings_tfs = np.zeros(0, dtype=np.uint16)
+        index = cls(
+            meta["doc_ids"], meta["doc_groups"], meta["doc_lens"],
+            {term: tuple(v) for term, v in meta["terms"].items()},
+            postings_docs, postings_tfs, k1=meta["k1"], b=meta["b"],
+        )
+        logger.info(f"어휘 색인 로드: {len(index.doc_ids)}개 문서, {len(index.terms)}개 용어")
+        return index
+
+    def search(self, query: str, k: int = 5, groups: Optional[Iterable] = None) -> List[str]:
+        """BM25 상위 k개 문서 ID. groups를 주면 해당 그룹(JNG_IFRMP_SN) 문서만 대상으로 함"""
+        n_docs = len(self.doc_ids)
+        if n_docs == 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term, qtf in Counter(char_ngrams(query)).items():
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            rows = self.postings_docs[offset:offset + df]
+            tfs = self.postings_tfs[offset:offset + df].astype(np.float32)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[rows] += qtf * idf * tfs * (self.k1 + 1) / (tfs + self._norm[rows])
+
+        if groups is not None:
+            allowed = set(groups)
+            mask = np.fromiter((g in allowed for g in self.doc_groups), dtype=bool, count=n_docs)
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [self.doc_ids[i] for i in candidates]
@@ -0,0 +1,405 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Iterator, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBackend:
+    """프롬프트 → 답변 텍스트를 생성하는 LLM 백엔드 인터페이스
+
+    timeout은 호출 한 번의 제한 시간(초)이며 None이면 백엔드 기본값을 따른다.
+    """
+
+    name = "base"
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        # 비동기 API가 없는 백엔드는 스레드에서 동기 호출
+        return await asyncio.to_thread(self.generate, prompt, timeout)
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """답변을 조각 단위로 스트리밍 (기본 구현은 전체 답변을 한 번에 반환)"""
+        yield self.generate(prompt, timeout)
+
+    def warm_up(self):
+        """클라이언트/모델을 미리 로드 (기본은 할 일 없음)"""
+
+
+class GeminiBackend(LLMBackend):
+    """google.generativeai 기반 Gemini 백엔드"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str = None, model_name: str = "gemini-pro", **kwargs):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+
+    @property
+    def model(self):
+        # google.generativeai는 import 비용이 커서 첫 호출(또는 warm-up) 시점에 로드
+        if self._model is None:
+            if not self.api_key:
+                raise ValueError("GEMINI_API_KEY가 설정되지 않았습니다. (.env 또는 환경변수 확인)")
+            import google.generativeai as genai
+
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def warm_up(self):
+        self.model
+
+    @staticmethod
+    def _request_options(timeout: Optional[float]) -> dict:
+        return {"timeout": timeout} if timeout else {}
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        return self.model.generate_content(prompt, request_options=self._request_options(timeout)).text
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        response = await self.model.generate_content_async(prompt, request_options=self._request_options(timeout))
+        return response.text
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        response = self.model.generate_content(prompt, stream=True, request_options=self._request_options(timeout))
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubBackend(LLMBackend):
+    """네트워크 없이 동작하는 결정적(deterministic) 로컬 스텁 백엔드
+
+    같은 프롬프트에는 항상 같은 답변을 돌려주며, latency(초)만큼 지연시켜 실제 호출을 흉내낸다.
+    스트리밍 시 첫 조각은 first_token_latency 후에, 나머지 조각은 남은 지연 시간을 나누어 보낸다.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, first_token_latency: Optional[float] = None, chunk_chars: int = 8, **kwargs):
+        self.latency = latency
+        self.first_token_latency = latency / 4 if first_token_latency is None else first_token_latency
+        self.chunk_chars = chunk_chars
+
+    def _answer(self, prompt: str) -> str:
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        return f"[stub:{digest}] 문서에 없는 내용입니다. 다시 질문해주세요."
+
+    def _check_timeout(self, timeout: Optional[float]):
+        if timeout is not None and self.latency > timeout:
+            raise TimeoutError(f"stub 응답 지연({self.latency}s)이 제한 시간({timeout}s)을 초과했습니다.")
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        if self.latency > 0:
+            time.sleep(min(self.latency, timeout or self.latency))
+        self._check_timeout(timeout)
+        return self._answer(prompt)
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        if self.latency > 0:
+            await asyncio.sleep(min(self.latency, timeout or self.latency))
+        self._check_timeout(timeout)
+        return self._answer(prompt)
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        answer = self._answer(prompt)
+        chunks = [answer[i:i + self.chunk_chars] for i in range(0, len(answer), self.chunk_chars)]
+        rest = max(self.latency - self.first_token_latency, 0.0) / max(len(chunks) - 1, 1)
+        for i, chunk in enumerate(chunks):
+            delay = self.first_token_latency if i == 0 else rest
+            if delay > 0:
+                time.sleep(delay)
+            yield chunk
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name: str = "gemini", **kwargs) -> LLMBackend:
+    """이름으로 LLM 백엔드 생성 (gemini / stub)"""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"지원하지 않는 LLM 백엔드입니다: {name} (가능: {', '.join(BACKENDS)})")
+    logger.info(f"LLM 백엔드: {name}")
+    return backend_cls(**kwargs)
+
+
+# 재시도 대상 오류 (google.api_core 예외 클래스 이름 기준: 429 / 5xx / 타임아웃)
+RETRYABLE_ERRORS = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "InternalServerError",
+    "DeadlineExceeded",
+    "GatewayTimeout",
+}
+
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in RETRYABLE_ERRORS:
+        return True
+    # google.api_core 예외는 code, HTTP 클라이언트 예외는 status_code에 상태 코드가 있음 (grpc의 code()는 메서드라 제외됨)
+    status = getattr(error, "code", None)
+    if not isinstance(status, int):
+        status = getattr(error, "status_code", None)
+    return isinstance(status, int) and status in RETRYABLE_STATUS_CODES
+
+
+class ConcurrencyLimiter:
+    """스레드와 이벤트 루프에 관계없이 하나의 상한을 공유하는 세마포어
+
+    동기 호출(with)과 비동기 호출(async with)이 같은 슬롯을 나눠 쓰며, 대기자는 들어온 순서대로 슬롯을 넘겨받는다.
+    비동기 대기자는 자신의 이벤트 루프에서 깨우므로 여러 루프가 하나의 클라이언트를 공유해도 된다.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(int(limit), 1)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # threading.Event 또는 (loop, future)
+
+    def acquire(self):
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()  # release가 슬롯을 그대로 넘겨줌
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # 이미 슬롯을 넘겨받은 뒤 취소되었다면 반납 (넘겨주기 전에 취소된 경우는 _hand_over가 반납)
+            if not queued and waiter[1].done() and not waiter[1].cancelled():
+                self.release()
+            raise
+
+    def _hand_over(self, future: asyncio.Future):
+        if future.done():
+            self.release()  # 기다리던 작업이 취소됨 → 다음 대기자에게
+        else:
+            future.set_result(None)
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(self._hand_over, future)
+                    return
+            self._active -= 1
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class LLMClient:
+    """LLM 백엔드를 감싸 동시 호출 상한, 지수 백오프 재시도, 호출별 제한 시간, 스트리밍을 제공
+
+    여러 서비스 인스턴스·스레드·이벤트 루프가 하나의 클라이언트를 공유하고 동기/비동기 호출을 섞어도
+    동시 호출 수가 max_concurrency를 넘지 않는다.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        max_concurrency: int = 8,
+        max_retries: int = 4,
+        timeout: Optional[float] = 60.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limiter = ConcurrencyLimiter(max_concurrency)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def name(self) -> str:
+        return self.backend.name
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+    def _backoff(self, attempt: int) -> float:
+        # 지수 백오프 + 지터 (동시에 실패한 호출들이 같은 시점에 다시 몰리지 않도록)
+        delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+        return delay * (0.5 + random.random() / 2)
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.failures += 1
+            metrics.inc("llm_failures", backend=self.name)
+            return False
+        with self._lock:
+            self.retries += 1
+        metrics.inc("llm_retries", backend=self.name)
+        logger.warning(f"LLM 호출 실패, 재시도 {attempt + 1}/{self.max_retries}: {type(error).__name__}: {str(error)}")
+        return True
+
+    def _count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            with self._limiter:
+                self._count_call()
+                try:
+                    with metrics.span("llm_generate", backend=self.name):
+                        return self.backend.generate(prompt, timeout)
+                except Exception as e:
+                    error = e
+            if not self._should_retry(error, attempt):
+                raise error
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            async with self._limiter:
+                self._count_call()
+                try:
+                    with metrics.span("llm_generate", backend=self.name):
+                        return await asyncio.wait_for(self.backend.agenerate(prompt, timeout), timeout)
+                except Exception as e:
+                    error = e
+            if not self._should_retry(error, attempt):
+                raise error
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def stream(self, prompt: str, timeout: Optional[float] = None) -> Iterator[str]:
+        """답변 조각을 받는 즉시 전달. 첫 조각을 받기 전의 실패만 재시도 (이미 내보낸 조각은 되돌릴 수 없음)"""
+        timeout = timeout or self.timeout
+        attempt = 0
+        while True:
+            started = False
+            with self._limiter:
+                self._count_call()
+                try:
+                    start = time.perf_counter()
+                    for chunk in self.backend.stream(prompt, timeout):
+                        if not started:
+                            metrics.observe("llm_first_token", time.perf_counter() - start, backend=self.name)
+                        started = True
+                        yield chunk
+                    metrics.observe("llm_generate", time.perf_counter() - start, backend=self.name)
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    error = e
+            if not self._should_retry(error, attempt):
+                raise error
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def astream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """동기 스트림을 스레드에서 돌려 비동기 이터레이터로 전달"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def produce():
+            try:
+                for chunk in self.stream(prompt, timeout):
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        loop.run_in_executor(None, produce)
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+
+
+_shared_clients = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_client(name: str = "gemini", client_options: Optional[dict] = None, **backend_kwargs) -> LLMClient:
+    """같은 백엔드·클라이언트 설정이면 프로세스 전체에서 하나의 LLMClient(연결·동시성 상한)를 공유"""
+    key = (
+        name,
+        tuple(sorted((k, repr(v)) for k, v in backend_kwargs.items())),
+        tuple(sorted((k, repr(v)) for k, v in (client_options or {}).items())),
+    )
+    with _shared_lock:
+        client = _shared_clients.get(key)
+        if client is None:
+            client = LLMClient(create_backend(name, **backend_kwargs), **(client_options or {}))
+            _shared_clients[key] = client
+        return client
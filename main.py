@@ -10,7 +10,10 @@ if __name__ == "__main__":
         config={
             "vector_db_path": settings.VECTOR_DB_PATH,
             "model_name": settings.MODEL_NAME,
-            "embedding_model_path": settings.EMBEDDING_MODEL_PATH
+            "embedding_model_path": settings.EMBEDDING_MODEL_PATH,
+            "embedding_model_name": settings.EMBEDDING_MODEL_NAME,
+            "embedding_cache_dir": settings.EMBEDDING_CACHE_DIR,
+            "embedding_backend": settings.EMBEDDING_BACKEND
         }
     )
     
@@ -24,5 +27,8 @@ if __name__ == "__main__":
     # 질문 답변 테스트
     for i, question in enumerate(test_questions, 1):
         print(f"\n--- 질문 {i}: {question} ---")
-        answer = rag_service.answer_question(question)
-        print(f"답변: {answer}")
\ No newline at end of file
+        # 답변을 생성되는 대로 출력 (스트리밍)
+        print("답변: ", end="", flush=True)
+        for chunk in rag_service.stream_answer(question):
+            print(chunk, end="", flush=True)
+        print()
\ No newline at end of file
@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+_worker_model = None
+
+
+def _init_worker(model_path: str, model_name: str, threads: int):
+    """워커마다 모델 복제본을 한 번 로드하고, 워커끼리 코어를 나눠 쓰도록 스레드 수를 고정"""
+    global _worker_model
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+    torch.set_num_threads(threads)
+
+    from embedding_cache import load_embeddings
+    _worker_model = load_embeddings(model_path, model_name, device="cpu")
+
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.embed_documents(texts), dtype=np.float32)
+
+
+class ParallelEncoder(Embeddings):
+    """CPU 코어를 프로세스 단위로 나누어 쓰는 문서 임베딩 인코더 (HuggingFaceEmbeddings와 같은 인터페이스)
+
+    N개 워커가 각자 모델 복제본과 고정된 스레드 수를 갖는다.
+    문서를 길이순으로 정렬해 배치로 묶어 패딩을 줄이고, 배치를 워커에 나누어 보낸 뒤 원래 순서로 다시 맞춘다.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        model_name: str,
+        workers: int = 0,
+        threads_per_worker: int = 0,
+        batch_size: int = 32,
+    ):
+        cpus = os.cpu_count() or 1
+        self.workers = workers or cpus
+        self.threads_per_worker = threads_per_worker or max(1, cpus // self.workers)
+        self.batch_size = batch_size
+        # torch/토크나이저 스레드 상태를 물려받지 않도록 spawn으로 워커 생성
+        self._pool = ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_path, model_name, self.threads_per_worker),
+        )
+        logger.info(f"병렬 인코더: 워커 {self.workers}개 × 스레드 {self.threads_per_worker}개")
+
+    def length_sorted_batches(self, texts: List[str]) -> List[np.ndarray]:
+        """길이순으로 정렬한 인덱스를 batch_size씩 나눔 (비슷한 길이끼리 묶여 패딩 최소화)"""
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = self.length_sorted_batches(texts)
+        # 긴 배치부터 보내 마지막에 긴 배치 하나만 남아 다른 워커가 노는 상황을 줄임
+        batches.reverse()
+        futures = [self._pool.submit(_encode_batch, [texts[i] for i in batch]) for batch in batches]
+
+        vectors: Optional[np.ndarray] = None
+        for batch, future in zip(batches, futures):
+            result = future.result()
+            if vectors is None:
+                vectors = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            vectors[batch] = result
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"병렬 임베딩: {len(texts)}개, {elapsed:.2f}초 ({len(texts) / elapsed:.1f} docs/sec)")
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from flat_index import TABLE_FILE_NAME, FlatIndex, load_table, top_k_rows
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PQ_HEADER_FILE_NAME = "pq_index.json"
+CODEBOOKS_FILE_NAME = "codebooks.npy"
+CODES_FILE_NAME = "codes.u8"
+
+# 메모리/정확도 프리셋: m = 서브공간 수 (= 벡터당 바이트, 8비트 코드), rerank = 정확 거리로 다시 정렬할 후보 수
+PRESETS = {
+    "compact": {"m": 32, "rerank": 0},
+    "balanced": {"m": 64, "rerank": 50},
+    "accurate": {"m": 128, "rerank": 100},
+}
+
+
+def _kmeans(points: np.ndarray, n_clusters: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    """서브공간 하나에 대한 Lloyd k-means (빈 클러스터는 임의의 점으로 재초기화)"""
+    centroids = points[rng.choice(len(points), size=n_clusters, replace=len(points) < n_clusters)].copy()
+    point_norms = np.einsum("ij,ij->i", points, points)
+    for _ in range(iters):
+        distances = point_norms[:, None] - 2.0 * (points @ centroids.T) + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        assign = np.argmin(distances, axis=1)
+        counts = np.bincount(assign, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, points)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), size=int(empty.sum()))]
+    return centroids
+
+
+def train_codebooks(vectors: np.ndarray, m: int, n_centroids: int = 256, iters: int = 20,
+                    sample_size: int = 65536, seed: int = 0) -> np.ndarray:
+    """벡터를 m개 서브공간으로 나누어 서브공간별 코드북 (m, n_centroids, dim/m) 학습"""
+    dim = vectors.shape[1]
+    if dim % m:
+        raise ValueError(f"차원({dim})이 서브공간 수(m={m})로 나누어떨어지지 않습니다.")
+    rng = np.random.default_rng(seed)
+    sample = vectors[np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))]
+    sample = np.asarray(sample, dtype=np.float32)
+    dsub = dim // m
+    return np.stack([
+        _kmeans(np.ascontiguousarray(sample[:, j * dsub:(j + 1) * dsub]), n_centroids, iters, rng)
+        for j in range(m)
+    ]).astype(np.float32)
+
+
+def encode(vectors: np.ndarray, codebooks: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    """각 서브벡터를 가장 가까운 중심의 번호(uint8)로 인코딩"""
+    m, n_centroids, dsub = codebooks.shape
+    codes = np.empty((len(vectors), m), dtype=np.uint8)
+    centroid_norms = np.einsum("mkd,mkd->mk", codebooks, codebooks)
+    for start in range(0, len(vectors), batch_size):
+        block = np.asarray(vectors[start:start + batch_size], dtype=np.float32).reshape(-1, m, dsub)
+        # (b, m, k): ||c||^2 - 2 x·c (||x||^2는 argmin에 영향 없음)
+        scores = centroid_norms[None, :, :] - 2.0 * np.einsum("bmd,mkd->bmk", block, codebooks)
+        codes[start:start + len(block)] = np.argmin(scores, axis=2)
+    return codes
+
+
+def build_pq_index(flat_dir: str, out_dir: str, preset: str = "balanced", iters: int = 20) -> dict:
+    """flat_index.py로 내보낸 행렬에서 코드북을 학습하고 PQ 코드를 저장 (id/메타데이터 테이블은 복사)"""
+    flat = FlatIndex(flat_dir)
+    options = PRESETS[preset]
+    start = time.time()
+    codebooks = train_codebooks(flat.vectors, options["m"], iters=iters)
+    train_seconds = time.time() - start
+    codes = encode(flat.vectors, codebooks)
+
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    np.save(tmp_dir / CODEBOOKS_FILE_NAME, codebooks)
+    codes.tofile(tmp_dir / CODES_FILE_NAME)
+    shutil.copyfile(Path(flat_dir) / TABLE_FILE_NAME, tmp_dir / TABLE_FILE_NAME)
+    header = {
+        "collection": flat.header.get("collection"),
+        "count": len(flat),
+        "dim": flat.header["dim"],
+        "m": options["m"],
+        "n_centroids": int(codebooks.shape[1]),
+        "preset": preset,
+        "rerank": options["rerank"],
+        # 재정렬용 원본 벡터 (flat 인덱스가 없으면 ADC 거리만 사용)
+        "refine_dir": os.path.abspath(flat_dir),
+        "train_seconds": round(train_seconds, 2),
+    }
+    with open(tmp_dir / PQ_HEADER_FILE_NAME, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    logger.info(
+        f"📦 PQ 인덱스 생성: {out_dir} ({len(flat)}개, m={options['m']}, 학습 {train_seconds:.1f}초, 전체 {time.time() - start:.1f}초)"
+    )
+    return header
+
+
+class PQIndex(FlatIndex):
+    """Product Quantization 압축 인덱스 (벡터당 m바이트)
+
+    질의마다 서브공간별 거리 테이블(m × 256)을 만들고 코드로 조회해 더하는 ADC(asymmetric distance)로 검색한다.
+    rerank > 0이고 flat 인덱스가 있으면 ADC 상위 rerank개 후보만 float16 원본으로 정확한 거리를 다시 계산한다.
+    필터/조회/Chroma 호환 메서드는 FlatIndex와 같다.
+    """
+
+    def __init__(self, directory: str, rerank: Optional[int] = None):
+        self.directory = Path(directory)
+        with open(self.directory / PQ_HEADER_FILE_NAME, "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        self._set_table(load_table(self.directory))
+
+        count, m = self.header["count"], self.header["m"]
+        self.codebooks = np.load(self.directory / CODEBOOKS_FILE_NAME)
+        self.codes = np.memmap(self.directory / CODES_FILE_NAME, dtype=np.uint8, mode="r", shape=(count, m))
+        self.rerank = self.header["rerank"] if rerank is None else rerank
+        self.upcast = None
+
+        # 재정렬용 원본 벡터 (FlatIndex와 같은 행 순서)
+        self.refine = None
+        refine_dir = self.header.get("refine_dir")
+        if self.rerank > 0 and refine_dir and os.path.exists(os.path.join(refine_dir, TABLE_FILE_NAME)):
+            self.refine = FlatIndex(refine_dir)
+        self.vectors = self.refine.vectors if self.refine is not None else None
+
+    @classmethod
+    def load(cls, directory: str, **kwargs) -> Optional["PQIndex"]:
+        if not (Path(directory) / PQ_HEADER_FILE_NAME).exists():
+            logger.warning(f"⚠ PQ 인덱스가 없습니다: {directory}")
+            return None
+        index = cls(directory, **kwargs)
+        logger.info(
+            f"PQ 인덱스 로드: {directory} ({index.header['count']}개, {index.bytes_per_vector} B/벡터, rerank={index.rerank})"
+        )
+        return index
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return int(self.codes.shape[1])
+
+    def decode(self, rows: np.ndarray) -> np.ndarray:
+        """코드를 중심 벡터로 복원 (근사 벡터)"""
+        m = self.codes.shape[1]
+        return self.codebooks[np.arange(m)[None, :], self.codes[rows]].reshape(len(rows), -1)
+
+    def get(self, ids=None, include=None, limit=None, offset: int = 0) -> dict:
+        include = list(include or ["documents", "metadatas"])
+        if self.refine is not None or "embeddings" not in include:
+            return super().get(ids, include, limit, offset)
+        result = super().get(ids, [field for field in include if field != "embeddings"], limit, offset)
+        result["embeddings"] = self.decode(np.array([self.row_of[doc_id] for doc_id in result["ids"]], dtype=np.int64))
+        return result
+
+    def adc_distances(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        m, _, dsub = self.codebooks.shape
+        table = ((self.codebooks - query.reshape(m, 1, dsub)) ** 2).sum(axis=2)  # (m, 256)
+        codes = self.codes if rows is None else self.codes[rows]
+        distances = np.zeros(len(codes), dtype=np.float32)
+        for j in range(m):
+            distances += table[j][codes[:, j]]
+        return distances
+
+    def search(self, queries, k: int = 5, rows: Optional[np.ndarray] = None, rerank: Optional[int] = None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rerank = self.rerank if rerank is None else rerank
+        results = []
+        for query in queries:
+            distances = self.adc_distances(query, rows)
+            if self.refine is None or rerank <= 0:
+                results.append(top_k_rows(distances, k, rows))
+                continue
+            shortlist, _ = top_k_rows(distances, max(k, rerank), rows)
+            shortlist = np.sort(shortlist)
+            exact = self.refine.search(query, k, shortlist)[0]
+            results.append(exact)
+        return results
+
+
+def recall_report(flat: FlatIndex, pq: PQIndex, n_queries: int = 200, k: int = 10, seed: int = 0) -> dict:
+    """저장 벡터에 잡음을 더한 질의로 exact(flat) 대비 recall@k와 지연, 벡터당 바이트 비교"""
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(flat), size=min(n_queries, len(flat)), replace=False))
+    base = flat.vectors[rows].astype(np.float32)
+    queries = base + rng.normal(scale=float(np.abs(base).mean()) * 0.3, size=base.shape).astype(np.float32)
+
+    truth = [set(found.tolist()) for found, _ in flat.search(queries, k)]
+    report = {
+        "count": len(flat),
+        "k": k,
+        "queries": len(queries),
+        "bytes_per_vector": {
+            "float32": flat.header["dim"] * 4,
+            "float16": flat.header["dim"] * 2,
+            "pq": pq.bytes_per_vector,
+        },
+        "compression_vs_float32": round(flat.header["dim"] * 4 / pq.bytes_per_vector, 1),
+    }
+    for label, rerank in (("adc", 0), (f"adc+rerank{pq.rerank}", pq.rerank)):
+        if rerank and pq.refine is None:
+            continue
+        start = time.perf_counter()
+        found = [set(r.tolist()) for r, _ in pq.search(queries, k, rerank=rerank)]
+        elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+        report[label] = {
+            f"recall@{k}": round(float(np.mean([len(f & t) / k for f, t in zip(found, truth)])), 4),
+            "ms_per_query": round(elapsed, 3),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["build", "report"], help="build: 코드북 학습/인코딩, report: 메모리/recall 리포트")
+    parser.add_argument("--flat_dir", type=str, default="./vector_db/flat/contracts_qa_collection", help="flat_index.py export 결과")
+    parser.add_argument("--out_dir", type=str, default="./vector_db/pq/contracts_qa_collection")
+    parser.add_argument("--preset", type=str, default="balanced", choices=list(PRESETS))
+    parser.add_argument("--iters", type=int, default=20, help="k-means 반복 횟수")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_pq_index(args.flat_dir, args.out_dir, args.preset, args.iters)
+        return
+    report = recall_report(FlatIndex(args.flat_dir), PQIndex(args.out_dir), args.queries, args.k)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
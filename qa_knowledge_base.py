@@ -1,106 +1,167 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.docstore.document import Document
 from langchain_chroma import Chroma
 from config import Settings
+from embedding_cache import load_embeddings
+from ingest_utils import StageTimer, batched
+from qa_payload_store import PAYLOAD_DIR_NAME, QAPayloadWriter
 from pathlib import Path
+import argparse
 import json
 import os
+import shutil
 import time
+import snapshots
 
 ## 사전 train 데이터셋을 활용한 지식베이스 생성
-settings = Settings(JSON_PATH="./data/train",VECTOR_DB_PATH="./vector_db/qa_knowledge_base") ## json 경로 설정
-
-# HuggingFace 임베딩 모델 초기화
-try:
-    embeddings = HuggingFaceEmbeddings(
-        model_name=settings.EMBEDDING_MODEL_PATH,
-        model_kwargs={'device': 'cuda'}
-    )
-    print("로컬 임베딩 모델 로드 성공")
-except Exception:
-    print("로컬 임베딩 모델 로드 실패, 온라인 모델을 사용합니다")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=settings.EMBEDDING_MODEL_NAME,
-        model_kwargs={'device': 'cuda'}
+QA_COLLECTION_NAME = "contracts_qa_collection"
+
+
+def iter_qa_records(json_files):
+    """train JSON 파일을 하나씩 읽어 (doc_id, Document, QAs)를 스트리밍으로 반환
+
+    QAs는 메타데이터에 넣지 않고 사이드 스토어(qa_payload_store)에 따로 저장한다.
+    """
+    for json_file in json_files:
+        try:
+            with open(json_file, 'r', encoding='utf-8') as file:
+                contracts_data = json.load(file)
+        except FileNotFoundError:
+            print(f"파일을 찾을 수 없습니다: {json_file}")
+            exit()
+        except json.JSONDecodeError:
+            print(f"{json_file} 파일 파싱 중 오류가 발생했습니다.")
+            exit()
+
+        for contract_idx, contract in enumerate(contracts_data):
+            summary_text = contract.get("QL", {}).get("ABSTRACTED_SUMMARY_TEXT", "").strip()
+            qas = contract.get("QL", {}).get("QAs", [])
+            # 메타데이터 구성
+            metadata = {
+                "CHNK_NO": contract["CHNK_NO"],
+                "SMRT_CHNK_NO": contract["SMRT_CHNK_NO"],
+                "JNG_BIZ_CRTRA_YR": contract["JNG_INFO"]["JNG_BIZ_CRTRA_YR"],
+                "JNGHDQRTRS_CONM_NM": contract["JNG_INFO"]["JNGHDQRTRS_CONM_NM"],
+                "BRAND_NM": contract["JNG_INFO"]["BRAND_NM"],
+                "JNG_IFRMP_SN": contract["JNG_INFO"]["JNG_IFRMP_SN"],
+                "ATTRB_MNNO": contract["ATTRB_INFO"]["ATTRB_MNNO"],
+                "KORN_ATTRB_NM": contract["ATTRB_INFO"]["KORN_ATTRB_NM"],
+                "UP_ATTRB_MNNO": contract["ATTRB_INFO"]["UP_ATTRB_MNNO"],
+                "KORN_UP_ATRB_NM": contract["ATTRB_INFO"]["KORN_UP_ATRB_NM"],
+                "source": f"{json_file.name}",
+            }
+
+            doc_id = f"{json_file.name}_{contract_idx}"
+            yield doc_id, Document(page_content=summary_text, metadata=metadata), qas
+
+
+def build_qa_knowledge_base(settings: Settings, embeddings, batch_size: int = 256) -> int:
+    """파일 단위로 읽고 batch_size 단위로 임베딩/업서트하여 메모리 사용량을 일정하게 유지"""
+    vector_db_path = settings.VECTOR_DB_PATH
+    os.makedirs(vector_db_path, exist_ok=True)
+
+    vector_store = Chroma(
+        persist_directory=vector_db_path,
+        embedding_function=embeddings,
+        collection_name=QA_COLLECTION_NAME,
     )
 
-print(f"임베딩 모델 {settings.EMBEDDING_MODEL_NAME} 로딩 완료")
-
-# 벡터 저장소 디렉토리 생성
-vector_db_path = settings.VECTOR_DB_PATH
-os.makedirs(vector_db_path, exist_ok=True)
-
-# JSON 데이터 로드
-
-
-# 문서 객체 생성
-documents = []
-ids = []
-
-succ_cnt = 0 # 성공 갯수
-
-# JSON 경로를 Path 객체로 변환
-json_dir = Path(settings.JSON_PATH)
-# .json 파일 전체 경로 리스트
-json_files = list(json_dir.glob("*.json"))  
-
-for json_file in json_files:
-    try:
-        with open(json_file, 'r', encoding='utf-8') as file:
-            contracts_data = json.load(file)
-        # print(f"총 {len(contracts_data)} 개의 계약서 데이터를 로드했습니다.")
-    except FileNotFoundError:
-        print(f"파일을 찾을 수 없습니다: {json_file}")
-        contracts_data = []
-        exit()
-    except json.JSONDecodeError:
-        print(f"{json_file} 파일 파싱 중 오류가 발생했습니다.")
-        contracts_data = []
-        exit()
-
-    for contract_idx, contract in enumerate(contracts_data):
-        summary_text = contract.get("QL", {}).get("ABSTRACTED_SUMMARY_TEXT", "").strip()
-        qas = contract.get("QL", {}).get("QAs", [])
-        # 메타데이터 구성
-        metadata = {
-            "CHNK_NO": contract["CHNK_NO"],
-            "SMRT_CHNK_NO": contract["SMRT_CHNK_NO"],
-            "JNG_BIZ_CRTRA_YR": contract["JNG_INFO"]["JNG_BIZ_CRTRA_YR"],
-            "JNGHDQRTRS_CONM_NM": contract["JNG_INFO"]["JNGHDQRTRS_CONM_NM"],
-            "BRAND_NM": contract["JNG_INFO"]["BRAND_NM"],
-            "JNG_IFRMP_SN": contract["JNG_INFO"]["JNG_IFRMP_SN"],
-            "ATTRB_MNNO": contract["ATTRB_INFO"]["ATTRB_MNNO"],
-            "KORN_ATTRB_NM": contract["ATTRB_INFO"]["KORN_ATTRB_NM"],
-            "UP_ATTRB_MNNO": contract["ATTRB_INFO"]["UP_ATTRB_MNNO"],
-            "KORN_UP_ATRB_NM": contract["ATTRB_INFO"]["KORN_UP_ATRB_NM"],
-            "source": f"{json_file.name}",
-            "QAs": json.dumps(qas, ensure_ascii=False)  # 문자열로 저장  # QA 전체 포함
-        }
-        
-        doc_id = f"{json_file.name}_{contract_idx}"
-        documents.append(Document(page_content=summary_text, metadata=metadata))
-        ids.append(doc_id)
-        succ_cnt+=1
-
-print(f"📄 총 {succ_cnt}개의 문서 처리 완료")
-
-# Chroma 벡터 스토어 생성
-try:
-    print(f"✅ 벡터 스토어 생성 중... 저장 경로: {vector_db_path}")
-    start_time = time.time()
-
-    vector_store = Chroma.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        collection_name="contracts_qa_collection",
-        persist_directory=vector_db_path,
-        ids=ids
+    json_files = sorted(Path(settings.JSON_PATH).glob("*.json"))
+    timer = StageTimer()
+    succ_cnt = 0  # 성공 갯수
+
+    # 전체 train 파일을 매번 다시 읽으므로 사이드 스토어도 통째로 새로 만든 뒤 교체
+    # (도중에 실패하면 __exit__가 파일을 닫고 게시하지 않은 버전 디렉토리를 지움)
+    with QAPayloadWriter(os.path.join(vector_db_path, PAYLOAD_DIR_NAME)) as payloads:
+        # 레코드를 만들어내는 시간(파일 읽기/JSON 파싱 포함)만 parse 단계로 누적
+        for batch in batched(timer.measure("parse", iter_qa_records(json_files)), batch_size):
+            ids = [doc_id for doc_id, _, _ in batch]
+            texts = [doc.page_content for _, doc, _ in batch]
+            metadatas = [doc.metadata for _, doc, _ in batch]
+            for doc_id, doc, qas in batch:
+                payloads.add(doc_id, qas, group=doc.metadata["ATTRB_MNNO"])
+
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents(texts)
+            timer.record("embed", time.perf_counter() - start, len(texts))
+
+            start = time.perf_counter()
+            vector_store._collection.upsert(
+                ids=ids,
+                embeddings=vectors,
+                metadatas=metadatas,
+                documents=texts,
+            )
+            timer.record("upsert", time.perf_counter() - start, len(ids))
+
+            succ_cnt += len(ids)
+            print(f"  ... {succ_cnt}개 문서 적재 ({timer.rate('embed'):.1f} docs/sec 임베딩)")
+
+    print(f"📄 총 {succ_cnt}개의 문서 처리 완료")
+    print("⏱️ 단계별 처리 속도")
+    print(timer.report())
+    return succ_cnt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch_size", type=int, default=256, help="임베딩/업서트 배치 크기")
+    parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--workers", type=int, default=1, help="CPU 임베딩 워커 프로세스 수 (device=cpu일 때만 사용)")
+    parser.add_argument("--example_index", action="store_true", help="few-shot 예시 질문 인덱스도 함께 생성")
+    parser.add_argument("--keep_versions", type=int, default=2, help="남겨 둘 게시 버전 수 (현재 버전 포함)")
+    parser.add_argument("--in_place", action="store_true", help="버전 디렉토리 없이 현재 지식베이스를 직접 갱신 (이전 방식)")
+    args = parser.parse_args()
+
+    # 전체 train을 다시 적재하므로 빈 새 버전 디렉토리에 만든 뒤 CURRENT 포인터를 바꿔 게시
+    vector_db_root = os.path.abspath("./vector_db/qa_knowledge_base")
+    version = None
+    if args.in_place:
+        _, vector_db_path = snapshots.resolve(vector_db_root)
+    else:
+        version, vector_db_path = snapshots.prepare_version(vector_db_root, copy=False)
+    settings = Settings(JSON_PATH="./data/train",VECTOR_DB_PATH=str(vector_db_path),DEVICE=args.device) ## json 경로 설정
+
+    # HuggingFace 임베딩 모델 초기화 (디스크 캐시 사용)
+    embeddings = load_embeddings(
+        settings.EMBEDDING_MODEL_PATH,
+        settings.EMBEDDING_MODEL_NAME,
+        device=settings.DEVICE,
+        cache_dir=settings.EMBEDDING_CACHE_DIR,
+        cache_max_mb=settings.EMBEDDING_CACHE_MAX_MB,
+        workers=args.workers,
     )
 
-    end_time = time.time()
-    elapsed_time = end_time - start_time
+    print(f"임베딩 모델 {settings.EMBEDDING_MODEL_NAME} 로딩 완료")
 
-    print(f"✅ 벡터 스토어 생성 완료. 소요 시간: {elapsed_time:.2f}초")
-    print(f"📍 저장 경로: {vector_db_path}")
-except Exception as e:
-    print(f"❌ 벡터 스토어 생성 중 오류 발생: {str(e)}")
+    # Chroma 벡터 스토어 생성
+    try:
+        print(f"✅ 벡터 스토어 생성 중... 저장 경로: {settings.VECTOR_DB_PATH}")
+        start_time = time.time()
+
+        build_qa_knowledge_base(settings, embeddings, batch_size=args.batch_size)
+        if args.example_index:
+            from context_packer import TokenCounter
+            from example_index import EXAMPLE_INDEX_DIR_NAME, build_example_index
+            from qa_payload_store import QAPayloadStore
+            build_example_index(
+                QAPayloadStore(os.path.join(settings.VECTOR_DB_PATH, PAYLOAD_DIR_NAME)),
+                embeddings,
+                TokenCounter.from_embeddings(embeddings),
+                os.path.join(settings.VECTOR_DB_PATH, EXAMPLE_INDEX_DIR_NAME),
+                batch_size=args.batch_size,
+            )
+        if version is not None:
+            snapshots.publish(vector_db_root, version)
+            snapshots.gc_versions(vector_db_root, keep=args.keep_versions)
+
+        elapsed_time = time.time() - start_time
+        print(f"✅ 벡터 스토어 생성 완료. 소요 시간: {elapsed_time:.2f}초")
+        print(f"📍 저장 경로: {settings.VECTOR_DB_PATH}")
+    except Exception as e:
+        print(f"❌ 벡터 스토어 생성 중 오류 발생: {str(e)}")
+        if version is not None and snapshots.current_version(vector_db_root) != version:
+            shutil.rmtree(vector_db_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import logging
+import time
+from typing import List, Optional
+
+import numpy as np
+from langchain.docstore.document import Document
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedQAIndex:
+    """QA 지식베이스를 ATTRB_MNNO별 파티션으로 메모리에 올린 인덱스
+
+    전체 벡터를 파티션 순서로 정렬한 하나의 연속 행렬에 두고, 파티션은 그 행렬의 슬라이스(view)로 접근한다.
+    필터 검색은 해당 슬라이스에 대한 행렬-벡터 곱 한 번으로 끝나며,
+    필터 결과가 없으면 파티션 중심(centroid)과 가까운 파티션 n_probe개만 탐색한다.
+    거리는 Chroma 기본값과 같은 L2 거리 순서를 따른다.
+    """
+
+    def __init__(self, ids, vectors, documents, metadatas, partition_key: str = "ATTRB_MNNO", n_probe: int = 8):
+        self.partition_key = partition_key
+        self.n_probe = n_probe
+
+        keys = [str(meta.get(partition_key, "")) for meta in metadatas]
+        order = sorted(range(len(ids)), key=lambda i: keys[i])
+
+        self.ids = [ids[i] for i in order]
+        self.documents = [documents[i] for i in order]
+        self.metadatas = [metadatas[i] for i in order]
+        self.matrix = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32)[order])
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+        # 파티션 키 → (시작 행, 끝 행)
+        self.partitions = {}
+        sorted_keys = [keys[i] for i in order]
+        start = 0
+        for row in range(1, len(sorted_keys) + 1):
+            if row == len(sorted_keys) or sorted_keys[row] != sorted_keys[start]:
+                self.partitions[sorted_keys[start]] = (start, row)
+                start = row
+
+        self.partition_names = list(self.partitions)
+        if self.partition_names:
+            self.centroids = np.stack(
+                [self.matrix[s:e].mean(axis=0) for s, e in self.partitions.values()]
+            ).astype(np.float32)
+        else:
+            self.centroids = np.zeros((0, self.matrix.shape[1] if self.matrix.ndim == 2 else 0), dtype=np.float32)
+
+    @classmethod
+    def from_chroma(cls, vectorstore, page_size: int = 5000, **kwargs) -> "PartitionedQAIndex":
+        """Chroma 컬렉션의 임베딩/문서/메타데이터를 페이지 단위로 읽어 인덱스 구성"""
+        start = time.time()
+        collection = vectorstore._collection
+        total = collection.count()
+        ids, vectors, documents, metadatas = [], [], [], []
+        for offset in range(0, total, page_size):
+            page = collection.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=page_size,
+                offset=offset,
+            )
+            ids.extend(page["ids"])
+            vectors.extend(page["embeddings"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+        index = cls(ids, vectors, documents, metadatas, **kwargs)
+        logger.info(
+            f"[QA] 파티션 인덱스 구성 완료: {len(ids)}개 문서, {len(index.partitions)}개 파티션 ({time.time() - start:.2f}초)"
+        )
+        return index
+
+    def _top_k_rows(self, query: np.ndarray, start: int, end: int, k: int) -> np.ndarray:
+        # ||x - q||^2 = ||x||^2 - 2 x·q + ||q||^2 (마지막 항은 순위에 영향 없음)
+        distances = self.sq_norms[start:end] - 2.0 * (self.matrix[start:end] @ query)
+        if k < len(distances):
+            top = np.argpartition(distances, k)[:k]
+        else:
+            top = np.arange(len(distances))
+        return start + top[np.argsort(distances[top])]
+
+    def _to_documents(self, rows) -> List[Document]:
+        return [
+            Document(page_content=self.documents[r] or "", metadata=self.metadatas[r] or {}, id=self.ids[r])
+            for r in rows
+        ]
+
+    def search(self, embedding, k: int = 5, partition: Optional[str] = None) -> List[Document]:
+        """partition(ATTRB_MNNO) 슬라이스에서 검색하고, 해당 파티션이 없으면 centroid 기반 전체 검색"""
+        if not self.ids:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+
+        if partition is not None and str(partition) in self.partitions:
+            start, end = self.partitions[str(partition)]
+            return self._to_documents(self._top_k_rows(query, start, end, k))
+
+        return self.search_global(query, k)
+
+    def search_global(self, embedding, k: int = 5) -> List[Document]:
+        """중심과 가까운 파티션 n_probe개만 탐색하는 전체 검색 폴백"""
+        query = np.asarray(embedding, dtype=np.float32)
+        centroid_dist = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * (self.centroids @ query)
+        n_probe = min(self.n_probe, len(self.partition_names))
+        probe = np.argpartition(centroid_dist, n_probe - 1)[:n_probe]
+
+        candidates = np.concatenate([
+            np.arange(*self.partitions[self.partition_names[p]]) for p in probe
+        ])
+        distances = self.sq_norms[candidates] - 2.0 * (self.matrix[candidates] @ query)
+        top = np.argsort(distances)[:k]
+        return self._to_documents(candidates[top])
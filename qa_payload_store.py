@@ -0,0 +1,171 @@
+import json
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from snapshots import gc_versions, prepare_version, publish, resolve
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_DIR_NAME = "qa_payloads"
+HEADER_FILE_NAME = "qa_payloads.json"
+TEXT_FILE_NAME = "examples.bin"
+EXAMPLE_OFFSETS_FILE_NAME = "example_offsets.i64"
+DOC_OFFSETS_FILE_NAME = "doc_offsets.i64"
+QUESTION_ENDS_FILE_NAME = "question_ends.i64"
+IDS_FILE_NAME = "ids.json"
+GROUPS_FILE_NAME = "groups.json"
+EXAMPLE_PREFIX = "Q: "
+
+
+def qa_pairs(qas: Iterable[dict]) -> Iterator[Tuple[str, str]]:
+    """QAs 목록에서 질문/답변이 모두 있는 (질문, 답변) 쌍만 반환"""
+    for qa in qas:
+        q = (qa.get("QUESTION") or "").strip()
+        a = (qa.get("ANSWER") or "").strip()
+        if q and a:
+            yield q, a
+
+
+def render_example(question: str, answer: str) -> str:
+    """프롬프트에 바로 넣을 수 있는 "Q: ...\\nA: ..." 문자열"""
+    return f"{EXAMPLE_PREFIX}{question}\nA: {answer}"
+
+
+def render_examples(qas: Iterable[dict]) -> List[str]:
+    return [render_example(q, a) for q, a in qa_pairs(qas)]
+
+
+class QAPayloadWriter:
+    """문서 id별 few-shot 예시 문자열을 바이너리 사이드 스토어로 기록
+
+    - examples.bin: 모든 예시 문자열의 UTF-8 바이트를 이어 붙인 파일
+    - example_offsets.i64: 예시 i의 바이트 범위 = [offsets[i], offsets[i+1])
+    - doc_offsets.i64: 문서 r의 예시 범위 = [doc_offsets[r], doc_offsets[r+1])
+    - question_ends.i64: 예시 i의 질문 바이트 범위 = [offsets[i] + len("Q: "), question_ends[i])
+    - ids.json / groups.json: 문서 r의 id와 그룹(ATTRB_MNNO)
+    out_dir/versions/<버전>/에 모두 쓴 뒤 CURRENT 포인터만 교체하므로 읽는 중인 프로세스가 반쯤 쓰인 파일이나
+    빈 디렉토리를 보지 않는다 (직전 버전은 gc_versions가 남겨 두어 로드 중인 프로세스도 끝까지 읽는다).
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = Path(out_dir)
+        self.version, self.version_dir = prepare_version(str(self.out_dir), copy=False)
+        self._text = open(self.version_dir / TEXT_FILE_NAME, "wb")
+        self.ids: List[str] = []
+        self.groups: List[str] = []
+        self.example_offsets = [0]
+        self.question_ends = []
+        self.doc_offsets = [0]
+
+    def add(self, doc_id: str, qas: Iterable[dict], group: str = ""):
+        for q, a in qa_pairs(qas):
+            start = self.example_offsets[-1]
+            self.question_ends.append(start + len(f"{EXAMPLE_PREFIX}{q}".encode("utf-8")))
+            self.example_offsets.append(start + self._text.write(render_example(q, a).encode("utf-8")))
+        self.ids.append(doc_id)
+        self.groups.append(str(group))
+        self.doc_offsets.append(len(self.example_offsets) - 1)
+
+    def close(self) -> dict:
+        self._text.close()
+        np.asarray(self.example_offsets, dtype=np.int64).tofile(self.version_dir / EXAMPLE_OFFSETS_FILE_NAME)
+        np.asarray(self.doc_offsets, dtype=np.int64).tofile(self.version_dir / DOC_OFFSETS_FILE_NAME)
+        np.asarray(self.question_ends, dtype=np.int64).tofile(self.version_dir / QUESTION_ENDS_FILE_NAME)
+        with open(self.version_dir / IDS_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(self.ids, f, ensure_ascii=False)
+        with open(self.version_dir / GROUPS_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(self.groups, f, ensure_ascii=False)
+        header = {
+            "docs": len(self.ids),
+            "examples": len(self.example_offsets) - 1,
+            "bytes": self.example_offsets[-1],
+            "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(self.version_dir / HEADER_FILE_NAME, "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+
+        publish(str(self.out_dir), self.version)
+        gc_versions(str(self.out_dir))
+        logger.info(f"📦 QA 예시 스토어 저장: {self.version_dir} (문서 {header['docs']}개, 예시 {header['examples']}개)")
+        return header
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._text.close()
+            shutil.rmtree(self.version_dir, ignore_errors=True)
+
+
+class QAPayloadStore:
+    """QAPayloadWriter로 만든 사이드 스토어를 mmap으로 열어 문서 id → 렌더링된 예시 문자열을 조회
+
+    파싱 없이 바이트 범위를 잘라 디코딩만 하므로 검색 결과는 id만 들고 다니면 된다.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        with open(self.directory / HEADER_FILE_NAME, "r", encoding="utf-8") as f:
+            self.header = json.load(f)
+        with open(self.directory / IDS_FILE_NAME, "r", encoding="utf-8") as f:
+            self.row_of = {doc_id: row for row, doc_id in enumerate(json.load(f))}
+        self.example_offsets = np.fromfile(self.directory / EXAMPLE_OFFSETS_FILE_NAME, dtype=np.int64)
+        self.doc_offsets = np.fromfile(self.directory / DOC_OFFSETS_FILE_NAME, dtype=np.int64)
+        self.question_ends = np.fromfile(self.directory / QUESTION_ENDS_FILE_NAME, dtype=np.int64)
+        # 빈 파일은 mmap할 수 없으므로 예시가 없으면 빈 배열로 대체
+        if self.header["bytes"]:
+            self.text = np.memmap(self.directory / TEXT_FILE_NAME, dtype=np.uint8, mode="r")
+        else:
+            self.text = np.zeros(0, dtype=np.uint8)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["QAPayloadStore"]:
+        _, directory = resolve(directory)  # 버전 구조면 CURRENT가 가리키는 버전 (이전 구조는 directory 그대로)
+        if not (Path(directory) / HEADER_FILE_NAME).exists():
+            logger.warning(f"⚠ QA 예시 스토어가 없습니다: {directory}")
+            return None
+        store = cls(directory)
+        logger.info(f"QA 예시 스토어 로드: {directory} (문서 {store.header['docs']}개, 예시 {store.header['examples']}개)")
+        return store
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.row_of
+
+    @property
+    def example_count(self) -> int:
+        return len(self.example_offsets) - 1
+
+    def example(self, i: int) -> str:
+        start, end = self.example_offsets[i], self.example_offsets[i + 1]
+        return self.text[start:end].tobytes().decode("utf-8")
+
+    def question(self, i: int) -> str:
+        start = self.example_offsets[i] + len(EXAMPLE_PREFIX.encode("utf-8"))
+        return self.text[start:self.question_ends[i]].tobytes().decode("utf-8")
+
+    def example_groups(self) -> np.ndarray:
+        """예시 i가 속한 문서의 그룹(ATTRB_MNNO) 배열"""
+        with open(self.directory / GROUPS_FILE_NAME, "r", encoding="utf-8") as f:
+            groups = np.asarray(json.load(f), dtype=object)
+        return np.repeat(groups, np.diff(self.doc_offsets))
+
+    def examples(self, doc_id: str, limit: Optional[int] = None) -> List[str]:
+        """문서 id의 예시 문자열 목록 (없는 id면 빈 목록)"""
+        row = self.row_of.get(doc_id)
+        if row is None:
+            return []
+        first, last = int(self.doc_offsets[row]), int(self.doc_offsets[row + 1])
+        if limit is not None:
+            last = min(last, first + limit)
+        return [self.example(i) for i in range(first, last)]
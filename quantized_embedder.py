@@ -0,0 +1,168 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# 질의는 짧고 문서는 길어 용도별로 최대 토큰 길이를 나눔 (질의 패딩/어텐션 비용 절감)
+QUERY_MAX_SEQ_LENGTH = 64
+DOCUMENT_MAX_SEQ_LENGTH = 512
+
+
+class QuantizedEmbeddings(Embeddings):
+    """KURE-v1(SentenceTransformer)에 동적 int8 양자화를 적용한 CPU 임베딩 백엔드 (HuggingFaceEmbeddings와 같은 인터페이스)
+
+    - Linear 층을 torch.quantization.quantize_dynamic으로 int8로 변환
+    - 텍스트별 토큰화 결과를 LRU로 캐시해 같은 텍스트는 다시 토큰화하지 않음
+    - 질의/문서별 최대 시퀀스 길이를 따로 적용
+    """
+
+    def __init__(
+        self,
+        model_name_or_path: str,
+        query_max_seq_length: int = QUERY_MAX_SEQ_LENGTH,
+        document_max_seq_length: int = DOCUMENT_MAX_SEQ_LENGTH,
+        batch_size: int = 32,
+        token_cache_size: int = 50_000,
+    ):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name_or_path, device="cpu")
+        model.eval()
+        # 인코더 본체(Transformer 모듈)의 Linear 층만 int8로 양자화 (pooling/normalize는 그대로)
+        self._client = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.tokenizer = model.tokenizer
+        self.query_max_seq_length = query_max_seq_length
+        self.document_max_seq_length = document_max_seq_length
+        self.batch_size = batch_size
+        self.token_cache_size = token_cache_size
+        self._token_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._torch = torch
+
+    def _tokenize(self, text: str, max_length: int) -> List[int]:
+        key = (max_length, text)
+        with self._lock:
+            ids = self._token_cache.get(key)
+            if ids is not None:
+                self._token_cache.move_to_end(key)
+                return ids
+        ids = self.tokenizer(text, truncation=True, max_length=max_length)["input_ids"]
+        with self._lock:
+            self._token_cache[key] = ids
+            while len(self._token_cache) > self.token_cache_size:
+                self._token_cache.popitem(last=False)
+        return ids
+
+    def _encode(self, texts: List[str], max_length: int) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        token_ids = [self._tokenize(text, max_length) for text in texts]
+        # 길이순으로 배치를 묶어 패딩 최소화 후 원래 순서로 복원
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        vectors = None
+        with self._torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                features = self.tokenizer.pad(
+                    {"input_ids": [token_ids[i] for i in batch]}, padding=True, return_tensors="pt"
+                )
+                output = self._client(dict(features))["sentence_embedding"].float().numpy()
+                if vectors is None:
+                    vectors = np.empty((len(texts), output.shape[1]), dtype=np.float32)
+                vectors[batch] = output
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._encode(texts, self.document_max_seq_length).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text], self.query_max_seq_length)[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """여러 질의를 질의용 최대 길이로 한 번에 인코딩 (embed_query와 같은 벡터)"""
+        return self._encode(texts, self.query_max_seq_length).tolist()
+
+
+def agreement_check(reference: Embeddings, candidate: Embeddings, queries: List[str], documents: List[str]) -> dict:
+    """fp32 기준 모델 대비 코사인 일치도와 지연 비교"""
+    def timed(fn, items):
+        start = time.perf_counter()
+        vectors = np.asarray(fn(items), dtype=np.float32)
+        return vectors, (time.perf_counter() - start) * 1000 / max(len(items), 1)
+
+    def cosine(a, b):
+        a = a / np.linalg.norm(a, axis=1, keepdims=True)
+        b = b / np.linalg.norm(b, axis=1, keepdims=True)
+        return np.einsum("ij,ij->i", a, b)
+
+    report = {}
+    for label, items, ref_fn, cand_fn in (
+        ("query", queries, lambda xs: [reference.embed_query(x) for x in xs], lambda xs: [candidate.embed_query(x) for x in xs]),
+        ("document", documents, reference.embed_documents, candidate.embed_documents),
+    ):
+        if not items:
+            continue
+        ref_vectors, ref_ms = timed(ref_fn, items)
+        cand_vectors, cand_ms = timed(cand_fn, items)
+        scores = cosine(ref_vectors, cand_vectors)
+        report[label] = {
+            "count": len(items),
+            "cosine_mean": round(float(scores.mean()), 5),
+            "cosine_min": round(float(scores.min()), 5),
+            "fp32_ms_per_item": round(ref_ms, 3),
+            "int8_ms_per_item": round(cand_ms, 3),
+            "speedup": round(ref_ms / cand_ms, 2) if cand_ms else None,
+        }
+
+    # 질의별 top-1 문서가 같은지 (검색 결과 관점의 일치도)
+    if queries and documents:
+        ref_q = np.asarray([reference.embed_query(q) for q in queries])
+        cand_q = np.asarray([candidate.embed_query(q) for q in queries])
+        ref_d = np.asarray(reference.embed_documents(documents))
+        cand_d = np.asarray(candidate.embed_documents(documents))
+        same = np.argmax(ref_q @ ref_d.T, axis=1) == np.argmax(cand_q @ cand_d.T, axis=1)
+        report["top1_agreement"] = round(float(same.mean()), 4)
+    return report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="int8 양자화 임베더의 fp32 대비 일치도/지연 확인")
+    parser.add_argument("--data_dir", type=str, default="./data/test")
+    parser.add_argument("--samples", type=int, default=200, help="질의/문서 표본 수")
+    args = parser.parse_args()
+
+    from config import get_settings
+    from create_collection import load_contract_documents
+    from embedding_cache import load_embeddings
+
+    queries, documents = [], []
+    for path in sorted(Path(args.data_dir).glob("*.json")):
+        if path.name.startswith("extract_question_"):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            chunks, questions = load_contract_documents(path, json.load(f))
+        documents.extend(doc.page_content for doc in chunks.values())
+        queries.extend(q["question"] for q in questions)
+        if len(documents) >= args.samples and len(queries) >= args.samples:
+            break
+
+    settings = get_settings()
+    reference = load_embeddings(settings.EMBEDDING_MODEL_PATH, settings.EMBEDDING_MODEL_NAME, device="cpu")
+    candidate = load_embeddings(settings.EMBEDDING_MODEL_PATH, settings.EMBEDDING_MODEL_NAME, device="cpu", backend="int8")
+    report = agreement_check(reference, candidate, queries[:args.samples], documents[:args.samples])
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,7 @@
 import json
 import argparse
 from pathlib import Path
-from config import Settings
-from fewshot_franchise import GeminiFewShotFranchiseService
+from startup_profile import StartupProfiler
 
 # ---------------------
 # 인자 처리
@@ -10,8 +9,25 @@ from fewshot_franchise import GeminiFewShotFranchiseService
 parser = argparse.ArgumentParser()
 parser.add_argument("--json_path", type=str, required=True, help="테스트 JSON 파일 경로")
 parser.add_argument("--device", type=str, default="cuda", help="임베딩 수행 디바이스 (cuda / cpu)")
+parser.add_argument("--limit", type=int, default=5, help="추론할 질문 수 (0이면 전체)")
+parser.add_argument("--batch", action="store_true", help="일괄 임베딩/검색 + 비동기 Gemini 호출로 추론")
+parser.add_argument("--concurrency", type=int, default=8, help="배치 모드 Gemini 동시 호출 상한")
+parser.add_argument("--rps", type=float, default=0.0, help="배치 모드 초당 Gemini 호출 상한 (0이면 제한 없음)")
+parser.add_argument("--cascade", action="store_true", help="검색 점수로 어휘 검색/few-shot 조회를 생략하는 적응형 검색 사용")
+parser.add_argument("--vector_db_path", type=str, default="", help="검색할 벡터 DB 경로 (기본: 설정의 VECTOR_DB_PATH)")
+parser.add_argument("--sharded_store", action="store_true", help="sharded_store.py로 만든 샤드 스토어를 검색 (여러 정보공개서를 한 번에)")
+parser.add_argument("--shard_search_workers", type=int, default=8, help="샤드 병렬 검색 스레드 수")
+parser.add_argument("--metrics_out", type=str, default="", help="단계별 지연/카운터 저장 경로 (.prom이면 Prometheus 텍스트, 그 외 JSON)")
+parser.add_argument("--profile-startup", dest="profile_startup", action="store_true", help="import/모델 로드 시간 리포트 출력")
 args = parser.parse_args()
 
+profiler = StartupProfiler(enabled=args.profile_startup)
+profiler.profile_imports()
+with profiler.phase("import config"):
+    from config import Settings
+with profiler.phase("import fewshot_franchise"):
+    from fewshot_franchise import GeminiFewShotFranchiseService
+
 # ---------------------
 # 질문 파일 경로 구성
 # ---------------------
@@ -26,13 +42,28 @@ settings = Settings(DEVICE=args.device)
 rag_service = GeminiFewShotFranchiseService(
     api_key=settings.GEMINI_API_KEY,
     config={
-        "vector_db_path": settings.VECTOR_DB_PATH,
+        "vector_db_path": args.vector_db_path or settings.VECTOR_DB_PATH,
+        "sharded_store": args.sharded_store,
+        "shard_search_workers": args.shard_search_workers,
         "model_name": settings.MODEL_NAME,
         "embedding_model_path": settings.EMBEDDING_MODEL_PATH,
+        "embedding_model_name": settings.EMBEDDING_MODEL_NAME,
+        "embedding_cache_dir": settings.EMBEDDING_CACHE_DIR,
+        "embedding_backend": settings.EMBEDDING_BACKEND,
+        "answer_cache_dir": settings.ANSWER_CACHE_DIR,
+        "answer_cache_threshold": settings.ANSWER_CACHE_THRESHOLD,
+        "answer_cache_min_overlap": settings.ANSWER_CACHE_MIN_OVERLAP,
         "device":settings.DEVICE,
-        "vectorstore_search_k":1
+        "vectorstore_search_k":1,
+        "cascade": args.cascade,
+        # 프로파일 시에는 생성자에서 로드하지 않고 warm_up에서 단계별로 측정
+        "lazy_load": args.profile_startup,
+        "background_warm_up": False,
     }
 )
+if args.profile_startup:
+    rag_service.warm_up(profiler=profiler)
+    print(profiler.report())
 
 
 # ---------------------
@@ -45,11 +76,18 @@ with open(questions_path, "r", encoding="utf-8") as f:
     questions_data = json.load(f)
 
 
-results = []
-for i, q_item in enumerate(questions_data[:5]):
-    query = q_item["question"]
-    result = rag_service.inference(query)
-    results.append(result)
+if args.limit > 0:
+    questions_data = questions_data[:args.limit]
+
+if args.batch:
+    queries = [q_item["question"] for q_item in questions_data]
+    results = rag_service.inference_batch(queries, concurrency=args.concurrency, rate_limit=args.rps)
+else:
+    results = []
+    for i, q_item in enumerate(questions_data):
+        query = q_item["question"]
+        result = rag_service.inference(query)
+        results.append(result)
 
 
 output_path = Path("./data/result/test_data.json").resolve()
@@ -58,6 +96,14 @@ with open(output_path, "w", encoding="utf-8") as f:
 
 print(f"\n✅ 결과 저장 완료: {output_path}")
 
+if rag_service.cascade is not None:
+    print(f"⏭️ cascade 단계 생략률: {json.dumps(rag_service.cascade.stats(), ensure_ascii=False)}")
+
+if args.metrics_out:
+    from metrics import metrics
+    metrics.save(args.metrics_out, fmt="prometheus" if args.metrics_out.endswith(".prom") else "json")
+    print(f"📈 메트릭 저장 완료: {args.metrics_out}")
+
 # ---------------------
 # 질문 순회 추론
 # ---------------------
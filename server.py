@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from config import Settings
+from metrics import metrics
+from startup_profile import StartupProfiler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+# 이벤트 루프는 태스크를 약한 참조로만 들고 있으므로 끝날 때까지 여기서 참조를 유지
+_background_tasks = set()
+
+
+def _on_task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"백그라운드 작업 실패 ({task.get_name()}): {task.exception()}", exc_info=task.exception())
+
+
+def spawn(coro, name: str) -> asyncio.Task:
+    """백그라운드 태스크 실행 (완료 시 참조 해제, 실패는 로그로 남김)"""
+    task = asyncio.create_task(coro, name=name)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_task_done)
+    return task
+
+
+class MicroBatcher:
+    """짧은 시간(window) 안에 들어온 질문을 묶어 임베딩/검색을 한 번에 수행"""
+
+    def __init__(self, service, window_ms: float = 10.0, max_batch: int = 32, concurrency: int = 8):
+        self.service = service
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # 임베딩 모델/Chroma 호출은 전용 스레드 하나에서 직렬로 수행
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval")
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, question: str) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((question, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            spawn(self._process(batch), "batch")
+
+    async def _process(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.batches += 1
+        self.requests += len(batch)
+        metrics.inc("server_batches")
+        metrics.inc("server_requests", len(batch))
+        queries = [question for question, _ in batch]
+        try:
+            retrieved = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.service.retrieve_batch, queries
+            )
+        except Exception as e:
+            logger.error(f"배치 검색 실패: {str(e)}", exc_info=True)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        async def answer(question, item, future):
+            try:
+                result = await self.service.agenerate_answer(question, item, self.semaphore)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+
+        await asyncio.gather(*(answer(q, item, fut) for (q, fut), item in zip(batch, retrieved)))
+
+
+class QAServer:
+    """서비스(임베딩 모델, Chroma)를 한 번만 띄워두고 HTTP로 질의응답하는 asyncio 서버
+
+    GET  /healthz          프로세스 생존 여부
+    GET  /readyz           모델/벡터스토어 로딩 완료 여부
+    GET  /metrics          단계별 지연 히스토그램/카운터 (Prometheus 텍스트, /metrics.json은 JSON)
+    POST /inference        {"question": "..."}
+    POST /inference/batch  {"questions": ["...", ...]}
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.service = None
+        self.batcher = None
+        self.ready = False
+        self.load_error = None
+        self.started_at = time.time()
+
+    def build_service(self):
+        from fewshot_franchise import GeminiFewShotFranchiseService
+
+        settings = Settings(DEVICE=self.args.device)
+        return GeminiFewShotFranchiseService(
+            api_key=settings.GEMINI_API_KEY,
+            config={
+                "vector_db_path": self.args.vector_db_path or settings.VECTOR_DB_PATH,
+                "sharded_store": self.args.sharded_store,
+                "shard_search_workers": self.args.shard_search_workers,
+                "model_name": settings.MODEL_NAME,
+                "embedding_model_path": settings.EMBEDDING_MODEL_PATH,
+                "embedding_model_name": settings.EMBEDDING_MODEL_NAME,
+                "embedding_cache_dir": settings.EMBEDDING_CACHE_DIR,
+                "embedding_backend": settings.EMBEDDING_BACKEND,
+                "answer_cache_dir": settings.ANSWER_CACHE_DIR,
+                "answer_cache_threshold": settings.ANSWER_CACHE_THRESHOLD,
+                "answer_cache_min_overlap": settings.ANSWER_CACHE_MIN_OVERLAP,
+                "device": settings.DEVICE,
+                "llm_backend": self.args.llm_backend,
+                "llm_stub_latency": self.args.stub_latency,
+                "llm_max_concurrency": self.args.concurrency,
+                "llm_timeout": self.args.llm_timeout,
+                "cascade": self.args.cascade,
+                "hot_reload": self.args.hot_reload,
+                "lazy_load": True,
+                "background_warm_up": False,
+            }
+        )
+
+    async def warm_up(self):
+        start = time.time()
+        profiler = StartupProfiler(enabled=self.args.profile_startup)
+        try:
+            with profiler.phase("import + init service"):
+                service = await asyncio.to_thread(self.build_service)
+            await asyncio.to_thread(service.warm_up, profiler=profiler)
+            self.service = service
+        except Exception as e:
+            self.load_error = str(e)
+            logger.error(f"서비스 초기화 실패: {str(e)}", exc_info=True)
+            return
+        self.batcher = MicroBatcher(
+            self.service,
+            window_ms=self.args.batch_window_ms,
+            max_batch=self.args.max_batch,
+            concurrency=self.args.concurrency,
+        )
+        spawn(self.batcher.run(), "batcher")
+        self.ready = True
+        logger.info(f"✅ 서비스 준비 완료 ({time.time() - start:.2f}초)")
+        if self.args.profile_startup:
+            logger.info("\n" + profiler.report())
+
+    async def route(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/metrics":
+            return 200, metrics.to_prometheus()
+        if method == "GET" and path == "/metrics.json":
+            return 200, metrics.to_dict()
+        if method == "GET" and path == "/healthz":
+            return 200, {"status": "ok", "uptime": round(time.time() - self.started_at, 3)}
+        if method == "GET" and path == "/readyz":
+            if self.ready:
+                return 200, {
+                    "status": "ready",
+                    "vector_db_version": self.service.db_version,
+                    "batches": self.batcher.batches,
+                    "requests": self.batcher.requests,
+                }
+            return 503, {"status": "loading" if self.load_error is None else "failed", "error": self.load_error}
+
+        if method == "POST" and path in ("/inference", "/inference/batch"):
+            if not self.ready:
+                return 503, {"error": "서비스가 아직 준비되지 않았습니다."}
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                return 400, {"error": "JSON 본문을 파싱할 수 없습니다."}
+
+            if path == "/inference":
+                question = str(payload.get("question", "")).strip()
+                if not question:
+                    return 400, {"error": "question 필드가 필요합니다."}
+                return 200, await self.batcher.submit(question)
+
+            questions = payload.get("questions")
+            if not isinstance(questions, list) or not questions:
+                return 400, {"error": "questions 목록이 필요합니다."}
+            results = await asyncio.gather(*(self.batcher.submit(str(q)) for q in questions))
+            return 200, {"results": results}
+
+        return 404, {"error": f"{method} {path} 를 찾을 수 없습니다."}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY_BYTES:
+                status, payload = 413, {"error": "요청 본문이 너무 큽니다."}
+            else:
+                body = await reader.readexactly(length) if length else b""
+                try:
+                    status, payload = await self.route(method.upper(), path.split("?", 1)[0], body)
+                except Exception as e:
+                    logger.error(f"요청 처리 실패: {str(e)}", exc_info=True)
+                    status, payload = 500, {"error": str(e)}
+
+            if isinstance(payload, str):
+                data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                data, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json"
+            reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                      500: "Internal Server Error", 503: "Service Unavailable"}.get(status, "")
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\n"
+                f"Content-Type: {content_type}; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.warning(f"잘못된 요청: {str(e)}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.args.host, self.args.port)
+        logger.info(f"🚀 QA 서버 시작: http://{self.args.host}:{self.args.port}")
+        spawn(self.warm_up(), "warm_up")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--device", type=str, default="cpu", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--llm_backend", type=str, default="gemini", help="LLM 백엔드 (gemini / stub)")
+    parser.add_argument("--stub_latency", type=float, default=0.0, help="stub 백엔드 응답 지연(초)")
+    parser.add_argument("--llm_timeout", type=float, default=60.0, help="LLM 호출 1회 제한 시간(초)")
+    parser.add_argument("--batch_window_ms", type=float, default=10.0, help="요청 묶음 대기 시간(ms)")
+    parser.add_argument("--max_batch", type=int, default=32, help="한 번에 임베딩할 최대 질문 수")
+    parser.add_argument("--vector_db_path", type=str, default="", help="검색할 벡터 DB 경로 (기본: 설정의 VECTOR_DB_PATH)")
+    parser.add_argument("--sharded_store", action="store_true", help="sharded_store.py로 만든 샤드 스토어를 검색 (여러 정보공개서를 한 번에)")
+    parser.add_argument("--shard_search_workers", type=int, default=8, help="샤드 병렬 검색 스레드 수")
+    parser.add_argument("--hot_reload", action="store_true", help="create_collection.py가 새 벡터 DB 버전을 게시하면 무중단으로 다시 로드")
+    parser.add_argument("--cascade", action="store_true", help="검색 점수로 어휘 검색/few-shot 조회를 생략하는 적응형 검색 사용")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM 동시 호출 상한")
+    parser.add_argument("--profile-startup", dest="profile_startup", action="store_true", help="import/모델 로드 시간 리포트 출력")
+    args = parser.parse_args()
+
+    app = QAServer(args)
+    try:
+        asyncio.run(app.serve())
+    finally:
+        if app.service is not None:
+            app.service.close()  # 버전 lease 반납
+
+
+if __name__ == "__main__":
+    main()
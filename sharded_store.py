@@ -0,0 +1,342 @@
+import argparse
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SHARD_DIRECTORY_FILE_NAME = "shard_directory.json"
+SHARDS_DIR_NAME = "shards"
+
+
+def shard_of(doc_id: str) -> str:
+    """청크 ID(SN_ATTRB_CHNK_SMRT)에서 샤드 키(JNG_IFRMP_SN) 추출"""
+    return doc_id.split("_", 1)[0]
+
+
+def load_shard_directory(root: Path) -> dict:
+    path = Path(root) / SHARD_DIRECTORY_FILE_NAME
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_shard_directory(root: Path, directory: dict):
+    path = Path(root) / SHARD_DIRECTORY_FILE_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(directory, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def group_chunks_by_shard(json_path: Path) -> Dict[str, dict]:
+    """정보공개서 JSON 하나를 JNG_IFRMP_SN별 청크 묶음으로 분리 (보통 파일 하나 = 샤드 하나)"""
+    from create_collection import load_contract_documents
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        contracts_data = json.load(f)
+    chunks, _ = load_contract_documents(json_path, contracts_data)
+
+    shards = {}
+    for cid, doc in chunks.items():
+        shards.setdefault(str(doc.metadata["JNG_IFRMP_SN"]), {})[cid] = doc
+    return shards
+
+
+# ---------------------
+# 샤드 빌드 (프로세스 풀 워커)
+# ---------------------
+_worker_options = {}
+_worker_embeddings = None
+
+
+def _init_worker(options: dict):
+    global _worker_options
+    _worker_options = options
+    # 워커끼리 코어를 나눠 쓰도록 스레드 수 고정 (CPU 임베딩 시 과다 구독 방지)
+    threads = str(options.get("threads_per_worker", 1))
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    if options.get("device") == "cpu":
+        try:
+            import torch
+            torch.set_num_threads(int(threads))
+        except ImportError:
+            pass
+
+
+def _get_worker_embeddings():
+    # 변경된 샤드를 처음 만났을 때만 워커당 한 번 모델 로드
+    global _worker_embeddings
+    if _worker_embeddings is None:
+        from embedding_cache import load_embeddings
+        _worker_embeddings = load_embeddings(
+            _worker_options["embedding_model_path"],
+            _worker_options["embedding_model_name"],
+            device=_worker_options["device"],
+            # 워커끼리 같은 디스크 캐시를 써서 이미 임베딩한 청크는 다시 인코딩하지 않음
+            cache_dir=_worker_options["embedding_cache_dir"],
+            cache_max_mb=_worker_options["embedding_cache_max_mb"],
+        )
+    return _worker_embeddings
+
+
+def build_shards_for_file(json_path: str, root: str) -> List[dict]:
+    """파일 하나에 들어있는 샤드를 각자의 Chroma 디렉토리에 delta 재색인하고 디렉토리 항목을 반환"""
+    from langchain_chroma import Chroma
+
+    from create_collection import (
+        COLLECTION_NAME, build_lexical_index, content_hash, load_manifest, save_manifest, sync_collection,
+    )
+
+    entries = []
+    for sn, chunks in group_chunks_by_shard(Path(json_path)).items():
+        start = time.perf_counter()
+        shard_path = Path(root) / SHARDS_DIR_NAME / sn
+        shard_path.mkdir(parents=True, exist_ok=True)
+
+        manifest = load_manifest(shard_path)
+        hashes = {cid: content_hash(doc.page_content, doc.metadata) for cid, doc in chunks.items()}
+        changed = sum(1 for cid, h in hashes.items() if manifest.get(cid) != h)
+        if manifest != hashes:
+            vectorstore = Chroma(
+                persist_directory=str(shard_path),
+                embedding_function=_get_worker_embeddings(),
+                collection_name=COLLECTION_NAME,
+            )
+            save_manifest(shard_path, sync_collection(vectorstore, chunks, manifest))
+            build_lexical_index(chunks).save(shard_path)
+
+        meta = next(iter(chunks.values())).metadata
+        entries.append({
+            "sn": sn,
+            "path": f"{SHARDS_DIR_NAME}/{sn}",
+            "source": Path(json_path).name,
+            "source_path": str(Path(json_path).resolve()),
+            "brand": meta.get("BRAND_NM"),
+            "company": meta.get("JNGHDQRTRS_CONM_NM"),
+            "year": meta.get("JNG_BIZ_CRTRA_YR"),
+            "chunks": len(chunks),
+            "changed": changed,
+            "seconds": round(time.perf_counter() - start, 3),
+        })
+    return entries
+
+
+def build_sharded_store(
+    json_paths: List[Path],
+    root: Path,
+    settings,
+    device: str = "cpu",
+    workers: int = 0,
+    prune: bool = False,
+) -> dict:
+    """파일별 샤드를 프로세스 풀에서 병렬로 빌드하고, 샤드 디렉토리와 전역 라우터/어휘 색인을 갱신"""
+    from brand_router import BrandRouter
+    from create_collection import build_lexical_index
+
+    root = Path(root)
+    (root / SHARDS_DIR_NAME).mkdir(parents=True, exist_ok=True)
+    workers = workers or max(1, min(len(json_paths), (os.cpu_count() or 1) // 2))
+    options = {
+        "embedding_model_path": settings.EMBEDDING_MODEL_PATH,
+        "embedding_model_name": settings.EMBEDDING_MODEL_NAME,
+        "embedding_cache_dir": settings.EMBEDDING_CACHE_DIR,
+        "embedding_cache_max_mb": settings.EMBEDDING_CACHE_MAX_MB,
+        "device": device,
+        "threads_per_worker": max(1, (os.cpu_count() or 1) // workers),
+    }
+
+    directory = load_shard_directory(root)
+    start = time.perf_counter()
+    # CUDA는 fork 이후 초기화할 수 없으므로 spawn으로 워커 생성
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(options,)) as pool:
+        futures = {pool.submit(build_shards_for_file, str(path), str(root)): path for path in json_paths}
+        for future in as_completed(futures):
+            for entry in future.result():
+                directory[entry["sn"]] = entry
+                logger.info(
+                    f"🧩 샤드 {entry['sn']} ({entry['brand']}): {entry['chunks']}개 청크, "
+                    f"변경 {entry['changed']}개, {entry['seconds']:.2f}초"
+                )
+
+    if prune:
+        current = set()
+        for path in json_paths:
+            current.update(group_chunks_by_shard(path))
+        for sn in [sn for sn in directory if sn not in current]:
+            logger.info(f"🗑️ 샤드 제거: {sn}")
+            shutil.rmtree(root / directory.pop(sn)["path"], ignore_errors=True)
+
+    save_shard_directory(root, directory)
+
+    # 전역 라우터/어휘 색인은 모든 샤드의 원본 파일로 다시 만든다 (파싱만 하므로 모델 로드 없음)
+    all_chunks = {}
+    for source_path in sorted({entry["source_path"] for entry in directory.values()}):
+        if not Path(source_path).exists():
+            logger.warning(f"⚠ 원본 파일이 없어 전역 색인에서 제외합니다: {source_path}")
+            continue
+        for sn, chunks in group_chunks_by_shard(Path(source_path)).items():
+            if sn in directory:
+                all_chunks.update(chunks)
+    BrandRouter.from_documents(all_chunks.values()).save(root)
+    build_lexical_index(all_chunks).save(root)
+
+    logger.info(f"✅ 샤드 {len(directory)}개 빌드 완료 ({time.perf_counter() - start:.2f}초, 워커 {workers}개)")
+    return directory
+
+
+# ---------------------
+# 검색 (스레드 fan-out)
+# ---------------------
+class ShardedStore:
+    """샤드별 Chroma 컬렉션을 하나의 벡터스토어처럼 검색하는 읽기 경로
+
+    similarity_search_by_vector / get / _collection.query 를 Chroma와 같은 형태로 제공해
+    GeminiFranchiseService가 단일 컬렉션 대신 그대로 사용할 수 있다.
+    필터가 JNG_IFRMP_SN이면 해당 샤드만, 아니면 모든 샤드를 병렬로 검색해 거리순으로 top-k를 합친다.
+    """
+
+    def __init__(self, root: str, embeddings, max_workers: int = 8):
+        self.root = Path(root)
+        self.embeddings = embeddings
+        self.directory = load_shard_directory(self.root)
+        if not self.directory:
+            raise FileNotFoundError(f"샤드 디렉토리가 없습니다: {self.root / SHARD_DIRECTORY_FILE_NAME}")
+        self._stores = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+        logger.info(f"샤드 스토어 로드: {len(self.directory)}개 샤드")
+
+    def shard(self, sn: str):
+        store = self._stores.get(sn)
+        if store is None:
+            with self._lock:
+                store = self._stores.get(sn)
+                if store is None:
+                    from langchain_chroma import Chroma
+                    from create_collection import COLLECTION_NAME
+
+                    store = Chroma(
+                        persist_directory=str(self.root / self.directory[sn]["path"]),
+                        embedding_function=self.embeddings,
+                        collection_name=COLLECTION_NAME,
+                    )
+                    self._stores[sn] = store
+        return store
+
+    def shards_for(self, filter: Optional[dict]) -> List[str]:
+        """JNG_IFRMP_SN 필터를 샤드 목록으로 변환 (그 외 필터는 모든 샤드에 그대로 전달)"""
+        value = (filter or {}).get("JNG_IFRMP_SN")
+        if value is None:
+            return list(self.directory)
+        values = value["$in"] if isinstance(value, dict) else [value]
+        return [str(sn) for sn in values if str(sn) in self.directory]
+
+    @staticmethod
+    def _shard_filter(filter: Optional[dict]) -> Optional[dict]:
+        rest = {key: value for key, value in (filter or {}).items() if key != "JNG_IFRMP_SN"}
+        return rest or None
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[dict] = None, include=None) -> dict:
+        """Chroma collection.query와 같은 형태의 결과 (샤드 결과를 거리순으로 병합)"""
+        shards = self.shards_for(where)
+        shard_where = self._shard_filter(where)
+        include = list(include or ["documents", "metadatas"])
+        shard_include = include if "distances" in include else include + ["distances"]
+
+        def search(sn):
+            return self.shard(sn)._collection.query(
+                query_embeddings=query_embeddings, n_results=n_results, where=shard_where, include=shard_include
+            )
+
+        results = list(self._executor.map(search, shards))
+        merged = {"ids": []}
+        for field in include:
+            merged[field] = []
+        for qi in range(len(query_embeddings)):
+            candidates = []
+            for result in results:
+                for j, doc_id in enumerate(result["ids"][qi]):
+                    candidates.append((result["distances"][qi][j], doc_id, result, j))
+            top = heapq.nsmallest(n_results, candidates, key=lambda c: c[0])
+            merged["ids"].append([doc_id for _, doc_id, _, _ in top])
+            for field in include:
+                merged[field].append([result[field][qi][j] for _, _, result, j in top])
+        return merged
+
+    def similarity_search_by_vector(self, embedding, k: int = 5, filter: Optional[dict] = None, **kwargs):
+        from langchain.docstore.document import Document
+
+        result = self.query([embedding], n_results=k, where=filter)
+        return [
+            Document(page_content=text or "", metadata=meta or {}, id=doc_id)
+            for doc_id, text, meta in zip(result["ids"][0], result["documents"][0], result["metadatas"][0])
+        ]
+
+    def get(self, ids: List[str], include=None) -> dict:
+        """청크 ID 앞자리(JNG_IFRMP_SN)로 샤드를 찾아 조회"""
+        include = list(include or ["documents", "metadatas"])
+        by_shard = {}
+        for doc_id in ids:
+            sn = shard_of(doc_id)
+            if sn in self.directory:
+                by_shard.setdefault(sn, []).append(doc_id)
+        merged = {"ids": [], **{field: [] for field in include}}
+        for sn, shard_ids in by_shard.items():
+            found = self.shard(sn).get(ids=shard_ids, include=include)
+            merged["ids"].extend(found["ids"])
+            for field in include:
+                merged[field].extend(found[field])
+        return merged
+
+    def count(self) -> int:
+        return sum(entry["chunks"] for entry in self.directory.values())
+
+    @property
+    def _collection(self):
+        # 배치 검색 경로(vectorstore._collection.query)와 호환
+        return self
+
+    def add_documents(self, documents, **kwargs):
+        raise NotImplementedError("샤드 스토어는 sharded_store.py build로만 갱신합니다.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=str, default="./data/test", help="정보공개서 JSON 디렉토리")
+    parser.add_argument("--json_path", type=str, nargs="*", help="특정 파일만 갱신 (해당 샤드만 재색인)")
+    parser.add_argument("--root", type=str, default="./vector_db/sharded", help="샤드 스토어 경로")
+    parser.add_argument("--device", type=str, default="cpu", help="임베딩 수행 디바이스 (cuda / cpu)")
+    parser.add_argument("--workers", type=int, default=0, help="병렬 빌드 프로세스 수 (0이면 코어 수 기준)")
+    parser.add_argument("--prune", action="store_true", help="입력 파일에 없는 샤드 삭제 (전체 디렉토리로 빌드할 때 사용)")
+    args = parser.parse_args()
+
+    from config import Settings
+
+    settings = Settings(DEVICE=args.device)
+    if args.json_path:
+        json_paths = [Path(p).resolve() for p in args.json_path]
+    else:
+        json_paths = sorted(
+            p.resolve() for p in Path(args.data_dir).glob("*.json") if not p.name.startswith("extract_question_")
+        )
+    if not json_paths:
+        raise SystemExit(f"❌ JSON 파일이 없습니다: {args.data_dir}")
+
+    build_sharded_store(json_paths, Path(args.root).resolve(), settings, args.device, args.workers, args.prune)
+
+
+if __name__ == "__main__":
+    main()
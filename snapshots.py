@@ -0,0 +1,236 @@
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR_NAME = "versions"
+CURRENT_FILE_NAME = "CURRENT"
+PUBLISHED_FILE_NAME = "PUBLISHED"
+LEASES_DIR_NAME = "leases"
+LEASE_TTL = 600.0  # 이 시간 동안 갱신되지 않은 lease는 종료된 프로세스의 것으로 봄
+
+
+def current_version(root: str) -> Optional[str]:
+    """CURRENT 포인터가 가리키는 버전 이름 (버전 구조가 아니면 None)"""
+    try:
+        with open(Path(root) / CURRENT_FILE_NAME, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_path(root: str, version: str) -> Path:
+    return Path(root) / VERSIONS_DIR_NAME / version
+
+
+def resolve(root: str) -> Tuple[Optional[str], str]:
+    """(버전 이름, 실제로 읽을 디렉토리). CURRENT가 없으면 root 자체를 쓰는 이전 구조로 본다"""
+    version = current_version(root)
+    if version is None:
+        return None, str(Path(root))
+    return version, str(version_path(root, version))
+
+
+def _new_version_name(root: Path) -> str:
+    base = time.strftime("%Y%m%d-%H%M%S")
+    name, n = base, 1
+    while version_path(root, name).exists():
+        # 같은 초에 만든 버전은 자릿수를 맞춘 번호를 붙여 문자열 순서도 생성 순서와 같게 함
+        name, n = f"{base}-{n:03d}", n + 1
+    return name
+
+
+def version_key(name: str) -> Tuple[str, int]:
+    """버전 이름의 생성 순서 정렬 키 ((시각, 같은 초 번호)) — 자릿수를 맞추지 않은 이전 이름("-9", "-10")도 올바르게 정렬"""
+    parts = name.split("-")
+    if len(parts) == 3 and parts[2].isdigit():
+        return f"{parts[0]}-{parts[1]}", int(parts[2])
+    return name, 0
+
+
+def prepare_version(root: str, copy: bool = True) -> Tuple[str, Path]:
+    """현재 활성 데이터를 새 버전 디렉토리로 복사해 (버전 이름, 경로) 반환 (copy=False면 빈 디렉토리)
+
+    복사본에서 delta 재색인하므로 바뀌지 않은 청크는 다시 임베딩하지 않고, 읽는 프로세스는 기존 버전을 계속 본다.
+    이전 구조(root에 바로 Chroma가 있는 경우)면 root의 파일을 복사해 첫 버전으로 옮긴다.
+    """
+    root = Path(root)
+    version = _new_version_name(root)
+    target = version_path(root, version)
+    _, active = resolve(str(root))
+    active = Path(active)
+
+    ignore = None
+    if active == root:
+        ignore = shutil.ignore_patterns(VERSIONS_DIR_NAME, LEASES_DIR_NAME, CURRENT_FILE_NAME, f"{CURRENT_FILE_NAME}.tmp")
+    if copy and active.exists() and any(active.iterdir()):
+        shutil.copytree(active, target, ignore=ignore)
+        (target / PUBLISHED_FILE_NAME).unlink(missing_ok=True)
+    else:
+        target.mkdir(parents=True)
+    logger.info(f"🗂️ 새 버전 준비: {target}")
+    return version, target
+
+
+def publish(root: str, version: str):
+    """CURRENT 포인터를 임시 파일에 쓴 뒤 os.replace로 교체 (원자적 전환)"""
+    root = Path(root)
+    (version_path(root, version) / PUBLISHED_FILE_NAME).write_text(time.strftime("%Y-%m-%dT%H:%M:%S"), encoding="utf-8")
+    tmp = root / f"{CURRENT_FILE_NAME}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / CURRENT_FILE_NAME)
+    logger.info(f"🚀 버전 게시: {version}")
+
+
+class VersionLease:
+    """이 프로세스가 읽고 있는 버전을 leases/<호스트>-<pid>.json에 기록 (gc_versions는 살아 있는 lease의 버전을 지우지 않음)
+
+    파일 mtime이 heartbeat이며 VersionWatcher가 주기마다 갱신한다. LEASE_TTL 넘게 갱신되지 않으면 무시된다.
+    """
+
+    def __init__(self, root: str):
+        self.path = Path(root) / LEASES_DIR_NAME / f"{socket.gethostname()}-{os.getpid()}.json"
+        self.versions = set()
+        self._lock = threading.Lock()
+
+    def hold(self, version: Optional[str]):
+        if version is None:
+            return
+        with self._lock:
+            self.versions.add(version)
+            self._write()
+
+    def drop(self, version: Optional[str]):
+        with self._lock:
+            self.versions.discard(version)
+            self._write()
+
+    def renew(self):
+        with self._lock:
+            if self.versions:
+                try:
+                    os.utime(self.path)
+                except FileNotFoundError:
+                    self._write()  # 다른 프로세스가 만료된 것으로 보고 지운 경우
+
+    def release(self):
+        with self._lock:
+            self.versions.clear()
+            self._write()
+
+    def _write(self):
+        if not self.versions:
+            self.path.unlink(missing_ok=True)
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(sorted(self.versions)), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def leased_versions(root: str, ttl: float = LEASE_TTL) -> set:
+    """살아 있는 lease들이 잡고 있는 버전 이름 (만료된 lease 파일은 삭제)"""
+    leases_dir = Path(root) / LEASES_DIR_NAME
+    versions = set()
+    if not leases_dir.exists():
+        return versions
+    now = time.time()
+    for path in leases_dir.glob("*.json"):
+        try:
+            if now - path.stat().st_mtime > ttl:
+                path.unlink(missing_ok=True)
+                continue
+            versions.update(json.loads(path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue  # 교체 중이거나 방금 지워진 파일
+    return versions
+
+
+def gc_versions(root: str, keep: int = 2, lease_ttl: float = LEASE_TTL) -> List[str]:
+    """현재 버전을 포함해 최근 게시 버전 keep개만 남기고 삭제
+
+    현재 버전보다 새로운 미게시 디렉토리는 빌드 중일 수 있으므로 남기고, 실행 중인 서비스가 lease로 잡고 있는 버전도 남긴다.
+    (lease_ttl 넘게 heartbeat가 멈춘 프로세스의 버전은 지워질 수 있다.)
+    다른 프로세스가 아직 열고 있는 파일은 (Windows 등에서) 지워지지 않을 수 있어, 실패한 버전은 다음 GC에서 다시 시도한다.
+    """
+    root = Path(root)
+    current = current_version(str(root))
+    versions_dir = root / VERSIONS_DIR_NAME
+    if current is None or not versions_dir.exists():
+        return []
+
+    names = sorted((p.name for p in versions_dir.iterdir() if p.is_dir()), key=version_key)
+    current_key = version_key(current)
+    published = [
+        name for name in names
+        if version_key(name) <= current_key and (versions_dir / name / PUBLISHED_FILE_NAME).exists()
+    ]
+    kept = set(published[-max(keep, 1):]) | {current} | leased_versions(str(root), lease_ttl)
+    removed = []
+    for name in names:
+        if name in kept or version_key(name) > current_key:
+            continue
+        shutil.rmtree(versions_dir / name, ignore_errors=True)
+        if (versions_dir / name).exists():
+            logger.warning(f"⚠ 버전 삭제 실패(사용 중일 수 있음): {name}")
+        else:
+            removed.append(name)
+    if removed:
+        logger.info(f"🧹 이전 버전 삭제: {removed}")
+    return removed
+
+
+class VersionWatcher:
+    """CURRENT 포인터를 주기적으로 확인해 버전이 바뀌면 콜백을 호출하는 백그라운드 스레드
+
+    lease가 있으면 주기마다 heartbeat를 갱신한다. on_change가 None이면 heartbeat만 한다.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        version: Optional[str],
+        on_change: Optional[Callable[[], None]],
+        interval: float = 10.0,
+        lease: Optional[VersionLease] = None,
+    ):
+        self.root = root
+        self.version = version  # 호출자가 현재 로드한 버전
+        self.on_change = on_change
+        self.interval = interval
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="vector-db-watcher", daemon=True)
+
+    def start(self) -> "VersionWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.lease is not None:
+                self.lease.renew()
+            if self.on_change is None:
+                continue
+            version = current_version(self.root)
+            if version == self.version:
+                continue
+            try:
+                self.on_change()
+                self.version = version
+            except Exception as e:
+                # 다음 주기에 다시 시도 (그동안은 기존 버전으로 계속 서비스)
+                logger.error(f"벡터 DB 버전 전환 실패: {version} ({str(e)})")
@@ -0,0 +1,57 @@
+import importlib
+import time
+from contextlib import contextmanager
+
+# 시작 시간에 큰 영향을 주는 외부 의존성 (import 순서대로 측정)
+HEAVY_MODULES = [
+    "pydantic_settings",
+    "yaml",
+    "numpy",
+    "langchain_core.embeddings",
+    "langchain_chroma",
+    "langchain_huggingface",
+    "sentence_transformers",
+    "google.generativeai",
+]
+
+
+class StartupProfiler:
+    """시작 단계별(import / 모델·스토어 로드) 소요 시간 기록. enabled=False면 기록하지 않음"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.records = []
+        self.started_at = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((name, time.perf_counter() - start))
+
+    def profile_imports(self, modules=HEAVY_MODULES):
+        """의존성을 하나씩 import하며 각각의 순수 import 시간을 기록 (이미 로드된 모듈은 0에 가까움)"""
+        if not self.enabled:
+            return
+        for module in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(module)
+                name = f"import {module}"
+            except ImportError:
+                name = f"import {module} (미설치)"
+            self.records.append((name, time.perf_counter() - start))
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started_at
+        width = max([len(name) for name, _ in self.records] + [10])
+        lines = ["⏱️ 시작 시간 프로파일"]
+        for name, elapsed in self.records:
+            lines.append(f"  {name:<{width}}  {elapsed * 1000:9.1f} ms")
+        lines.append(f"  {'합계(경과)':<{width}}  {total * 1000:9.1f} ms")
+        return "\n".join(lines)